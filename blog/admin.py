@@ -1,6 +1,47 @@
+from functools import reduce
+from operator import or_
+
 from django.contrib import admin
+from django.db.models import OuterRef, Q, Subquery
+from django.http import StreamingHttpResponse
 from django.utils.html import format_html
-from .models import Author, Book, Review, BackdropImage
+from .models import Author, Book, Review, BackdropImage, ImageJob
+from .utils import book_export, renditions, search_index
+
+
+class SearchIndexAdminMixin:
+    """
+    Answer changelist searches from the full-text index where possible.
+
+    ``search_index_fields`` maps the ``search_fields`` the index covers to
+    their index columns; those are matched through the index instead of LIKE
+    scans, in those columns only, and any remaining fields are still
+    searched with ``icontains``.
+    ``search_index_lookup`` names the field holding the book id.
+    Without the index the normal admin search is used unchanged.
+    """
+    search_index_fields = {}
+    search_index_lookup = 'pk'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search_index.is_available():
+            return super().get_search_results(request, queryset, search_term)
+
+        condition = Q(**{
+            f'{self.search_index_lookup}__in': search_index.matching_book_ids(
+                search_term, sorted(set(self.search_index_fields.values()))
+            )
+        })
+        remaining = [
+            field for field in self.get_search_fields(request)
+            if field not in self.search_index_fields
+        ]
+        if remaining:
+            like = Q()
+            for bit in search_term.split():
+                like &= reduce(or_, (Q(**{f'{field}__icontains': bit}) for field in remaining))
+            condition |= like
+        return queryset.filter(condition), False
 
 
 @admin.register(Author)
@@ -23,21 +64,20 @@ class AuthorAdmin(admin.ModelAdmin):
         }),
     )
 
-    def book_count(self, obj):
-        """Display the number of books by this author."""
-        return obj.books.count()
-    book_count.short_description = 'Books'
-
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     """Admin interface for Book model with advanced features."""
     list_display = ['title', 'author', 'genre', 'publication_date', 'average_rating_display', 'review_count', 'cover_preview']
     list_filter = ['genre', 'publication_date', 'author', 'created_at']
     search_fields = ['title', 'author__name', 'description', 'isbn']
+    search_index_fields = {
+        'title': 'title', 'author__name': 'author', 'description': 'description', 'isbn': 'isbn',
+    }
     readonly_fields = ['created_at', 'updated_at']
     prepopulated_fields = {'slug': ('title',)}
     autocomplete_fields = ['author']
+    actions = ['export_json', 'export_archive']
     fieldsets = (
         ('Basic Information', {
             'fields': ('title', 'author', 'genre', 'slug')
@@ -56,35 +96,51 @@ class BookAdmin(admin.ModelAdmin):
 
     def average_rating_display(self, obj):
         """Display average rating with stars."""
-        if obj.average_rating > 0:
-            stars = '★' * int(obj.average_rating) + '☆' * (5 - int(obj.average_rating))
-            rating_text = f"{obj.average_rating:.1f}"
+        average_rating = obj.average_rating
+        if average_rating > 0:
+            stars = '★' * int(average_rating) + '☆' * (5 - int(average_rating))
+            rating_text = f"{average_rating:.1f}"
             return format_html('<span style="color: gold;">{}</span> ({})', stars, rating_text)
         return 'No reviews'
     average_rating_display.short_description = 'Average Rating'
 
-    def review_count(self, obj):
-        """Display the number of reviews for this book."""
-        return obj.reviews.count()
-    review_count.short_description = 'Reviews'
-
     def cover_preview(self, obj):
         """Display a small preview of the book cover."""
         if obj.cover_image:
-            return format_html(
-                '<img src="{}" style="max-height: 50px; max-width: 50px;" />',
-                obj.cover_image.url
+            return renditions.img_tag(
+                obj.cover_image, 'admin-thumb', style='max-height: 50px; max-width: 50px;'
             )
         return 'No cover'
     cover_preview.short_description = 'Cover'
 
+    def _export_response(self, queryset, archive=None):
+        # Staff exports: each book's earliest review of any status, drafts and
+        # private reviews included (export_books --public-only leaves them out)
+        exporter = book_export.Exporter(queryset, 'json', archive)
+        # Streamed as it is written, so large catalogs are never held in memory
+        response = StreamingHttpResponse(exporter.export(), content_type=exporter.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{exporter.filename}"'
+        return response
+
+    def export_json(self, request, queryset):
+        """Action to download the selected books, each with its earliest review (of any status), as all_books.json."""
+        return self._export_response(queryset)
+    export_json.short_description = "Export selected books as JSON"
+
+    def export_archive(self, request, queryset):
+        """Action to download the selected books and earliest reviews (of any status) with their images as a zip."""
+        return self._export_response(queryset, 'zip')
+    export_archive.short_description = "Export selected books with images (zip)"
+
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     """Admin interface for Review model with moderation features."""
     list_display = ['book', 'reviewer', 'rating_stars', 'title', 'status', 'is_public', 'created_at']
     list_filter = ['status', 'rating', 'is_public', 'created_at', 'book__genre']
     search_fields = ['title', 'content', 'book__title', 'reviewer__username']
+    search_index_fields = {'book__title': 'title'}
+    search_index_lookup = 'book_id'
     readonly_fields = ['created_at', 'updated_at']
     list_editable = ['status', 'is_public']
     actions = ['make_published', 'make_draft', 'make_archived', 'make_public', 'make_private']
@@ -143,7 +199,7 @@ class ReviewAdmin(admin.ModelAdmin):
 @admin.register(BackdropImage)
 class BackdropImageAdmin(admin.ModelAdmin):
     """Admin interface for BackdropImage model with image processing features."""
-    list_display = ['name', 'processing_style', 'is_active', 'image_preview', 'created_at']
+    list_display = ['name', 'processing_style', 'is_active', 'image_preview', 'job_status', 'created_at']
     list_filter = ['processing_style', 'is_active', 'created_at']
     search_fields = ['name']
     readonly_fields = ['created_at', 'updated_at', 'processed_image']
@@ -165,21 +221,98 @@ class BackdropImageAdmin(admin.ModelAdmin):
     def image_preview(self, obj):
         """Display a preview of the backdrop image."""
         if obj.processed_image:
-            return format_html(
-                '<img src="{}" style="max-height: 100px; max-width: 150px;" />',
-                obj.processed_image.url
+            return renditions.img_tag(
+                obj.processed_image, 'admin-thumb', style='max-height: 100px; max-width: 150px;'
             )
         elif obj.original_image:
-            return format_html(
-                '<img src="{}" style="max-height: 100px; max-width: 150px; opacity: 0.7;" />',
-                obj.original_image.url
+            return renditions.img_tag(
+                obj.original_image, 'admin-thumb',
+                style='max-height: 100px; max-width: 150px; opacity: 0.7;'
             )
         return 'No image'
     image_preview.short_description = 'Preview'
 
+    def get_queryset(self, request):
+        # The latest processing job of each backdrop, for job_status
+        latest_job = ImageJob.objects.filter(
+            kind=ImageJob.PROCESS_BACKDROP, object_id=OuterRef('pk')
+        ).order_by('-created_at', '-pk')
+        return super().get_queryset(request).annotate(
+            job_status=Subquery(latest_job.values('status')[:1]),
+            job_progress=Subquery(latest_job.values('progress')[:1]),
+            job_error=Subquery(latest_job.values('last_error')[:1]),
+        )
+
+    def job_status(self, obj):
+        """Status of the latest processing job."""
+        if obj.job_status is None:
+            return '-'
+        if obj.job_status == ImageJob.RUNNING:
+            return f'Running ({obj.job_progress}%)'
+        if obj.job_status == ImageJob.FAILED:
+            return format_html('<span title="{}">Failed</span>', obj.job_error)
+        return dict(ImageJob.STATUS_CHOICES)[obj.job_status]
+    job_status.short_description = 'Processing'
+
     def reprocess_images(self, request, queryset):
-        """Action to reprocess selected backdrop images."""
-        for backdrop in queryset:
-            backdrop.process_image()
-        self.message_user(request, f'{queryset.count()} backdrop images were reprocessed.')
+        """Action to queue the selected backdrop images for reprocessing."""
+        count = 0
+        for backdrop_id in queryset.values_list('pk', flat=True):
+            # Ahead of automatic jobs, since someone is waiting for these
+            ImageJob.objects.enqueue(
+                ImageJob.PROCESS_BACKDROP, backdrop_id, {'force': True}, priority=10
+            )
+            count += 1
+        self.message_user(request, f'{count} backdrop images were queued for reprocessing.')
     reprocess_images.short_description = "Reprocess selected backdrop images"
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    """Admin interface for the background image job queue."""
+    list_display = [
+        'kind', 'object_id', 'status', 'progress_display', 'priority', 'attempts',
+        'locked_by', 'created_at', 'finished_at',
+    ]
+    list_filter = ['status', 'kind', 'created_at']
+    search_fields = ['message', 'last_error', 'locked_by']
+    readonly_fields = [
+        'kind', 'object_id', 'payload', 'status', 'attempts', 'locked_by', 'locked_until',
+        'progress', 'message', 'last_error', 'created_at', 'updated_at', 'started_at',
+        'finished_at',
+    ]
+    actions = ['retry_jobs']
+    fieldsets = (
+        ('Job', {
+            'fields': ('kind', 'object_id', 'payload', 'priority', 'max_attempts', 'run_after')
+        }),
+        ('Progress', {
+            'fields': ('status', 'progress', 'message', 'attempts', 'last_error')
+        }),
+        ('Worker', {
+            'fields': ('locked_by', 'locked_until', 'started_at', 'finished_at'),
+            'classes': ('collapse',)
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def has_add_permission(self, request):
+        # Jobs are queued by saves and admin actions
+        return False
+
+    def progress_display(self, obj):
+        if obj.status == ImageJob.RUNNING:
+            return f'{obj.progress}% {obj.message}'.strip()
+        return obj.message or '-'
+    progress_display.short_description = 'Progress'
+
+    def retry_jobs(self, request, queryset):
+        """Action to queue failed jobs again with a fresh set of attempts."""
+        updated = queryset.filter(status=ImageJob.FAILED).update(
+            status=ImageJob.QUEUED, attempts=0, last_error='', finished_at=None
+        )
+        self.message_user(request, f'{updated} failed jobs were queued again.')
+    retry_jobs.short_description = "Retry selected failed jobs"
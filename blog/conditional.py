@@ -0,0 +1,60 @@
+"""
+Conditional GET (ETag / Last-Modified) for the public views.
+
+Each view names the values its page depends on — typically the latest
+``updated_at`` of the objects shown plus the stored counters — and fetches
+them in a single aggregate query. That query runs before the view's own
+queryset and template, so a browser or proxy revalidating an unchanged page
+gets a 304 without the page being rendered at all.
+"""
+import hashlib
+from datetime import datetime
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_validators(namespace, values):
+    """Return ``(etag, last_modified)`` for a dict of dependency values."""
+    payload = repr((namespace, sorted(values.items())))
+    etag = quote_etag(hashlib.sha1(payload.encode()).hexdigest()[:20])
+    timestamps = [value for value in values.values() if isinstance(value, datetime)]
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    return etag, last_modified
+
+
+class ConditionalGetMixin:
+    """
+    View mixin answering ``If-None-Match``/``If-Modified-Since`` with 304.
+
+    Views override ``get_validator_values()`` to return a dict from one
+    aggregate query. Returning None, or a dict whose values are all None
+    (the object does not exist), skips the check.
+    """
+
+    def get_validator_values(self):
+        return None
+
+    def get_validator_namespace(self):
+        # Pages of one listing share dependencies but not content
+        return (type(self).__name__, self.request.get_full_path())
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        values = self.get_validator_values()
+        if not values or all(value is None for value in values.values()):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag, last_modified = make_validators(self.get_validator_namespace(), values)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response.headers.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+        return response
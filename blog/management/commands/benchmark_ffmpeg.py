@@ -0,0 +1,127 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from PIL import Image, ImageFilter
+from blog.utils import ffmpeg, image_styles
+
+
+class Command(BaseCommand):
+    help = 'Compare one ffmpeg process per image with batched ffmpeg runs for the vintage style'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=48,
+            help='Number of synthetic images to filter'
+        )
+        parser.add_argument(
+            '--width',
+            type=int,
+            default=800,
+            help='Width of the synthetic images (height is 2/3 of it)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ffmpeg.BATCH_SIZE,
+            help='Images per ffmpeg invocation in batch mode'
+        )
+        parser.add_argument(
+            '--pool-size',
+            type=int,
+            default=ffmpeg.POOL_SIZE,
+            help='ffmpeg invocations running at once in batch mode'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the synthetic images'
+        )
+
+    def handle(self, *args, **options):
+        work_dir = tempfile.mkdtemp(prefix='benchmark-ffmpeg-')
+        try:
+            self._probe_timings(work_dir)
+            if not ffmpeg.available():
+                self.stdout.write(self.style.ERROR(
+                    f'ffmpeg ({ffmpeg.binary()}) is not installed; nothing to compare'
+                ))
+                return
+
+            filter_chain = image_styles.get_style('vintage').ffmpeg_filter
+            sources = self._synthetic_images(work_dir, options['count'], options['width'], options['seed'])
+            count = len(sources)
+            self.stdout.write(
+                f'{count} images, {options["width"]}px wide, filter: {filter_chain}'
+            )
+
+            started = time.perf_counter()
+            for index, source in enumerate(sources):
+                ffmpeg.filter_one(source, os.path.join(work_dir, f'single_{index}.jpg'), filter_chain)
+            single_seconds = time.perf_counter() - started
+
+            pairs = [
+                (source, os.path.join(work_dir, f'batch_{index}.jpg'))
+                for index, source in enumerate(sources)
+            ]
+            started = time.perf_counter()
+            errors = [
+                error for _source, _output, error in ffmpeg.filter_many(
+                    pairs, filter_chain,
+                    batch_size=options['batch_size'], pool_size=options['pool_size'],
+                ) if error
+            ]
+            batch_seconds = time.perf_counter() - started
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        for error in errors:
+            self.stdout.write(self.style.ERROR(error))
+        self.stdout.write(f'{"Mode":<34} {"Seconds":>8} {"Images/s":>9}')
+        self.stdout.write(
+            f'{"One process per image":<34} {single_seconds:>8.2f} {count / single_seconds:>9.1f}'
+        )
+        label = f'Batches of {options["batch_size"]}, {options["pool_size"]} at a time'
+        self.stdout.write(
+            f'{label:<34} {batch_seconds:>8.2f} {count / batch_seconds:>9.1f}'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Batch mode is {single_seconds / batch_seconds:.1f}x the per-image throughput'
+        ))
+
+    def _probe_timings(self, work_dir):
+        """Time the capability probe without a cache, from the disk cache and in-process."""
+        with override_settings(BLOG_FFMPEG_PROBE_CACHE=os.path.join(work_dir, 'probe.json')):
+            timings = []
+            for _label in ('uncached', 'disk cache', 'process cache'):
+                if len(timings) < 2:
+                    ffmpeg._probes.clear()
+                started = time.perf_counter()
+                result = ffmpeg.probe()
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'ffmpeg probe: {timings[0] * 1000:.1f}ms uncached, {timings[1] * 1000:.2f}ms from disk, '
+            f'{timings[2] * 1000:.3f}ms in-process ({result["version"] or "not installed"})'
+        )
+
+    def _synthetic_images(self, work_dir, count, width, seed):
+        rng = random.Random(seed)
+        height = width * 2 // 3
+        paths = []
+        for index in range(count):
+            small = Image.new('RGB', (12, 8))
+            small.putdata([
+                (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)) for _ in range(12 * 8)
+            ])
+            img = small.resize((width, height), Image.Resampling.BICUBIC).filter(ImageFilter.GaussianBlur(2))
+            path = os.path.join(work_dir, f'source_{index}.jpg')
+            img.save(path, 'JPEG', quality=90)
+            paths.append(path)
+        return paths
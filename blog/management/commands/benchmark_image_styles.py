@@ -0,0 +1,141 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageChops, ImageEnhance, ImageFilter, ImageStat
+from blog.utils import image_styles
+from blog.utils.image_processor import load_scaled
+
+SEPIA_MATRIX = sum(image_styles.SEPIA, ())
+
+
+def _legacy_desaturate(img, factor=0.4):
+    hsv = img.convert('HSV')
+    h, s, v = hsv.split()
+    s = s.point(lambda x: int(x * factor))
+    return Image.merge('HSV', (h, s, v)).convert('RGB')
+
+
+def _legacy_whiten(img):
+    img = ImageEnhance.Brightness(img).enhance(1.3)
+    img = ImageEnhance.Contrast(img).enhance(0.8)
+    return ImageEnhance.Color(img).enhance(0.6)
+
+
+def _legacy_vintage(img):
+    img = img.convert('RGB', SEPIA_MATRIX)
+    img = ImageEnhance.Contrast(img).enhance(1.1)
+    img = ImageEnhance.Contrast(img).enhance(1.2)
+    return ImageEnhance.Brightness(img).enhance(0.9)
+
+
+# One full-resolution pass per step, as the style code did before the registry
+LEGACY_STYLES = {
+    'original': lambda img: img,
+    'desaturated': _legacy_desaturate,
+    'sepia': lambda img: img.convert('RGB', SEPIA_MATRIX),
+    'greyscale': lambda img: img.convert('L').convert('RGB'),
+    'whitened': _legacy_whiten,
+    'vintage': _legacy_vintage,
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare the fused image style engine with per-step processing at full resolution'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--image',
+            type=str,
+            help='Source photo to process (defaults to a synthetic 24MP JPEG)'
+        )
+        parser.add_argument(
+            '--max-width',
+            type=int,
+            default=1920,
+            help='Output width, as for processed backdrops'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per style; the fastest is reported'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the synthetic image'
+        )
+
+    def handle(self, *args, **options):
+        path = options['image']
+        temp_path = None
+        if not path:
+            temp_path = path = self._synthetic_photo(options['seed'])
+
+        try:
+            with Image.open(path) as img:
+                self.stdout.write(f'Source: {path} ({img.width}x{img.height}, {img.format})')
+            self.stdout.write(
+                f'{"Style":<12} {"Per-step":>10} {"Fused":>10} {"Speed-up":>9} {"Mean diff":>10}'
+            )
+            for name in LEGACY_STYLES:
+                legacy, legacy_seconds = self._time(
+                    lambda: self._legacy(path, name, options['max_width']), options['repeat']
+                )
+                fused, fused_seconds = self._time(
+                    lambda: self._fused(path, name, options['max_width']), options['repeat']
+                )
+                if legacy.size != fused.size:
+                    legacy = legacy.resize(fused.size, Image.Resampling.LANCZOS)
+                difference = sum(ImageStat.Stat(ImageChops.difference(legacy, fused)).mean) / 3
+                self.stdout.write(
+                    f'{name:<12} {legacy_seconds * 1000:>8.0f}ms {fused_seconds * 1000:>8.0f}ms '
+                    f'{legacy_seconds / fused_seconds:>8.1f}x {difference:>10.2f}'
+                )
+        finally:
+            if temp_path:
+                os.remove(temp_path)
+
+        self.stdout.write(
+            self.style.SUCCESS('Mean diff is the average absolute difference per channel (0-255)')
+        )
+
+    def _legacy(self, path, name, max_width):
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+        img = LEGACY_STYLES[name](img)
+        if img.width > max_width:
+            img = img.resize(
+                (max_width, int(img.height * max_width / img.width)), Image.Resampling.LANCZOS
+            )
+        return img
+
+    def _fused(self, path, name, max_width):
+        return image_styles.apply(load_scaled(path, max_width=max_width), name)
+
+    def _time(self, function, repeat):
+        best = None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            result = function()
+            seconds = time.perf_counter() - started
+            best = seconds if best is None else min(best, seconds)
+        return result, best
+
+    def _synthetic_photo(self, seed):
+        """A smooth, photo-like 6000x4000 JPEG (random colour field, upscaled and blurred)."""
+        rng = random.Random(seed)
+        small = Image.new('RGB', (60, 40))
+        small.putdata([
+            (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)) for _ in range(60 * 40)
+        ])
+        img = small.resize((6000, 4000), Image.Resampling.BICUBIC)
+        img = img.filter(ImageFilter.GaussianBlur(2))
+        handle, path = tempfile.mkstemp(suffix='.jpg')
+        os.close(handle)
+        img.save(path, 'JPEG', quality=92)
+        return path
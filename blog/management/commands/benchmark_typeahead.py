@@ -0,0 +1,101 @@
+import random
+import string
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from blog.utils.typeahead import TypeaheadIndex
+
+
+class Command(BaseCommand):
+    help = 'Measure memory use and lookup latency of the typeahead prefix index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--entries',
+            type=int,
+            default=10000,
+            help='Number of synthetic titles/names to index'
+        )
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=20000,
+            help='Number of prefix lookups to time'
+        )
+        parser.add_argument(
+            '--from-db',
+            action='store_true',
+            help='Index the real books and authors instead of synthetic entries'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for synthetic data and queries'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        if options['from_db']:
+            entries = None
+            self.stdout.write('Indexing books and authors from the database')
+        else:
+            entries = self._synthetic_entries(rng, options['entries'])
+            self.stdout.write(f'Indexing {len(entries)} synthetic entries')
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        if entries is None:
+            index = TypeaheadIndex.from_database()
+        else:
+            index = TypeaheadIndex(entries)
+        build_seconds = time.perf_counter() - started
+        index_bytes, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if not len(index):
+            self.stdout.write(self.style.WARNING('Nothing to index'))
+            return
+
+        labels = [label for label, _kind, _url, _score in index.entries]
+        queries = []
+        for _ in range(options['lookups']):
+            words = rng.choice(labels).split() or ['a']
+            word = rng.choice(words)
+            queries.append(word[:rng.randint(1, max(1, len(word)))])
+
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            index.complete(query)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+
+        def percentile(fraction):
+            return timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1e6
+
+        self.stdout.write(f'Entries indexed:   {len(index)}')
+        self.stdout.write(f'Build time:        {build_seconds * 1000:.1f} ms')
+        self.stdout.write(f'Index memory:      {index_bytes / 1024 / 1024:.2f} MB')
+        self.stdout.write(f'Lookups timed:     {len(timings)}')
+        self.stdout.write(f'Latency p50:       {percentile(0.50):.1f} µs')
+        self.stdout.write(f'Latency p95:       {percentile(0.95):.1f} µs')
+        self.stdout.write(f'Latency p99:       {percentile(0.99):.1f} µs')
+        self.stdout.write(
+            self.style.SUCCESS(f'Latency max:       {timings[-1] * 1e6:.1f} µs')
+        )
+
+    def _synthetic_entries(self, rng, count):
+        """Generate title-like labels with a skewed vocabulary."""
+        vocabulary = [
+            ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+            for _ in range(max(50, count // 4))
+        ]
+        entries = []
+        for number in range(count):
+            words = [rng.choice(vocabulary).capitalize() for _ in range(rng.randint(1, 6))]
+            kind = 'author' if number % 5 == 0 else 'book'
+            entries.append((' '.join(words), kind, f'/{kind}/{number}/', rng.randint(0, 50)))
+        return entries
@@ -0,0 +1,37 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from blog.utils import renditions
+
+
+class Command(BaseCommand):
+    help = 'Generate the responsive image renditions (card, detail, admin-thumb, avatar, ...) for every uploaded image'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate renditions even if they are up to date'
+        )
+
+    def handle(self, *args, **options):
+        generated = 0
+        failed = 0
+
+        for label, fields in renditions.FIELD_RENDITIONS.items():
+            model = apps.get_model(label)
+            queryset = model.objects.only('pk', *fields).order_by('pk')
+            for instance in queryset.iterator():
+                try:
+                    generated += renditions.ensure_for_instance(instance, force=options['force'])
+                except OSError as e:
+                    failed += 1
+                    self.stdout.write(
+                        self.style.ERROR(f'Error processing {label} {instance.pk}: {e}')
+                    )
+
+        self.stdout.write(f'Images with new renditions: {generated}')
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Images that could not be read: {failed}'))
+        self.stdout.write(
+            self.style.SUCCESS('Rendition build complete!')
+        )
@@ -1,5 +1,17 @@
 from django.core.management.base import BaseCommand
+from blog import page_cache
 from blog.models import Book, BackdropImage
+from blog.utils import parallel, renditions
+from blog.utils.processing_manifest import ProcessingManifest
+
+
+def render_cover_backdrop(item):
+    """Worker: write the whitened backdrop of a cover and its renditions; returns the file name."""
+    _book_id, cover_name = item
+    backdrop = BackdropImage(original_image=cover_name, processing_style='whitened')
+    backdrop.processed_image.name = backdrop.write_processed_image()
+    renditions.ensure_for_instance(backdrop)
+    return backdrop.processed_image.name
 
 
 class Command(BaseCommand):
@@ -11,52 +23,96 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be created without making changes'
         )
+        parallel.add_jobs_argument(parser)
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
-        
+
         books_with_covers = Book.objects.filter(cover_image__isnull=False).exclude(cover_image='')
-        
+
         self.stdout.write(f'Found {books_with_covers.count()} books with cover images')
-        
-        created_count = 0
-        
+
+        # One query for the existing names instead of one per book
+        existing_names = [name.lower() for name in BackdropImage.objects.values_list('name', flat=True)]
+        books = {}
+
         for book in books_with_covers:
             # Check if backdrop already exists
-            existing_backdrop = BackdropImage.objects.filter(name__icontains=book.title).first()
-            
-            if existing_backdrop:
+            title = book.title.lower()
+            if any(title in name for name in existing_names):
                 self.stdout.write(
                     self.style.WARNING(f'Backdrop already exists for: {book.title}')
                 )
                 continue
-            
+
             if dry_run:
                 self.stdout.write(
                     f'Would create backdrop for: {book.title}'
                 )
             else:
-                try:
-                    backdrop = book.create_backdrop_from_cover()
-                    if backdrop:
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'Created backdrop for: {book.title}'
-                            )
-                        )
-                        created_count += 1
-                    else:
-                        self.stdout.write(
-                            self.style.ERROR(f'Failed to create backdrop for: {book.title}')
-                        )
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f'Error creating backdrop for {book.title}: {e}')
-                    )
-        
-        if not dry_run:
+                books[book.id] = book
+
+        if dry_run:
+            self.stdout.write(f'\nWould create {books_with_covers.count()} backdrop images')
+            return
+
+        manifest = ProcessingManifest()
+        backdrops = []
+        items = []
+        keys = {}
+        for book in books.values():
+            backdrop = BackdropImage(
+                name=f"{book.title} Backdrop",
+                original_image=book.cover_image.name,
+                processing_style='whitened'
+            )
+            try:
+                keys[book.id] = backdrop.processing_key(manifest)
+            except OSError as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error creating backdrop for {book.title}: {e}')
+                )
+                continue
+            if manifest.is_current(backdrop.processed_path(), keys[book.id]):
+                # The same cover was already processed, e.g. for a deleted backdrop
+                backdrop.processed_image.name = backdrop.processed_name()
+                backdrops.append(backdrop)
+                self.stdout.write(
+                    self.style.SUCCESS(f'Created backdrop for: {book.title} (processed image up to date)')
+                )
+            else:
+                items.append((book.id, book.cover_image.name))
+
+        for (book_id, cover_name), processed_name, error in parallel.run(
+            render_cover_backdrop, items, options['jobs']
+        ):
+            book = books[book_id]
+            if error:
+                self.stdout.write(
+                    self.style.ERROR(f'Error creating backdrop for {book.title}: {error}')
+                )
+                continue
+            backdrop = BackdropImage(
+                name=f"{book.title} Backdrop",
+                original_image=cover_name,
+                processed_image=processed_name,
+                processing_style='whitened'
+            )
+            manifest.record(backdrop.processed_path(), keys[book_id])
+            backdrops.append(backdrop)
             self.stdout.write(
-                self.style.SUCCESS(f'\nSuccessfully created {created_count} backdrop images')
+                self.style.SUCCESS(
+                    f'Created backdrop for: {book.title}'
+                )
             )
-        else:
-            self.stdout.write(f'\nWould create {books_with_covers.count()} backdrop images') 
\ No newline at end of file
+
+        if backdrops:
+            # bulk_create skips save() (the images are already processed) and
+            # the post_save signals, so invalidate the backdrop pages here
+            BackdropImage.objects.bulk_create(backdrops)
+            page_cache.invalidate_tags('backdrops')
+        manifest.save()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'\nSuccessfully created {len(backdrops)} backdrop images')
+        )
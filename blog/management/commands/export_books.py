@@ -0,0 +1,72 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand
+from blog.models import Book
+from blog.utils import book_export
+
+
+class Command(BaseCommand):
+    help = (
+        'Export books and their reviews in the all_books.json schema (or as NDJSON), '
+        'optionally as a tar or zip archive with the cover and open-book images'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='File to write, or - for standard output'
+        )
+        parser.add_argument(
+            '--format',
+            choices=book_export.FORMATS,
+            default='json',
+            help='Write a JSON array like all_books.json, or one record per line'
+        )
+        parser.add_argument(
+            '--archive',
+            choices=book_export.ARCHIVES,
+            help='Write an archive holding the data file and the referenced images'
+        )
+        parser.add_argument(
+            '--public-only',
+            action='store_true',
+            help='Only export published public reviews, and only the books that have one'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=book_export.CHUNK_SIZE,
+            help='Books read from the database per query'
+        )
+
+    def handle(self, *args, **options):
+        exporter = book_export.Exporter(
+            Book.objects.all(), options['format'], options['archive'], max(1, options['chunk_size']),
+            public_only=options['public_only'],
+        )
+
+        output = options['output']
+        if output == '-':
+            for data in exporter.export():
+                sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+            return
+
+        # Written under a temporary name, so an interrupted export never looks complete
+        temp_path = f'{output}.tmp'
+        try:
+            with open(temp_path, 'wb') as target:
+                for data in exporter.export():
+                    target.write(data)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        os.replace(temp_path, output)
+
+        for name in exporter.missing:
+            self.stdout.write(self.style.WARNING(f'Image not found, left out: {name}'))
+        self.stdout.write(
+            self.style.SUCCESS(f'Exported {exporter.exported} books to {output}')
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from blog.utils.static_export import export_site
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the public pages (home, genres, books, authors, about) '
+        'to flat index.html/index.html.gz files. Only pages whose content changed '
+        'since the last export are rendered again. Media and static files are not '
+        'copied; serve MEDIA_ROOT and STATIC_ROOT alongside the export.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output_dir',
+            help='Directory to write the exported site into'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render every page, ignoring the previous export manifest'
+        )
+
+    def handle(self, *args, **options):
+        def progress(url):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  Rendered {url}')
+
+        counts = export_site(options['output_dir'], force=options['force'], progress=progress)
+
+        self.stdout.write(f'Rendered: {counts["rendered"]}')
+        self.stdout.write(f'Unchanged: {counts["skipped"]}')
+        self.stdout.write(f'Removed: {counts["removed"]}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Static site exported to {options["output_dir"]}')
+        )
@@ -0,0 +1,88 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from blog.utils import image_hashes, parallel
+
+
+class Command(BaseCommand):
+    help = (
+        'Find stored images that are the same picture or nearly so, by perceptual hash, '
+        'across every image field and site_images/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm',
+            choices=image_hashes.ALGORITHMS,
+            default='dhash',
+            help='Perceptual hash to compare (phash is slower but tolerates more editing)'
+        )
+        parser.add_argument(
+            '--distance',
+            type=int,
+            default=4,
+            help='Most bits (of 64) two hashes may differ in to count as duplicates; 0 = identical hashes only'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Hash every file again instead of using the cached hashes'
+        )
+        parallel.add_jobs_argument(parser)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        algorithm = options['algorithm']
+        media_root = str(settings.MEDIA_ROOT)
+        images = image_hashes.stored_images(media_root)
+        cache = image_hashes.HashCache()
+
+        hashes = {}
+        items = []
+        for name in images:
+            path = os.path.join(media_root, name)
+            cached = None if options['rebuild'] else cache.get(path, algorithm)
+            if cached is None:
+                items.append((path, algorithm))
+            else:
+                hashes[name] = cached
+        cached_count = len(hashes)
+
+        for item, result, error in parallel.run(image_hashes.hash_file, items, options['jobs']):
+            name = os.path.relpath(item[0], media_root).replace(os.sep, '/')
+            if error:
+                self.stdout.write(self.style.ERROR(f'Error hashing {name}: {error}'))
+                continue
+            hashes[name] = result
+            cache.set(item[0], algorithm, result)
+        cache.save(keep=(os.path.join(media_root, name) for name in images))
+        hashed_seconds = time.perf_counter() - started
+
+        clusters = image_hashes.cluster(hashes, max(0, options['distance']))
+        wasted = 0
+        for number, names in enumerate(clusters, 1):
+            sizes = {name: os.path.getsize(os.path.join(media_root, name)) for name in names}
+            # Everything but the largest copy could go
+            wasted += sum(sizes.values()) - max(sizes.values())
+            first = hashes[names[0]]
+            self.stdout.write(self.style.WARNING(f'\nGroup {number}: {len(names)} images'))
+            for name in names:
+                references = ', '.join(images[name]) or 'not referenced'
+                self.stdout.write(
+                    f'  {name}  {sizes[name] / 1024:.0f}KB  '
+                    f'distance {image_hashes.distance(first, hashes[name])}  ({references})'
+                )
+
+        self.stdout.write(
+            f'\nHashed {len(hashes)} images ({cached_count} cached) in {hashed_seconds:.1f}s, '
+            f'grouped in {time.perf_counter() - started - hashed_seconds:.1f}s'
+        )
+        if clusters:
+            self.stdout.write(self.style.WARNING(
+                f'{len(clusters)} groups of duplicates, {sum(map(len, clusters))} images; '
+                f'{wasted / 1024 / 1024:.1f}MB in the smaller copies'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('No duplicate images found'))
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from blog.models import BackdropImage
+from blog.utils import image_styles
 import os
 from pathlib import Path
 
@@ -19,7 +20,7 @@ class Command(BaseCommand):
             '--processing-style',
             type=str,
             default='desaturated',
-            choices=['original', 'desaturated', 'sepia', 'greyscale'],
+            choices=image_styles.BACKDROP_STYLES,
             help='Processing style for backdrop images'
         )
         parser.add_argument(
@@ -1,22 +1,31 @@
-import json
 import os
+import time
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from blog.models import Author, Book, Review
+from blog.utils import import_sources
+from blog.utils.book_import import BulkImporter, Checkpoint, RecordStream
 from django.utils.text import slugify
 from datetime import datetime
 
 
 class Command(BaseCommand):
-    help = 'Import books and reviews from JSON files'
+    help = 'Import books and reviews from a JSON, NDJSON or CSV file or a directory of JSON files'
 
     def add_arguments(self, parser):
         parser.add_argument(
+            '--source',
             '--json-file',
+            dest='json_file',
             type=str,
-            help='Path to JSON file containing books data',
+            help='Path to the books data: a JSON array, NDJSON or CSV file, or a directory of per-book JSON files',
             default='export_book_reviews/all_books.json'
         )
+        parser.add_argument(
+            '--format',
+            choices=import_sources.FORMATS,
+            help='Format of the source (detected from the path by default)'
+        )
         parser.add_argument(
             '--images-dir',
             type=str,
@@ -28,6 +37,27 @@ class Command(BaseCommand):
             action='store_true',
             help='Force import even if books already exist'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Write books and reviews in batches instead of one row at a time'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Records written per transaction with --bulk'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            help='With --bulk, record in this file how many records have been committed'
+        )
+        parser.add_argument(
+            '--resume-from',
+            type=str,
+            help='With --bulk, skip the records a checkpoint file says were committed, and keep updating it'
+        )
 
     def handle(self, *args, **options):
         json_file = options['json_file']
@@ -36,10 +66,32 @@ class Command(BaseCommand):
         
         if not os.path.exists(json_file):
             self.stdout.write(
-                self.style.ERROR(f'JSON file not found: {json_file}')
+                self.style.ERROR(f'Import source not found: {json_file}')
             )
             return
 
+        checkpoint_path = options['checkpoint'] or options['resume_from']
+        if checkpoint_path and not options['bulk']:
+            self.stdout.write(
+                self.style.ERROR('--checkpoint and --resume-from need --bulk')
+            )
+            return
+        start = 0
+        if options['resume_from']:
+            try:
+                source, start = Checkpoint.read(options['resume_from'])
+            except (OSError, ValueError, KeyError) as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Cannot read checkpoint {options["resume_from"]}: {e}')
+                )
+                return
+            if source != os.path.abspath(json_file):
+                self.stdout.write(
+                    self.style.ERROR(f'Checkpoint {options["resume_from"]} is for {source}, not {json_file}')
+                )
+                return
+            self.stdout.write(f'Resuming after {start} records')
+
         # Get or create a default user for reviews
         default_user, created = User.objects.get_or_create(
             username='admin',
@@ -58,9 +110,21 @@ class Command(BaseCommand):
             }
         )
 
+        def report_invalid(position, error):
+            self.stdout.write(
+                self.style.ERROR(f'Invalid record {position + 1}: {error}')
+            )
+
+        # Records are read and validated one at a time, never the whole file at once
+        books_data = RecordStream(
+            import_sources.read(json_file, options['format'], skip=start), start, report_invalid
+        )
+
         try:
-            with open(json_file, 'r', encoding='utf-8') as file:
-                books_data = json.load(file)
+            if options['bulk']:
+                checkpoint = Checkpoint(checkpoint_path, json_file) if checkpoint_path else None
+                self.bulk_import(books_data, default_user, default_author, force, options['chunk_size'], checkpoint)
+                return
 
             imported_count = 0
             skipped_count = 0
@@ -68,7 +132,7 @@ class Command(BaseCommand):
             for book_data in books_data:
                 try:
                     # Create or get the author
-                    author_name = book_data.get('author', 'Unknown')
+                    author_name = book_data['author']
                     if author_name == 'Unknown':
                         author = default_author
                     else:
@@ -90,7 +154,7 @@ class Command(BaseCommand):
                         title=book_data['title'],
                         author=author,
                         defaults={
-                            'description': book_data.get('description', ''),
+                            'description': book_data['description'],
                             'genre': 'non-fiction',  # Default genre
                             'slug': slug
                         }
@@ -104,7 +168,7 @@ class Command(BaseCommand):
                     else:
                         if force:
                             # Update existing book
-                            book.description = book_data.get('description', '')
+                            book.description = book_data['description']
                             book.save()
                             self.stdout.write(
                                 self.style.SUCCESS(f'Updated book: {book.title}')
@@ -116,14 +180,11 @@ class Command(BaseCommand):
                             )
                             skipped_count += 1
 
-                    # Handle rating - provide default if null
-                    rating = book_data.get('rating')
-                    if rating is None:
-                        rating = 5  # Default to 5 stars
+                    rating = book_data['rating']
 
                     # Create the review
                     review_date = datetime.strptime(
-                        book_data.get('review_date', '2025-01-01'), 
+                        book_data['review_date'] or '2025-01-01',
                         '%Y-%m-%d'
                     ).date()
 
@@ -133,7 +194,7 @@ class Command(BaseCommand):
                         reviewer=default_user,
                         defaults={
                             'title': f"Review of {book.title}",
-                            'content': book_data.get('content', ''),
+                            'content': book_data['content'],
                             'rating': rating,
                             'is_public': True
                         }
@@ -146,7 +207,7 @@ class Command(BaseCommand):
                     else:
                         if force:
                             # Update existing review
-                            review.content = book_data.get('content', '')
+                            review.content = book_data['content']
                             review.rating = rating
                             review.save()
                             self.stdout.write(
@@ -159,17 +220,52 @@ class Command(BaseCommand):
 
                 except Exception as e:
                     self.stdout.write(
-                        self.style.ERROR(f'Error importing {book_data.get("title", "Unknown")}: {str(e)}')
+                        self.style.ERROR(f'Error importing {book_data["title"]}: {str(e)}')
                     )
                     skipped_count += 1
 
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'Import completed! Imported: {imported_count}, Skipped: {skipped_count}'
+                    f'Import completed! Imported: {imported_count}, Skipped: {skipped_count}, '
+                    f'Invalid: {books_data.invalid}'
                 )
             )
 
         except Exception as e:
             self.stdout.write(
-                self.style.ERROR(f'Error reading JSON file: {str(e)}')
-            ) 
\ No newline at end of file
+                self.style.ERROR(f'Error reading {json_file}: {str(e)}')
+            ) 
+
+    def bulk_import(self, books_data, default_user, default_author, force, chunk_size, checkpoint=None):
+        """Import with BulkImporter, reporting progress after every chunk."""
+        started = time.perf_counter()
+        importer = BulkImporter(default_user, default_author, force=force, chunk_size=chunk_size)
+
+        done = books_data.position
+
+        def progress(index, result, position):
+            nonlocal done
+            done = position
+            self.stdout.write(
+                f'Chunk {index}: {result.records} records, '
+                f'books {result.books_created} created / {result.books_updated} updated, '
+                f'reviews {result.reviews_created} created / {result.reviews_updated} updated, '
+                f'{result.skipped} skipped ({position} records, {time.perf_counter() - started:.1f}s)'
+            )
+
+        try:
+            totals = importer.run(books_data, progress, checkpoint)
+        except Exception as e:
+            # Each chunk is its own transaction, so the earlier ones are kept
+            resume = f'; resume with --resume-from {checkpoint.path}' if checkpoint else ''
+            self.stdout.write(
+                self.style.ERROR(f'Import stopped after {done} records: {e}{resume}')
+            )
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Import completed! Imported: {totals.books_created + totals.books_updated}, '
+                f'Skipped: {totals.skipped}, Invalid: {books_data.invalid} '
+                f'({time.perf_counter() - started:.1f}s)'
+            )
+        )
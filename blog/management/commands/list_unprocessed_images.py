@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from blog.models import Book
+from blog.utils import title_matching
 import os
 from pathlib import Path
 
@@ -14,6 +15,12 @@ class Command(BaseCommand):
             default='media/book_covers/',
             help='Directory containing book cover images'
         )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=title_matching.DEFAULT_THRESHOLD,
+            help='Lowest match score (0-1) at which an image counts as belonging to a book'
+        )
 
     def handle(self, *args, **options):
         images_dir = options['images_dir']
@@ -30,27 +37,13 @@ class Command(BaseCommand):
             if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
                 image_files.append(filename)
         
-        # Get existing books
-        existing_books = Book.objects.all()
-        existing_titles = {book.title.lower() for book in existing_books}
-        
-        # Find unprocessed images
-        unprocessed = []
-        processed = []
-        
-        for filename in image_files:
-            potential_title = self._extract_title_from_filename(filename)
-            
-            # Check if any book title contains words from this image
-            is_processed = False
-            for book in existing_books:
-                if self._titles_match(potential_title, book.title):
-                    processed.append((filename, book.title))
-                    is_processed = True
-                    break
-            
-            if not is_processed:
-                unprocessed.append(filename)
+        # Matched the way link_book_covers links them
+        titles = dict(Book.objects.values_list('pk', 'title'))
+        index = title_matching.TitleIndex(titles.items())
+        matches, unprocessed = title_matching.assign(
+            index, ((filename, filename) for filename in image_files), options['threshold']
+        )
+        processed = [(filename, titles[pk]) for filename, (pk, _score) in matches.items()]
         
         self.stdout.write(f'Found {len(image_files)} total images')
         self.stdout.write(f'Processed: {len(processed)}')
@@ -82,15 +75,3 @@ class Command(BaseCommand):
         name = ' '.join(word.capitalize() for word in name.split())
         
         return name
-
-    def _titles_match(self, potential_title, book_title):
-        """Check if potential title matches book title."""
-        potential_words = set(potential_title.lower().split())
-        book_words = set(book_title.lower().split())
-        
-        # Check for significant word overlap
-        significant_words = {word for word in potential_words if len(word) > 3}
-        book_significant = {word for word in book_words if len(word) > 3}
-        
-        overlap = significant_words & book_significant
-        return len(overlap) >= 1  # At least one significant word matches 
\ No newline at end of file
@@ -0,0 +1,232 @@
+import io
+import os
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from blog import page_cache
+from blog.models import ImageJob
+from blog.utils import encoding, parallel, renditions
+from blog.utils.image_processor import save_webp_variant, webp_path
+from blog.utils.processing_manifest import ProcessingManifest
+
+# The uploaded images that are recompressed, with their encoding profile.
+# Processed backdrops are left to process_backdrops, which already writes
+# them with the backdrop profile, and backdrop originals are their source.
+LIBRARY_FIELDS = {
+    'book': ('blog.Book', 'cover_image', 'cover'),
+    'author': ('blog.Author', 'profile_image', 'photo'),
+    'review': ('blog.Review', 'book_images', 'review'),
+}
+
+
+def optimize_file(item):
+    """
+    Worker: re-encode one stored image with its profile. Returns
+    (old size, new size, quality, new storage name or None if nothing was written).
+    """
+    name, profile, min_saving, include_png, dry_run = item
+    path = default_storage.path(name)
+    old_size = os.path.getsize(path)
+    with Image.open(path) as source:
+        opaque_png = source.format == 'PNG' and not source.has_transparency_data
+        if not (source.format == 'JPEG' or include_png and opaque_png):
+            return old_size, old_size, None, None
+        icc_profile = source.info.get('icc_profile')
+        # The EXIF orientation is dropped with the rest of the metadata, so apply it
+        img = ImageOps.exif_transpose(source)
+        img = img.convert('L' if img.mode == 'L' else 'RGB')
+    if icc_profile:
+        img.info['icc_profile'] = icc_profile
+
+    encoded = encoding.encode_jpeg(img, profile)
+    new_size = len(encoded.data)
+    if new_size > old_size * (1 - min_saving) or dry_run:
+        return old_size, new_size, encoded.quality, None
+
+    # A new name, so browsers and caches holding the old URL never get the
+    # new bytes under it, and the rows can be switched over in one transaction
+    new_name = default_storage.save(
+        os.path.splitext(name)[0] + '.jpg', ContentFile(encoded.data)
+    )
+    if os.path.exists(webp_path(path)):
+        with Image.open(io.BytesIO(encoded.data)) as optimized:
+            save_webp_variant(optimized, default_storage.path(new_name))
+    return old_size, new_size, encoded.quality, new_name
+
+
+def image_fields():
+    """Every (model, field name) pair of the blog's ImageFields, for finding all references to a file."""
+    return [
+        (model, field.name)
+        for model in apps.get_app_config('blog').get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.ImageField)
+    ]
+
+
+def delete_file(name):
+    """Remove a stored image with its WebP variant and renditions."""
+    for stale in (name, webp_path(name)):
+        if default_storage.exists(stale):
+            default_storage.delete(stale)
+    renditions.delete(default_storage, name)
+
+
+class Command(BaseCommand):
+    help = 'Recompress uploaded images with the encoding profiles and report the bytes saved'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            choices=list(LIBRARY_FIELDS),
+            help='Only optimize the images of this model (repeatable)'
+        )
+        parser.add_argument(
+            '--min-saving',
+            type=float,
+            default=5,
+            help='Keep the original unless the new file is at least this many percent smaller'
+        )
+        parser.add_argument(
+            '--include-png',
+            action='store_true',
+            help='Also convert opaque PNG uploads to JPEG'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be saved without writing anything'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-check images already optimized with the current profiles'
+        )
+        parallel.add_jobs_argument(parser)
+
+    def handle(self, *args, **options):
+        manifest = ProcessingManifest()
+        min_saving = options['min_saving'] / 100
+        items = []
+        keys = {}
+        skipped_count = 0
+
+        # Each file once, even when several rows share it
+        for choice in options['model'] or LIBRARY_FIELDS:
+            label, field_name, profile_name = LIBRARY_FIELDS[choice]
+            model = apps.get_model(label)
+            profile = encoding.get_profile(profile_name)
+            names = (
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).distinct()
+            )
+            for name in names:
+                if name in keys:
+                    continue
+                path = default_storage.path(name)
+                try:
+                    keys[name] = manifest.key(path, style='optimized', quality=profile)
+                except OSError as e:
+                    self.stdout.write(self.style.ERROR(f'Error reading {name}: {e}'))
+                    continue
+                if not options['force'] and manifest.is_current(path, keys[name]):
+                    skipped_count += 1
+                    continue
+                items.append((name, profile, min_saving, options['include_png'], options['dry_run']))
+
+        self.stdout.write(f'Checking {len(items)} images ({skipped_count} already optimized)')
+
+        optimized_count = 0
+        bytes_before = 0
+        bytes_after = 0
+        for item, result, error in parallel.run(optimize_file, items, options['jobs']):
+            name = item[0]
+            if error:
+                self.stdout.write(self.style.ERROR(f'Error optimizing {name}: {error}'))
+                continue
+
+            old_size, new_size, quality, new_name = result
+            if quality is None:
+                self.stdout.write(f'Skipped {name} (not a JPEG)')
+                continue
+            worthwhile = new_size <= old_size * (1 - min_saving)
+            if options['dry_run']:
+                if worthwhile:
+                    self.stdout.write(
+                        f'Would optimize {name}: {old_size / 1024:.0f}KB → '
+                        f'{new_size / 1024:.0f}KB (quality {quality})'
+                    )
+                    optimized_count += 1
+                    bytes_before += old_size
+                    bytes_after += new_size
+                continue
+            if new_name is None:
+                # Already as small as the profile allows; don't check it again
+                manifest.record(default_storage.path(name), keys[name])
+                continue
+
+            if not self.switch_references(name, new_name):
+                self.stdout.write(
+                    self.style.WARNING(f'{name} is no longer used; discarded its optimized copy')
+                )
+                delete_file(new_name)
+                continue
+
+            manifest.record(
+                default_storage.path(new_name),
+                manifest.key(default_storage.path(new_name), style='optimized', quality=item[1]),
+            )
+            optimized_count += 1
+            bytes_before += old_size
+            bytes_after += new_size
+            self.stdout.write(self.style.SUCCESS(
+                f'Optimized {name} → {new_name}: {old_size / 1024:.0f}KB → '
+                f'{new_size / 1024:.0f}KB (quality {quality})'
+            ))
+
+        manifest.save()
+
+        verb = 'Would save' if options['dry_run'] else 'Saved'
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{optimized_count} images optimized\n'
+            f'{verb} {(bytes_before - bytes_after) / 1024 / 1024:.1f}MB '
+            f'({bytes_before / 1024 / 1024:.1f}MB → {bytes_after / 1024 / 1024:.1f}MB)'
+        ))
+
+    def switch_references(self, old_name, new_name):
+        """
+        Point every image field that references ``old_name`` at ``new_name``
+        in one transaction, then delete the old file once it commits. Returns
+        False if nothing references ``old_name`` any more.
+        """
+        changed = []
+        with transaction.atomic():
+            for model, field_name in image_fields():
+                rows = model.objects.select_for_update().filter(**{field_name: old_name})
+                pks = list(rows.values_list('pk', flat=True))
+                if pks:
+                    values = {field_name: new_name}
+                    # Fragment caches are keyed on updated_at, which update() leaves alone
+                    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+                        values['updated_at'] = timezone.now()
+                    model.objects.filter(pk__in=pks).update(**values)
+                    changed.append((model, pks))
+            if not changed:
+                return False
+            transaction.on_commit(lambda: delete_file(old_name))
+
+        # update() skips the post_save signals that rebuild renditions and
+        # invalidate the cached pages
+        for model, pks in changed:
+            for pk in pks:
+                ImageJob.objects.enqueue(
+                    ImageJob.BUILD_RENDITIONS, pk, {'model': model._meta.label}
+                )
+            page_cache.invalidate_tags(*page_cache.object_tags(model, pks))
+        return True
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from blog import page_cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the full-page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after displaying them'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Invalidate every cached page'
+        )
+
+    def handle(self, *args, **options):
+        stats = page_cache.stats()
+        self.stdout.write(f'Enabled:  {page_cache.is_enabled()}')
+        self.stdout.write(f'Hits:     {stats["hits"]}')
+        self.stdout.write(f'Misses:   {stats["misses"]}')
+        self.stdout.write(f'Hit rate: {stats["hit_rate"]:.1%}')
+
+        if options['reset']:
+            page_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
+
+        if options['clear']:
+            page_cache.invalidate_tags(*page_cache.BASE_TAGS)
+            self.stdout.write(self.style.SUCCESS('All cached pages invalidated'))
@@ -1,7 +1,20 @@
 from django.core.management.base import BaseCommand
-from django.conf import settings
+from django.utils import timezone
+from blog import page_cache
 from blog.models import BackdropImage
-import os
+from blog.utils import image_styles, parallel, renditions
+from blog.utils.image_processor import PeakMemory, format_peak
+from blog.utils.processing_manifest import ProcessingManifest
+
+
+def render_backdrop(item):
+    """Worker: write the processed image and its renditions; returns (file name, peak RSS)."""
+    backdrop_id, original_name, style = item
+    backdrop = BackdropImage(id=backdrop_id, original_image=original_name, processing_style=style)
+    with PeakMemory() as memory:
+        backdrop.processed_image.name = backdrop.write_processed_image()
+    renditions.ensure_for_instance(backdrop)
+    return backdrop.processed_image.name, memory.peak
 
 
 class Command(BaseCommand):
@@ -11,7 +24,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--style',
             type=str,
-            choices=['original', 'desaturated', 'sepia', 'greyscale', 'whitened'],
+            choices=image_styles.BACKDROP_STYLES,
             default='desaturated',
             help='Processing style to apply'
         )
@@ -28,8 +41,9 @@ class Command(BaseCommand):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Force reprocessing even if processed image exists'
+            help='Force reprocessing even if the processed image is up to date'
         )
+        parallel.add_jobs_argument(parser)
 
     def handle(self, *args, **options):
         style = options['style']
@@ -41,7 +55,7 @@ class Command(BaseCommand):
             # Process specific backdrop
             try:
                 backdrop = BackdropImage.objects.get(id=backdrop_id)
-                self.process_backdrop(backdrop, style, force)
+                self.process_backdrops([backdrop], style, force, options['jobs'])
             except BackdropImage.DoesNotExist:
                 self.stdout.write(
                     self.style.ERROR(f'Backdrop with ID {backdrop_id} not found')
@@ -57,8 +71,7 @@ class Command(BaseCommand):
                 return
                 
             self.stdout.write(f'Processing {backdrops.count()} backdrop images...')
-            for backdrop in backdrops:
-                self.process_backdrop(backdrop, style, force)
+            self.process_backdrops(backdrops, style, force, options['jobs'])
         else:
             # Show available backdrops
             backdrops = BackdropImage.objects.all()
@@ -75,33 +88,58 @@ class Command(BaseCommand):
             self.stdout.write('\nUse --all to process all backdrops or --backdrop-id <id> to process specific one.')
             return
 
-    def process_backdrop(self, backdrop, style, force=False):
-        """Process a single backdrop image."""
-        if not backdrop.original_image:
-            self.stdout.write(
-                self.style.ERROR(f'Backdrop "{backdrop.name}" has no original image')
-            )
-            return
-            
-        if backdrop.processed_image and not force:
-            self.stdout.write(
-                self.style.WARNING(f'Backdrop "{backdrop.name}" already has processed image. Use --force to reprocess.')
-            )
-            return
-            
-        try:
-            # Update processing style
+    def process_backdrops(self, backdrops, style, force=False, jobs=1):
+        """Process backdrop images in worker processes and save them in one batch."""
+        manifest = ProcessingManifest()
+        to_process = {}
+        keys = {}
+        for backdrop in backdrops:
+            if not backdrop.original_image:
+                self.stdout.write(
+                    self.style.ERROR(f'Backdrop "{backdrop.name}" has no original image')
+                )
+                continue
+            try:
+                needs_processing = backdrop.needs_processing(manifest, style)
+                keys[backdrop.id] = backdrop.processing_key(manifest, style)
+            except OSError as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error processing "{backdrop.name}": {e}')
+                )
+                continue
+            if not needs_processing and backdrop.processing_style == style and not force:
+                self.stdout.write(
+                    self.style.WARNING(f'Backdrop "{backdrop.name}" is already up to date. Use --force to reprocess.')
+                )
+            else:
+                to_process[backdrop.id] = backdrop
+
+        items = [(backdrop.id, backdrop.original_image.name, style) for backdrop in to_process.values()]
+        processed = []
+        for (backdrop_id, _name, _style), result, error in parallel.run(
+            render_backdrop, items, jobs
+        ):
+            backdrop = to_process[backdrop_id]
+            if error:
+                self.stdout.write(
+                    self.style.ERROR(f'Error processing "{backdrop.name}": {error}')
+                )
+                continue
+            processed_name, peak = result
             backdrop.processing_style = style
-            backdrop.save()
-            
-            # Process the image
-            backdrop.process_image()
-            
+            backdrop.processed_image.name = processed_name
+            backdrop.updated_at = timezone.now()
+            manifest.record(backdrop.processed_path(), keys[backdrop_id])
+            processed.append(backdrop)
             self.stdout.write(
-                self.style.SUCCESS(f'Successfully processed "{backdrop.name}" with {style} style')
+                self.style.SUCCESS(f'Successfully processed "{backdrop.name}" with {style} style (peak RSS {format_peak(peak)})')
             )
-            
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error processing "{backdrop.name}": {e}')
-            ) 
\ No newline at end of file
+
+        if processed:
+            # bulk_update skips save(), so nothing is processed twice, and the
+            # post_save signals, so invalidate the backdrop pages here
+            BackdropImage.objects.bulk_update(
+                processed, ['processing_style', 'processed_image', 'updated_at']
+            )
+            page_cache.invalidate_tags('backdrops')
+        manifest.save()
@@ -1,10 +1,31 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from PIL import Image
+from blog.utils import encoding, parallel
+from blog.utils.image_processor import PeakMemory, format_peak, load_scaled, save_webp_variant
+from blog.utils.processing_manifest import ProcessingManifest
 import os
 from pathlib import Path
 
 
+def process_file(item):
+    """Worker: resize and re-encode one image; returns (original size, processed size, peak RSS)."""
+    source_path, target_path, max_width, profile = item
+
+    # Get original file size
+    original_size = os.path.getsize(source_path)
+
+    with PeakMemory() as memory:
+        # Decode as RGB, straight to at most max_width
+        img = load_scaled(source_path, max_width=max_width)
+
+        # Save optimized version: a fixed quality, or the lowest the web profile allows
+        encoding.save_jpeg(img, target_path, profile)
+        save_webp_variant(img, target_path)
+
+    # Get processed file size
+    return original_size, os.path.getsize(target_path), memory.peak
+
+
 class Command(BaseCommand):
     help = 'Process high-resolution images for web optimization'
 
@@ -28,15 +49,24 @@ class Command(BaseCommand):
         parser.add_argument(
             '--quality',
             type=int,
-            default=85,
-            help='JPEG quality (1-100)',
+            help='Fixed JPEG quality (1-100); by default the lowest quality '
+                 'meeting the "web" encoding profile is searched for',
         )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-encode images even if their output is up to date',
+        )
+        parallel.add_jobs_argument(parser)
 
     def handle(self, *args, **options):
         source_dir = options['source_dir']
         target_dir = options['target_dir']
         max_width = options['max_width']
-        quality = options['quality']
+        if options['quality']:
+            profile = encoding.Profile(options['quality'], options['quality'], None, None)
+        else:
+            profile = encoding.get_profile('web')
 
         if not source_dir:
             self.stdout.write(
@@ -54,54 +84,58 @@ class Command(BaseCommand):
         processed_count = 0
         total_size_saved = 0
 
-        for filename in os.listdir(source_dir):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff')):
-                source_path = os.path.join(source_dir, filename)
-                target_path = os.path.join(target_dir, f"{Path(filename).stem}_web.jpg")
-
-                try:
-                    # Get original file size
-                    original_size = os.path.getsize(source_path)
-
-                    # Process image
-                    with Image.open(source_path) as img:
-                        # Convert to RGB if necessary
-                        if img.mode != 'RGB':
-                            img = img.convert('RGB')
-
-                        # Resize if needed
-                        if img.width > max_width:
-                            ratio = max_width / img.width
-                            new_height = int(img.height * ratio)
-                            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-
-                        # Save optimized version
-                        img.save(target_path, 'JPEG', quality=quality, optimize=True)
-
-                    # Get processed file size
-                    processed_size = os.path.getsize(target_path)
-                    size_saved = original_size - processed_size
-
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'Processed: {filename} '
-                            f'({original_size / 1024 / 1024:.1f}MB → '
-                            f'{processed_size / 1024 / 1024:.1f}MB)'
-                        )
-                    )
-
-                    processed_count += 1
-                    total_size_saved += size_saved
-
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f'Error processing {filename}: {e}')
-                    )
+        # Skip files whose output was written from the same content and settings
+        manifest = ProcessingManifest()
+        skipped_count = 0
+        items = []
+        keys = {}
+        for filename in sorted(os.listdir(source_dir)):
+            if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff')):
+                continue
+            source_path = os.path.join(source_dir, filename)
+            target_path = os.path.join(target_dir, f"{Path(filename).stem}_web.jpg")
+            try:
+                key = manifest.key(source_path, style='web', size=max_width, quality=profile)
+            except OSError as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error processing {filename}: {e}')
+                )
+                continue
+            if not options['force'] and manifest.is_current(target_path, key):
+                skipped_count += 1
+                continue
+            keys[target_path] = key
+            items.append((source_path, target_path, max_width, profile))
+
+        for item, sizes, error in parallel.run(process_file, items, options['jobs']):
+            filename = os.path.basename(item[0])
+            if error:
+                self.stdout.write(
+                    self.style.ERROR(f'Error processing {filename}: {error}')
+                )
+                continue
+
+            original_size, processed_size, peak = sizes
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Processed: {filename} '
+                    f'({original_size / 1024 / 1024:.1f}MB → '
+                    f'{processed_size / 1024 / 1024:.1f}MB, '
+                    f'peak RSS {format_peak(peak)})'
+                )
+            )
+
+            manifest.record(item[1], keys[item[1]])
+            processed_count += 1
+            total_size_saved += original_size - processed_size
+
+        manifest.save()
 
         self.stdout.write(
             self.style.SUCCESS(
                 f'\nProcessing complete!\n'
                 f'Processed {processed_count} images\n'
+                f'Skipped {skipped_count} unchanged images\n'
                 f'Total space saved: {total_size_saved / 1024 / 1024:.1f}MB'
             )
         ) 
\ No newline at end of file
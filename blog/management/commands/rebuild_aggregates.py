@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from blog.models import Author, Book
+from blog.utils import site_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored review and book counters and the site statistics'
+
+    def handle(self, *args, **options):
+        books_updated = Book.objects.all().refresh_review_stats()
+        self.stdout.write(f'Refreshed review aggregates for {books_updated} books')
+
+        authors_updated = Author.objects.all().refresh_book_count()
+        self.stdout.write(f'Refreshed book counts for {authors_updated} authors')
+
+        counts = site_stats.rebuild()
+        self.stdout.write(f'Rebuilt {len(counts)} site statistics')
+
+        self.stdout.write(
+            self.style.SUCCESS('Aggregate rebuild complete!')
+        )
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from blog import page_cache
+from blog.models import Book, Review
+
+
+class Command(BaseCommand):
+    help = 'Re-render the stored HTML, excerpts and reading times of books and reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of rows to re-render and write per batch'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        for model, tag in ((Book, 'book'), (Review, 'review')):
+            changed = self._rebuild(model, chunk_size)
+            if changed:
+                # bulk_update bypasses the signals that invalidate cached pages
+                page_cache.invalidate_tags(*(f'{tag}:{pk}' for pk in changed))
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {len(changed)} re-rendered'
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS('Rendered text rebuild complete!')
+        )
+
+    def _rebuild(self, model, chunk_size):
+        """Re-render every row, writing only those whose output changed."""
+        fields = None
+        changed_ids = []
+        batch = []
+        now = timezone.now()
+
+        for obj in model.objects.order_by('pk').iterator(chunk_size=chunk_size):
+            fields = obj.rendered_text_fields
+            before = [getattr(obj, field) for field in fields]
+            obj.render_text()
+            if [getattr(obj, field) for field in fields] == before:
+                continue
+            # Bump updated_at so fragment caches and ETags keyed on it refresh
+            obj.updated_at = now
+            batch.append(obj)
+            changed_ids.append(obj.pk)
+            if len(batch) >= chunk_size:
+                model.objects.bulk_update(batch, fields + ['updated_at'])
+                batch = []
+
+        if batch:
+            model.objects.bulk_update(batch, fields + ['updated_at'])
+        return changed_ids
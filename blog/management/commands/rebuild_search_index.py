@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from blog.utils import search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for books and published reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of books indexed per batch'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(
+                self.style.WARNING('Full-text search index requires SQLite with FTS5; skipping.')
+            )
+            return
+
+        try:
+            with transaction.atomic():
+                total = search_index.rebuild_index(chunk_size=options['chunk_size'])
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error rebuilding search index: {e}')
+            )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Search index rebuilt for {total} books')
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from blog.utils import rendition_cache
+
+
+class Command(BaseCommand):
+    help = 'Show the size of the on-demand rendition cache and optionally trim it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Evict least recently used renditions down to the size cap'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete every cached rendition'
+        )
+
+    def handle(self, *args, **options):
+        files, total = rendition_cache.usage()
+        limit = rendition_cache.max_bytes()
+        self.stdout.write(f'Directory: {rendition_cache.cache_dir()}')
+        self.stdout.write(f'Files:     {files}')
+        self.stdout.write(f'Size:      {total / 1024 / 1024:.1f} MB of {limit / 1024 / 1024:.1f} MB')
+
+        if options['clear']:
+            freed = rendition_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f'Cleared {freed / 1024 / 1024:.1f} MB'))
+        elif options['evict']:
+            freed = rendition_cache.evict()
+            self.stdout.write(self.style.SUCCESS(f'Evicted {freed / 1024 / 1024:.1f} MB'))
@@ -0,0 +1,129 @@
+import multiprocessing
+import sys
+from functools import partial
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, OutputWrapper
+from django.core.management.color import color_style
+from django.db import connections
+from blog.models import ImageJob
+from blog.utils import job_queue
+
+
+def log_job(stdout, style, job, succeeded, seconds):
+    if succeeded:
+        line = style.SUCCESS(
+            f'[{job_queue.worker_name()}] {job.get_kind_display()} #{job.object_id}: '
+            f'{job.message or "done"} ({seconds:.1f}s)'
+        )
+    else:
+        line = style.ERROR(
+            f'[{job_queue.worker_name()}] {job.get_kind_display()} #{job.object_id} failed '
+            f'(attempt {job.attempts}/{job.max_attempts}): {job.last_error}'
+        )
+    stdout.write(line)
+    # Lines from several worker processes share the terminal
+    stdout.flush()
+
+
+def run_worker(options, stdout=None, style=None):
+    """Entry point of each worker process."""
+    # Under the spawn start method the process starts with a fresh interpreter
+    if not apps.ready:
+        django.setup()
+    try:
+        return job_queue.work(
+            lease_seconds=options['lease'],
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+            max_jobs=options['max_jobs'],
+            kinds=options['kind'],
+            log=partial(log_job, stdout or OutputWrapper(sys.stdout), style or color_style()),
+        )
+    except KeyboardInterrupt:
+        return 0
+
+
+class Command(BaseCommand):
+    help = 'Run background image jobs (backdrop processing, renditions) from the job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Number of worker processes to start'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs'
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            help='Exit after running this many jobs (per process)'
+        )
+        parser.add_argument(
+            '--kind',
+            action='append',
+            choices=[kind for kind, _label in ImageJob.KIND_CHOICES],
+            help='Only run jobs of this kind (repeatable)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls of an empty queue'
+        )
+        parser.add_argument(
+            '--lease',
+            type=int,
+            default=job_queue.LEASE_SECONDS,
+            help='Seconds a claimed job stays leased without progress before others may take it'
+        )
+
+    def handle(self, *args, **options):
+        worker_options = {
+            key: options[key]
+            for key in ('lease', 'poll_interval', 'burst', 'max_jobs', 'kind')
+        }
+        queued = ImageJob.objects.filter(status=ImageJob.QUEUED).count()
+        self.stdout.write(
+            f'Starting {options["processes"]} image worker(s), {queued} jobs queued'
+        )
+
+        if options['processes'] <= 1:
+            processed = run_worker(worker_options, self.stdout, self.style)
+            self.stdout.write(self.style.SUCCESS(f'Worker stopped after {processed} jobs'))
+            return
+
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        # A forked worker writes through this command's stdout; a spawned
+        # one cannot receive it and writes to its own sys.stdout
+        if multiprocessing.get_start_method() == 'fork':
+            worker_args = (worker_options, self.stdout, self.style)
+        else:
+            worker_args = (worker_options,)
+        workers = [
+            multiprocessing.Process(target=run_worker, args=worker_args)
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # The workers got the same SIGINT; a job interrupted mid-way is
+            # claimed again once its lease runs out
+            for worker in workers:
+                worker.join()
+
+        failed = [worker for worker in workers if worker.exitcode]
+        if failed:
+            self.stdout.write(self.style.ERROR(f'{len(failed)} worker(s) exited with an error'))
+            sys.exit(1)
+        self.stdout.write(self.style.SUCCESS('All workers stopped'))
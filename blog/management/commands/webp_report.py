@@ -0,0 +1,90 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+from blog.utils.image_processor import save_webp_variant, webp_path
+
+
+class Command(BaseCommand):
+    help = 'Report the bytes saved by the WebP variants of each class of image under MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--root',
+            type=str,
+            help='Directory to scan (defaults to MEDIA_ROOT)'
+        )
+        parser.add_argument(
+            '--create-missing',
+            action='store_true',
+            help='Write WebP variants for JPEG/PNG files that do not have one yet'
+        )
+
+    def handle(self, *args, **options):
+        root = options['root'] or str(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            self.stdout.write(self.style.ERROR(f'Directory {root} does not exist'))
+            return
+
+        # image class -> [files, files with webp, original bytes, webp bytes]
+        totals = defaultdict(lambda: [0, 0, 0, 0])
+        created = 0
+
+        for directory, _subdirectories, filenames in os.walk(root):
+            image_class = os.path.relpath(directory, root)
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    continue
+                path = os.path.join(directory, filename)
+                variant = webp_path(path)
+
+                if options['create_missing'] and not os.path.exists(variant):
+                    try:
+                        with Image.open(path) as img:
+                            save_webp_variant(img, path)
+                        created += 1
+                    except Exception as e:
+                        self.stdout.write(
+                            self.style.ERROR(f'Error converting {path}: {e}')
+                        )
+
+                row = totals[image_class]
+                row[0] += 1
+                if os.path.exists(variant):
+                    # Compare like with like: only files that have both formats
+                    row[1] += 1
+                    row[2] += os.path.getsize(path)
+                    row[3] += os.path.getsize(variant)
+
+        if not totals:
+            self.stdout.write(self.style.WARNING('No JPEG or PNG images found'))
+            return
+
+        self.stdout.write(
+            f'{"Image class":<40} {"Files":>6} {"WebP":>6} {"Original":>10} {"WebP":>10} {"Saved":>7}'
+        )
+        all_original = all_webp = 0
+        for image_class in sorted(totals):
+            files, with_webp, original, webp = totals[image_class]
+            all_original += original
+            all_webp += webp
+            self.stdout.write(
+                f'{image_class:<40} {files:>6} {with_webp:>6} '
+                f'{original / 1024:>8.0f}KB {webp / 1024:>8.0f}KB {self._saved(original, webp):>7}'
+            )
+
+        if created:
+            self.stdout.write(f'Created {created} WebP variants')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Total: {all_original / 1024 / 1024:.1f}MB → {all_webp / 1024 / 1024:.1f}MB '
+                f'({self._saved(all_original, all_webp)} saved)'
+            )
+        )
+
+    def _saved(self, original, webp):
+        if not original:
+            return '-'
+        return f'{(original - webp) / original:.0%}'
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_aggregates(apps, schema_editor):
+    """Fill the new counter columns from the existing rows."""
+    Author = apps.get_model("blog", "Author")
+    Book = apps.get_model("blog", "Book")
+    Review = apps.get_model("blog", "Review")
+
+    reviews = Review.objects.filter(book=OuterRef("pk")).order_by().values("book")
+    published = reviews.filter(is_public=True, status="published")
+    Book.objects.update(
+        review_count=Coalesce(
+            Subquery(reviews.annotate(total=Count("pk")).values("total")), 0
+        ),
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(total=Sum("rating")).values("total")), 0
+        ),
+        published_review_count=Coalesce(
+            Subquery(published.annotate(total=Count("pk")).values("total")), 0
+        ),
+    )
+
+    books = (
+        Book.objects.filter(author=OuterRef("pk"))
+        .order_by()
+        .values("author")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Author.objects.update(book_count=Coalesce(Subquery(books), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0005_review_book_images_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="author",
+            name="book_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Number of books by this author (maintained automatically)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="published_review_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Number of published public reviews (maintained automatically)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Sum of all review ratings (maintained automatically)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="review_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Number of reviews of this book (maintained automatically)",
+            ),
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Full-text search table for SearchView (SQLite FTS5 only)
+
+from django.db import migrations
+
+CREATE_TABLE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS blog_book_search USING fts5("
+    "title, author, description, isbn, reviews, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+POPULATE_SQL = """
+INSERT INTO blog_book_search (rowid, title, author, description, isbn, reviews)
+SELECT b.id, b.title, a.name, b.description, b.isbn,
+       COALESCE((SELECT group_concat(r.title || char(10) || r.content, char(10) || char(10))
+                 FROM blog_review r
+                 WHERE r.book_id = b.id AND r.is_public AND r.status = 'published'), '')
+FROM blog_book b
+JOIN blog_author a ON a.id = b.author_id
+"""
+
+
+def create_search_table(apps, schema_editor):
+    """Create and fill the FTS5 table; skipped where FTS5 is unavailable."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        options = {row[0] for row in cursor.fetchall()}
+        if "ENABLE_FTS5" not in options:
+            return
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(POPULATE_SQL)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS blog_book_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0006_book_review_aggregates"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:46
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_statistics(apps, schema_editor):
+    """Count the existing books and reviews into the new table."""
+    Book = apps.get_model("blog", "Book")
+    Review = apps.get_model("blog", "Review")
+    SiteStatistic = apps.get_model("blog", "SiteStatistic")
+
+    counts = {"books": Book.objects.count()}
+    for genre, total in Book.objects.order_by().values_list("genre").annotate(Count("pk")):
+        counts[f"genre:{genre}"] = total
+    for status, total in Review.objects.order_by().values_list("status").annotate(Count("pk")):
+        counts[f"status:{status}"] = total
+    counts["reviews:published"] = Review.objects.filter(
+        is_public=True, status="published"
+    ).count()
+    SiteStatistic.objects.bulk_create(
+        SiteStatistic(name=name, value=value) for name, value in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0007_book_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteStatistic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Site Statistic",
+                "verbose_name_plural": "Site Statistics",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.RunPython(populate_statistics, migrations.RunPython.noop),
+    ]
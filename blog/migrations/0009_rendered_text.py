@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:53
+
+from django.db import migrations, models
+
+from blog.utils.rendering import summarize
+
+
+def render_existing_text(apps, schema_editor):
+    """Pre-render the text of existing books and reviews."""
+    Book = apps.get_model("blog", "Book")
+    Review = apps.get_model("blog", "Review")
+    for model, source, html_field in (
+        (Book, "description", "description_html"),
+        (Review, "content", "content_html"),
+    ):
+        objects = list(model.objects.all())
+        for obj in objects:
+            html, obj.excerpt, obj.word_count, obj.reading_time = summarize(
+                getattr(obj, source)
+            )
+            setattr(obj, html_field, html)
+        model.objects.bulk_update(
+            objects, [html_field, "excerpt", "word_count", "reading_time"], batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0008_sitestatistic"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="description_html",
+            field=models.TextField(blank=True, editable=False, help_text="Description rendered to HTML (maintained automatically)"),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False, help_text="Plain-text opening of the description (maintained automatically)"),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="reading_time",
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Estimated reading time in minutes"),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="review",
+            name="content_html",
+            field=models.TextField(blank=True, editable=False, help_text="Content rendered from Markdown to HTML (maintained automatically)"),
+        ),
+        migrations.AddField(
+            model_name="review",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False, help_text="Plain-text opening of the review (maintained automatically)"),
+        ),
+        migrations.AddField(
+            model_name="review",
+            name="reading_time",
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Estimated reading time in minutes"),
+        ),
+        migrations.AddField(
+            model_name="review",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(render_existing_text, migrations.RunPython.noop),
+    ]
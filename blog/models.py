@@ -1,23 +1,59 @@
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 from django.urls import reverse
-from PIL import Image
+from django.utils import timezone
+from datetime import timedelta
+from collections import Counter
 import os
 
+from . import page_cache
+from .utils import encoding, image_styles, site_stats
+from .utils.image_processor import load_scaled, save_webp_variant
+from .utils.processing_manifest import ProcessingManifest
+from .utils.rendering import summarize
 
-class BackdropImage(models.Model):
+
+class TrackedFieldsMixin:
+    """
+    Remember the stored values of ``tracked_fields`` so signal handlers can
+    tell what a save changed (e.g. a review moved to another book).
+
+    ``loaded_value(field)`` returns the value as last loaded or saved, or
+    None for an instance that has never been saved.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            field: instance.__dict__.get(field) for field in cls.tracked_fields
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save handlers have seen the previous values; track the new ones
+        self._loaded_values = {field: getattr(self, field) for field in self.tracked_fields}
+
+    def loaded_value(self, field):
+        return getattr(self, '_loaded_values', {}).get(field)
+
+
+class BackdropImage(TrackedFieldsMixin, models.Model):
     """
     Model for managing backdrop/background images with processing options.
     """
-    PROCESSING_CHOICES = [
-        ('original', 'Original Color'),
-        ('desaturated', 'Low Saturation'),
-        ('sepia', 'Sepia Tone'),
-        ('greyscale', 'Greyscale'),
-        ('whitened', 'Whitened Backdrop'),
-    ]
+    PROCESSING_CHOICES = image_styles.choices()
+    # Parameters of the processed image, part of its processing manifest key
+    PROCESSED_MAX_WIDTH = 1920
+    PROCESSED_PROFILE = 'backdrop'
+    tracked_fields = ('original_image', 'processing_style')
     
     name = models.CharField(max_length=200, help_text="Descriptive name for the backdrop")
     original_image = models.ImageField(
@@ -51,104 +87,147 @@ class BackdropImage(models.Model):
     def __str__(self):
         return self.name
 
-    def process_image(self):
+    def process_image(self, manifest=None):
         """Process the original image according to the selected style."""
         if not self.original_image:
             return
-            
-        # Open the original image
-        img = Image.open(self.original_image.path)
-        
-        # Convert to RGB if necessary
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+
+        own_manifest = manifest is None
+        manifest = manifest or ProcessingManifest()
+        key = self.processing_key(manifest)
+
+        # Update the processed_image field
+        self.processed_image.name = self.write_processed_image()
+        manifest.record(self.processed_path(), key)
+        if own_manifest:
+            manifest.save()
+        self.save()
+
+    def processing_key(self, manifest, style=None):
+        """Manifest key of the processed image for the current original and ``style``."""
+        return manifest.key(
+            self.original_image.path,
+            style=style or self.processing_style,
+            size=self.PROCESSED_MAX_WIDTH,
+            quality=encoding.get_profile(self.PROCESSED_PROFILE),
+        )
+
+    def needs_processing(self, manifest=None, style=None):
+        """
+        True unless the processed image was written from the current original
+        with ``style`` (default: the current processing style).
+        """
+        if not self.original_image or not os.path.exists(self.original_image.path):
+            return False
+        if not self.processed_image:
+            return True
+        manifest = manifest or ProcessingManifest()
+        return not manifest.is_current(
+            self.processed_path(), self.processing_key(manifest, style)
+        )
+
+    def processed_path(self):
+        """Where the processed version of the original image is written."""
+        original_path = self.original_image.path
+        marker = os.path.join('site_images', 'backdrops', '')
+        if marker in original_path:
+            return original_path.replace(marker, os.path.join(marker, 'processed', ''))
+        # Originals shared with other fields (book covers) must not be overwritten
+        return os.path.join(
+            str(self.original_image.storage.location),
+            'site_images', 'backdrops', 'processed', os.path.basename(original_path)
+        )
+
+    def write_processed_image(self):
+        """
+        Write the processed image file and return its storage name, without
+        saving this instance (so it can run in a worker process).
+        """
+        # Decode the original as RGB, straight to web size (max 1920px width),
+        # so the styles below run on the small image
+        img = load_scaled(self.original_image.path, max_width=self.PROCESSED_MAX_WIDTH)
         
         # Apply processing based on style
-        if self.processing_style == 'desaturated':
-            # Reduce saturation by 60%
-            img = self._desaturate_image(img, 0.4)
-        elif self.processing_style == 'sepia':
-            img = self._apply_sepia(img)
-        elif self.processing_style == 'greyscale':
-            img = img.convert('L').convert('RGB')
-        elif self.processing_style == 'whitened':
-            img = self._whiten_backdrop(img)
-        
-        # Resize for web optimization (max 1920px width)
-        img = self._resize_image(img, max_width=1920)
+        img = image_styles.apply(img, self.processing_style)
         
         # Save processed image
-        processed_path = self.original_image.path.replace(
-            'site_images/backdrops/',
-            'site_images/backdrops/processed/'
-        )
+        processed_path = self.processed_path()
         
         # Ensure directory exists
         os.makedirs(os.path.dirname(processed_path), exist_ok=True)
         
-        # Save with quality optimization
-        img.save(processed_path, 'JPEG', quality=85, optimize=True)
+        # Save at the lowest quality the backdrop encoding profile allows
+        encoding.save_jpeg(img, processed_path, self.PROCESSED_PROFILE)
+        save_webp_variant(img, processed_path)
         
-        # Update the processed_image field
-        self.processed_image.name = processed_path.replace(
+        return self.processed_name()
+
+    def processed_name(self):
+        """Storage name of ``processed_path()``."""
+        return self.processed_path().replace(
             str(self.original_image.storage.location) + '/', ''
         )
-        self.save()
 
-    def _desaturate_image(self, img, factor=0.4):
-        """Reduce saturation of an image."""
-        # Convert to HSV, reduce saturation, convert back
-        hsv = img.convert('HSV')
-        h, s, v = hsv.split()
-        s = s.point(lambda x: int(x * factor))
-        hsv = Image.merge('HSV', (h, s, v))
-        return hsv.convert('RGB')
-
-    def _apply_sepia(self, img):
-        """Apply sepia tone to an image."""
-        # Sepia matrix
-        sepia_matrix = [
-            0.393, 0.769, 0.189,
-            0.349, 0.686, 0.168,
-            0.272, 0.534, 0.131
-        ]
-        return img.convert('RGB', matrix=sepia_matrix)
-
-    def _resize_image(self, img, max_width=1920):
-        """Resize image maintaining aspect ratio."""
-        if img.width <= max_width:
-            return img
+    def save(self, *args, **kwargs):
+        """Override save to queue processing if original or style has changed."""
+        original = self.loaded_value('original_image')
+        changed = (
+            self._state.adding
+            or not self.processed_image
+            or getattr(original, 'name', original) != self.original_image.name
+            or self.loaded_value('processing_style') != self.processing_style
+        )
+        super().save(*args, **kwargs)
         
-        ratio = max_width / img.width
-        new_height = int(img.height * ratio)
-        return img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+        # The job compares the processing manifest (which hashes the original),
+        # so saves that only touch other fields, such as the worker's own
+        # process_image(), cost nothing here
+        if changed and self.original_image:
+            ImageJob.objects.enqueue(ImageJob.PROCESS_BACKDROP, self.pk)
 
-    def _whiten_backdrop(self, img):
-        """Create a whitened backdrop effect by increasing brightness and reducing contrast."""
-        from PIL import ImageEnhance
-        
-        # Increase brightness
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(1.3)  # 30% brighter
-        
-        # Reduce contrast slightly
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(0.8)  # 20% less contrast
-        
-        # Reduce saturation
-        enhancer = ImageEnhance.Color(img)
-        img = enhancer.enhance(0.6)  # 40% less saturation
-        
-        return img
+
+class RenderedTextMixin:
+    """
+    Pre-render ``rendered_text_source`` (Markdown) on save into the
+    ``rendered_html_field``, ``excerpt``, ``word_count`` and ``reading_time``
+    fields, so templates never process text per request.
+    """
+    rendered_text_source = None
+    rendered_html_field = None
+
+    @property
+    def rendered_text_fields(self):
+        return [self.rendered_html_field, 'excerpt', 'word_count', 'reading_time']
+
+    def render_text(self):
+        """Refresh the rendered fields from the source text."""
+        html, self.excerpt, self.word_count, self.reading_time = summarize(
+            getattr(self, self.rendered_text_source)
+        )
+        setattr(self, self.rendered_html_field, html)
 
     def save(self, *args, **kwargs):
-        """Override save to process image if original has changed."""
-        is_new = self.pk is None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.rendered_text_source in update_fields:
+            self.render_text()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.rendered_text_fields)
         super().save(*args, **kwargs)
-        
-        # Process image if it's new or the original has changed
-        if is_new or hasattr(self, '_original_image_changed'):
-            self.process_image()
+
+
+class AuthorQuerySet(models.QuerySet):
+    """QuerySet helpers for maintaining the denormalized author counters."""
+
+    def refresh_book_count(self):
+        """Recompute the stored book_count for every author in this queryset."""
+        books = (
+            Book.objects.filter(author=OuterRef('pk'))
+            .order_by()
+            .values('author')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.update(book_count=Coalesce(Subquery(books), 0))
 
 
 class Author(models.Model):
@@ -166,9 +245,16 @@ class Author(models.Model):
         null=True,
         help_text="Author's profile photo"
     )
+    book_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of books by this author (maintained automatically)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AuthorQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         verbose_name = "Author"
@@ -182,7 +268,57 @@ class Author(models.Model):
         return reverse('author-detail', args=[str(self.id)])
 
 
-class Book(models.Model):
+class BookQuerySet(models.QuerySet):
+    """QuerySet helpers for maintaining the denormalized review aggregates."""
+
+    def update(self, **kwargs):
+        """
+        Keep Author.book_count, the per-genre counters and the cached genre
+        pages correct when books are moved between authors or genres.
+        """
+        moves_author = 'author' in kwargs or 'author_id' in kwargs
+        moves_genre = 'genre' in kwargs
+        if not moves_author and not moves_genre:
+            return super().update(**kwargs)
+
+        rows = list(self.order_by().values_list('pk', 'author_id', 'genre'))
+        if moves_genre:
+            # The cards show the genre and their fragments are keyed on updated_at
+            kwargs.setdefault('updated_at', timezone.now())
+        updated = super().update(**kwargs)
+
+        if moves_author:
+            author_ids = {author_id for _pk, author_id, _genre in rows}
+            new_author = kwargs.get('author', kwargs.get('author_id'))
+            author_ids.add(getattr(new_author, 'pk', new_author))
+            Author.objects.filter(pk__in=author_ids).refresh_book_count()
+        if moves_genre:
+            deltas = Counter({site_stats.genre_key(kwargs['genre']): len(rows)})
+            for _pk, _author_id, genre in rows:
+                deltas[site_stats.genre_key(genre)] -= 1
+            site_stats.adjust(deltas)
+            genres = {genre for _pk, _author_id, genre in rows} | {kwargs['genre']}
+            page_cache.invalidate_tags(
+                'books',
+                *(f'genre:{genre}' for genre in genres),
+                *(f'book:{pk}' for pk, _author_id, _genre in rows),
+            )
+        return updated
+
+    def refresh_review_stats(self):
+        """Recompute the stored review aggregates for every book in this queryset."""
+        reviews = Review.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        published = reviews.filter(is_public=True, status='published')
+        return self.update(
+            review_count=Coalesce(Subquery(reviews.annotate(total=Count('pk')).values('total')), 0),
+            rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+            published_review_count=Coalesce(
+                Subquery(published.annotate(total=Count('pk')).values('total')), 0
+            ),
+        )
+
+
+class Book(RenderedTextMixin, TrackedFieldsMixin, models.Model):
     """
     Model representing a book.
     Demonstrates foreign key relationships and field validation.
@@ -210,9 +346,45 @@ class Book(models.Model):
     description = models.TextField(blank=True, help_text="Book description/summary")
     cover_image = models.ImageField(upload_to='book_covers/', blank=True, null=True)
     slug = models.SlugField(max_length=300, unique=True, blank=True)
+    review_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of reviews of this book (maintained automatically)"
+    )
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Sum of all review ratings (maintained automatically)"
+    )
+    published_review_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of published public reviews (maintained automatically)"
+    )
+    description_html = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Description rendered to HTML (maintained automatically)"
+    )
+    excerpt = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Plain-text opening of the description (maintained automatically)"
+    )
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Estimated reading time in minutes"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookQuerySet.as_manager()
+    tracked_fields = ('author_id', 'genre')
+    rendered_text_source = 'description'
+    rendered_html_field = 'description_html'
+
     class Meta:
         ordering = ['-publication_date', 'title']
         verbose_name = "Book"
@@ -233,10 +405,9 @@ class Book(models.Model):
 
     @property
     def average_rating(self):
-        """Calculate average rating from all reviews."""
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
+        """Average rating of all reviews, from the stored aggregates."""
+        if self.review_count:
+            return self.rating_sum / self.review_count
         return 0
 
     def create_backdrop_from_cover(self):
@@ -254,7 +425,29 @@ class Book(models.Model):
         return backdrop
 
 
-class Review(models.Model):
+# Sent after ReviewQuerySet.update() with the ids of the affected books and
+# the names of the updated fields, since bulk updates bypass post_save.
+reviews_bulk_updated = Signal()
+
+
+class ReviewQuerySet(models.QuerySet):
+    """QuerySet that reports bulk updates so derived data can be kept in step."""
+
+    def update(self, **kwargs):
+        """Update the reviews, then send reviews_bulk_updated for the affected books."""
+        book_ids = set(self.order_by().values_list('book_id', flat=True))
+        updated = super().update(**kwargs)
+        new_book = kwargs.get('book', kwargs.get('book_id'))
+        if new_book is not None:
+            book_ids.add(getattr(new_book, 'pk', new_book))
+        if book_ids:
+            reviews_bulk_updated.send(
+                sender=self.model, book_ids=book_ids, fields=set(kwargs)
+            )
+        return updated
+
+
+class Review(RenderedTextMixin, TrackedFieldsMixin, models.Model):
     """
     Model representing a book review.
     Demonstrates user relationships, validation, and rich text content.
@@ -286,9 +479,30 @@ class Review(models.Model):
         help_text="Review status"
     )
     is_public = models.BooleanField(default=True, help_text="Whether this review is publicly visible")
+    content_html = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Content rendered from Markdown to HTML (maintained automatically)"
+    )
+    excerpt = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Plain-text opening of the review (maintained automatically)"
+    )
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Estimated reading time in minutes"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ReviewQuerySet.as_manager()
+    tracked_fields = ('book_id', 'status', 'is_public')
+    rendered_text_source = 'content'
+    rendered_html_field = 'content_html'
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Review"
@@ -306,3 +520,180 @@ class Review(models.Model):
     def rating_stars(self):
         """Return rating as stars (★) for display."""
         return '★' * self.rating + '☆' * (5 - self.rating)
+
+
+class SiteStatistic(models.Model):
+    """
+    A named site-wide counter, such as the number of books, books per genre
+    or reviews per status. Maintained incrementally by blog.utils.site_stats
+    so the home page header never has to run aggregate queries.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Site Statistic"
+        verbose_name_plural = "Site Statistics"
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class ImageJobQuerySet(models.QuerySet):
+    """Queue operations for ImageJob; see blog.utils.job_queue for the workers."""
+
+    def enqueue(self, kind, object_id, payload=None, priority=0):
+        """
+        Queue ``kind`` for ``object_id`` and return the job. A job for the
+        same work that is still waiting is reused (its priority raised and
+        payload merged) rather than queued twice.
+        """
+        payload = payload or {}
+        waiting = self.filter(kind=kind, object_id=object_id, status=ImageJob.QUEUED)
+        if 'model' in payload:
+            waiting = waiting.filter(payload__model=payload['model'])
+        job = waiting.order_by('pk').first()
+        if job is None:
+            return self.create(kind=kind, object_id=object_id, payload=payload, priority=priority)
+        job.priority = max(job.priority, priority)
+        job.payload = {**job.payload, **payload}
+        # A job waiting to retry runs now that it was asked for again
+        job.run_after = min(job.run_after, timezone.now())
+        job.save(update_fields=['priority', 'payload', 'run_after', 'updated_at'])
+        return job
+
+    def claimable(self, now=None):
+        """Queued jobs that are due, and running jobs whose worker's lease ran out."""
+        now = now or timezone.now()
+        return self.filter(
+            Q(status=ImageJob.QUEUED, run_after__lte=now)
+            | Q(status=ImageJob.RUNNING, locked_until__lt=now, attempts__lt=F('max_attempts'))
+        )
+
+    def claim(self, worker, lease_seconds, kinds=None):
+        """
+        Lease the most urgent claimable job to ``worker`` and return it, or
+        None. The conditional UPDATE only succeeds for one of several
+        workers racing for the same row, so no row locks are needed.
+        """
+        now = timezone.now()
+        candidates = self.claimable(now)
+        if kinds:
+            candidates = candidates.filter(kind__in=kinds)
+        job_ids = candidates.order_by('-priority', 'run_after', 'pk').values_list('pk', flat=True)[:10]
+        for job_id in job_ids:
+            claimed = self.claimable(now).filter(pk=job_id).update(
+                status=ImageJob.RUNNING,
+                locked_by=worker,
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=F('attempts') + 1,
+                progress=0,
+                message='',
+                started_at=now,
+                updated_at=now,
+            )
+            if claimed:
+                return self.get(pk=job_id)
+        return None
+
+    def fail_expired(self):
+        """Fail running jobs whose lease ran out after their last allowed attempt."""
+        now = timezone.now()
+        return self.filter(
+            status=ImageJob.RUNNING, locked_until__lt=now, attempts__gte=F('max_attempts')
+        ).update(
+            status=ImageJob.FAILED, last_error='Worker lease expired', finished_at=now, updated_at=now
+        )
+
+
+class ImageJob(models.Model):
+    """
+    A unit of background image work (processing a backdrop, building
+    renditions) for the ``run_image_worker`` processes. Workers lease a job
+    for a limited time; a job whose worker dies is picked up again once the
+    lease runs out, and failures are retried with backoff up to
+    ``max_attempts``.
+    """
+    PROCESS_BACKDROP = 'process_backdrop'
+    BUILD_RENDITIONS = 'build_renditions'
+    KIND_CHOICES = [
+        (PROCESS_BACKDROP, 'Process backdrop'),
+        (BUILD_RENDITIONS, 'Build renditions'),
+    ]
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    message = models.CharField(max_length=200, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ImageJobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Image Job"
+        verbose_name_plural = "Image Jobs"
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} ({self.status})"
+
+    def _update(self, **fields):
+        """Write ``fields`` to this job, only while this worker still holds it."""
+        fields['updated_at'] = timezone.now()
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return ImageJob.objects.filter(pk=self.pk, locked_by=self.locked_by).update(**fields)
+
+    def set_progress(self, percent, message='', lease_seconds=None):
+        """Record progress and, with ``lease_seconds``, extend the lease."""
+        fields = {'progress': percent, 'message': message[:200]}
+        if lease_seconds:
+            fields['locked_until'] = timezone.now() + timedelta(seconds=lease_seconds)
+        self._update(**fields)
+
+    def mark_done(self, message=''):
+        self._update(
+            status=self.DONE, progress=100, message=message[:200],
+            locked_until=None, finished_at=timezone.now(),
+        )
+
+    def mark_failed(self, error, retry_delay):
+        """Queue a retry after ``retry_delay`` seconds, or fail for good after the last attempt."""
+        if self.attempts < self.max_attempts:
+            self._update(
+                status=self.QUEUED, last_error=error, locked_until=None,
+                run_after=timezone.now() + timedelta(seconds=retry_delay),
+            )
+        else:
+            self._update(
+                status=self.FAILED, last_error=error, locked_until=None,
+                finished_at=timezone.now(),
+            )
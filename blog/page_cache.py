@@ -0,0 +1,204 @@
+"""
+Full-page response cache for anonymous visitors, invalidated by tags.
+
+Each cached page records the tags of the objects it was rendered from
+(``book:12``, ``author:3``, ``review:40``, ``genre:fiction``, ...) together
+with the current version of every tag. Invalidating a tag just gives it a
+new version, so a lookup is one cache read for the page plus one
+``get_many`` for its tags; any changed or missing tag version is a miss.
+The signal handlers in ``blog.signals`` invalidate the tags whenever an
+admin edits content.
+
+Tag versions live in the Django cache, so with several worker processes
+configure a shared backend (file, database, Memcached, Redis) in CACHES.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+PAGE_KEY_PREFIX = 'blog:page:'
+TAG_KEY_PREFIX = 'blog:page-tag:'
+HITS_KEY = 'blog:page-cache:hits'
+# Response headers kept with a cached page; the validators let a hit answer 304
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+MISSES_KEY = 'blog:page-cache:misses'
+
+# Every cached page depends on these
+BASE_TAGS = {'backdrops'}
+
+
+def is_enabled():
+    return getattr(settings, 'BLOG_PAGE_CACHE', True)
+
+
+def _timeout():
+    return getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 600)
+
+
+def _tag_key(tag):
+    return f'{TAG_KEY_PREFIX}{tag}'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def invalidate_tags(*tags):
+    """Give each tag a new version, invalidating every page that depends on it."""
+    version = _new_version()
+    cache.set_many({_tag_key(tag): version for tag in tags}, None)
+
+
+def _current_versions(tags):
+    """Return the current version of each tag, creating missing ones."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def stats():
+    """Return the hit and miss counters shared by all workers."""
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def get_cached_response(key):
+    """Return the cached HttpResponse for ``key`` if all its tags are current."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    tag_keys = [_tag_key(tag) for tag in entry['tags']]
+    current = cache.get_many(tag_keys)
+    if len(current) != len(tag_keys):
+        return None
+    for tag, version in entry['tags'].items():
+        if current[_tag_key(tag)] != version:
+            return None
+
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers'].items():
+        response[header] = value
+    return response
+
+
+def store_response(key, response, versions):
+    """
+    Cache a rendered response with its tag versions, as returned by
+    ``_current_versions()`` before the page was rendered.
+    """
+    cache.set(key, {
+        'tags': versions,
+        'content': response.content,
+        'status': response.status_code,
+        'headers': {header: response[header] for header in STORED_HEADERS if response.has_header(header)},
+    }, _timeout())
+
+
+class CachedPageMixin:
+    """
+    View mixin that serves anonymous GET requests from the page cache.
+
+    Views override ``get_page_cache_tags(context)`` to name the objects the
+    rendered page depends on. It goes before ``ConditionalGetMixin``, so a
+    hit skips the validator query: the ETag and Last-Modified stored with
+    the page answer ``If-None-Match``/``If-Modified-Since`` instead.
+    """
+
+    def get_page_cache_tags(self, context):
+        return set()
+
+    def get_page_cache_key(self, request):
+        return f'{PAGE_KEY_PREFIX}{request.get_full_path()}'
+
+    def _page_cache_applies(self, request):
+        if not is_enabled() or request.method not in ('GET', 'HEAD'):
+            return False
+        user = getattr(request, 'user', None)
+        return user is None or not user.is_authenticated
+
+    def dispatch(self, request, *args, **kwargs):
+        use_cache = self._page_cache_applies(request)
+        key = self.get_page_cache_key(request)
+        if use_cache:
+            response = get_cached_response(key)
+            if response is not None:
+                _increment(HITS_KEY)
+                response['X-Page-Cache'] = 'HIT'
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+                    response=response,
+                )
+            _increment(MISSES_KEY)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'add_post_render_callback'):
+            # Exposed on every rendered response, e.g. for the static export
+            response.page_cache_tags = self.get_page_cache_tags(response.context_data or {}) | BASE_TAGS
+            if use_cache and response.status_code == 200:
+                # Taken before rendering, which still reads the database: a
+                # tag invalidated meanwhile leaves the stored page stale
+                versions = _current_versions(response.page_cache_tags)
+
+                def store(rendered):
+                    if rendered.status_code == 200 and not rendered.cookies:
+                        store_response(key, rendered, versions)
+                response.add_post_render_callback(store)
+        if use_cache:
+            response['X-Page-Cache'] = 'MISS'
+        return response
+
+
+def book_list_tags(books):
+    """Tags for a page that shows a list of book cards."""
+    tags = set()
+    for book in books:
+        tags.add(f'book:{book.pk}')
+        tags.add(f'author:{book.author_id}')
+    return tags
+
+
+def object_tags(model, pks):
+    """Tags of the pages showing these rows, e.g. after ``update()`` skipped the signals."""
+    label = model._meta.label
+    if label == 'blog.Book':
+        tags = ['books']
+        for pk, author_id, genre in model.objects.filter(pk__in=pks).values_list('pk', 'author_id', 'genre'):
+            tags += [f'book:{pk}', f'author:{author_id}', f'genre:{genre}']
+        return tags
+    if label == 'blog.Author':
+        return [f'author:{pk}' for pk in pks]
+    if label == 'blog.Review':
+        tags = ['reviews']
+        for pk, book_id in model.objects.filter(pk__in=pks).values_list('pk', 'book_id'):
+            tags += [f'review:{pk}', f'book:{book_id}']
+        return tags
+    return ['backdrops']
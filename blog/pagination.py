@@ -0,0 +1,242 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+Offset pagination costs a COUNT(*) plus an OFFSET scan that grows with the
+page number. Keyset pagination instead remembers the ordering values of the
+last row shown and asks for the rows after it, so every page costs the same
+as the first. The cursor is an opaque token holding those values; the
+primary key is always appended to the ordering as a unique tiebreaker.
+
+Enable it with ``BLOG_CURSOR_PAGINATION = True`` in settings.
+"""
+import base64
+import binascii
+import datetime
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without its millisecond truncation, which would skip rows."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, direction):
+    """Pack ordering values and a direction ('n'ext or 'p'revious) into a token."""
+    payload = json.dumps({'v': values, 'd': direction}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Unpack a cursor token; returns (values, direction) or None if it is invalid."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+    if not isinstance(values, list) or direction not in ('n', 'p'):
+        return None
+    return values, direction
+
+
+def get_ordering(queryset):
+    """
+    Return the queryset ordering as ``[(field_name, descending), ...]``.
+
+    Uses the explicit order_by() if any, else the model's Meta.ordering,
+    and always ends with the primary key so the ordering is total.
+    """
+    pk_name = queryset.model._meta.pk.name
+    ordering = []
+    for item in queryset.query.order_by or queryset.model._meta.ordering:
+        if not isinstance(item, str) or item == '?':
+            raise ValueError(f'Cursor pagination cannot order by {item!r}')
+        name = item.lstrip('-')
+        ordering.append((pk_name if name == 'pk' else name, item.startswith('-')))
+    if pk_name not in {name for name, _descending in ordering}:
+        ordering.append((pk_name, False))
+    return ordering
+
+
+def _order_expressions(ordering):
+    # NULLs sort last when descending and first when ascending, so
+    # reversing the direction also reverses where the NULLs fall.
+    return [
+        F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_first=True)
+        for name, descending in ordering
+    ]
+
+
+def _equal(name, value):
+    return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+
+def _after(name, descending, value):
+    """Condition for rows strictly after ``value`` in one ordering column, or None."""
+    if descending:
+        if value is None:
+            return None
+        return Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+    if value is None:
+        return Q(**{f'{name}__isnull': False})
+    return Q(**{f'{name}__gt': value})
+
+
+def keyset_filter(ordering, values):
+    """Build the Q object selecting rows that sort after ``values``."""
+    clauses = []
+    for position, (name, descending) in enumerate(ordering):
+        after = _after(name, descending, values[position])
+        if after is None:
+            continue
+        equal = [_equal(ordering[i][0], values[i]) for i in range(position)]
+        clauses.append(reduce(and_, equal + [after]))
+    if not clauses:
+        return Q(pk__in=[])
+    return reduce(or_, clauses)
+
+
+def _field(queryset, name):
+    """The field (or annotation's output field) an ordering name refers to."""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    model = queryset.model
+    *relations, last = name.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(last)
+
+
+def coerce_values(queryset, ordering, values):
+    """
+    Convert decoded cursor values to the ordering fields' Python types.
+
+    Cursors come from the query string, so any value a field rejects makes
+    the whole cursor invalid (None) instead of failing in the query.
+    """
+    coerced = []
+    for (name, _descending), value in zip(ordering, values):
+        if value is None:
+            coerced.append(None)
+            continue
+        try:
+            coerced.append(_field(queryset, name).to_python(value))
+        except (ValidationError, TypeError, ValueError):
+            return None
+    return coerced
+
+
+def _row_values(obj, ordering):
+    values = []
+    for name, _descending in ordering:
+        value = obj
+        for part in name.split('__'):
+            value = getattr(value, part)
+        values.append(value)
+    return values
+
+
+class CursorPage:
+    """A page of results with opaque cursors for the neighbouring pages."""
+
+    is_cursor_page = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate_by_cursor(queryset, per_page, cursor=None):
+    """Return the CursorPage of ``queryset`` that follows (or precedes) ``cursor``."""
+    ordering = get_ordering(queryset)
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded and len(decoded[0]) != len(ordering):
+        decoded = None
+    if decoded:
+        # A tampered cursor starts again from the first page
+        values = coerce_values(queryset, ordering, decoded[0])
+        decoded = (values, decoded[1]) if values is not None else None
+
+    backwards = decoded is not None and decoded[1] == 'p'
+    scan_ordering = [(name, not descending) for name, descending in ordering] if backwards else ordering
+
+    page_query = queryset.order_by(*_order_expressions(scan_ordering))
+    if decoded is not None:
+        page_query = page_query.filter(keyset_filter(scan_ordering, decoded[0]))
+
+    rows = list(page_query[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return CursorPage([], None, None)
+
+    first_values = _row_values(rows[0], ordering)
+    last_values = _row_values(rows[-1], ordering)
+    if backwards:
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, decoded is not None
+    return CursorPage(
+        rows,
+        encode_cursor(last_values, 'n') if has_next else None,
+        encode_cursor(first_values, 'p') if has_previous else None,
+    )
+
+
+class CursorPaginationMixin:
+    """
+    ListView mixin that switches to keyset pagination when enabled.
+
+    The cursor is read from the ``cursor`` query parameter. No COUNT query
+    is issued, so ``paginator`` is None in the template context.
+    """
+    cursor_query_param = 'cursor'
+
+    @property
+    def cursor_pagination(self):
+        return getattr(settings, 'BLOG_CURSOR_PAGINATION', False)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.cursor_pagination:
+            return super().paginate_queryset(queryset, page_size)
+
+        page = paginate_by_cursor(
+            queryset, page_size, self.request.GET.get(self.cursor_query_param)
+        )
+        return (None, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,203 @@
+"""
+Signal handlers that keep derived data in step with the content models:
+the denormalized counters on Book and Author, the full-text search index,
+the typeahead index, the tagged page cache, the site statistics and the
+responsive image renditions (built by the image job workers).
+"""
+import logging
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import page_cache
+from .models import Author, BackdropImage, Book, ImageJob, Review, reviews_bulk_updated
+from .utils import renditions, search_index, site_stats, typeahead
+
+# Review fields that feed Book's stored aggregates and the search index
+AGGREGATE_FIELDS = {'book', 'book_id', 'rating', 'status', 'is_public'}
+SEARCH_FIELDS = {'book', 'book_id', 'status', 'is_public', 'title', 'content'}
+
+logger = logging.getLogger(__name__)
+
+
+def _affected_book_ids(review):
+    book_ids = {review.book_id, review.loaded_value('book_id')}
+    book_ids.discard(None)
+    return book_ids
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_book_review_stats(sender, instance, raw=False, **kwargs):
+    """Recompute the review aggregates and index rows of the book(s) a review belongs to."""
+    if raw:
+        return
+    book_ids = _affected_book_ids(instance)
+    Book.objects.filter(pk__in=book_ids).refresh_review_stats()
+    search_index.index_books(book_ids)
+
+
+@receiver(reviews_bulk_updated, sender=Review)
+def refresh_after_bulk_review_update(sender, book_ids, fields, **kwargs):
+    """Apply the same refreshes after a bulk queryset.update() on reviews."""
+    if AGGREGATE_FIELDS & fields:
+        Book.objects.filter(pk__in=book_ids).refresh_review_stats()
+    if SEARCH_FIELDS & fields:
+        search_index.index_books(book_ids)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def refresh_author_book_count(sender, instance, raw=False, **kwargs):
+    """Recompute the book count of the author(s) a book belongs to."""
+    if raw:
+        return
+    author_ids = {instance.author_id, instance.loaded_value('author_id')}
+    author_ids.discard(None)
+    Author.objects.filter(pk__in=author_ids).refresh_book_count()
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, **kwargs):
+    """Refresh the search index row of a saved book."""
+    if not raw:
+        search_index.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    """Remove a deleted book from the search index."""
+    search_index.remove_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def reindex_author_books(sender, instance, raw=False, created=False, **kwargs):
+    """Author names are indexed with each book, so reindex the author's books."""
+    if raw or created:
+        return
+    search_index.index_books(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_typeahead(sender, raw=False, **kwargs):
+    """Titles, names and review counts all feed the typeahead index."""
+    if not raw:
+        typeahead.invalidate()
+
+
+@receiver(reviews_bulk_updated, sender=Review)
+def invalidate_typeahead_after_bulk_update(sender, fields, **kwargs):
+    """Publishing or moving reviews changes the typeahead ranking."""
+    if AGGREGATE_FIELDS & fields:
+        typeahead.invalidate()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_pages(sender, instance, raw=False, **kwargs):
+    """Pages showing the book, its author, its genre or the catalogue listing."""
+    if not raw:
+        page_cache.invalidate_tags(
+            f'book:{instance.pk}', f'author:{instance.author_id}',
+            f'genre:{instance.genre}', 'books',
+        )
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.invalidate_tags(f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_pages(sender, instance, raw=False, **kwargs):
+    """Pages showing the review, the book(s) it belongs to and the review totals."""
+    if not raw:
+        book_tags = [f'book:{book_id}' for book_id in _affected_book_ids(instance)]
+        page_cache.invalidate_tags(f'review:{instance.pk}', 'reviews', *book_tags)
+
+
+@receiver(reviews_bulk_updated, sender=Review)
+def invalidate_pages_after_bulk_review_update(sender, book_ids, **kwargs):
+    """Review detail pages are tagged with their book, so book tags cover them."""
+    page_cache.invalidate_tags('reviews', *(f'book:{book_id}' for book_id in book_ids))
+
+
+@receiver(post_save, sender=BackdropImage)
+@receiver(post_delete, sender=BackdropImage)
+def invalidate_backdrop_pages(sender, raw=False, **kwargs):
+    if not raw:
+        page_cache.invalidate_tags('backdrops')
+
+
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, raw=False, created=False, **kwargs):
+    """Adjust the total and per-genre book counters."""
+    if raw:
+        return
+    deltas = Counter({site_stats.genre_key(instance.genre): 1})
+    if created:
+        deltas[site_stats.BOOKS] += 1
+    else:
+        deltas[site_stats.genre_key(instance.loaded_value('genre'))] -= 1
+    site_stats.adjust(deltas)
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance, **kwargs):
+    site_stats.adjust({site_stats.BOOKS: -1, site_stats.genre_key(instance.genre): -1})
+
+
+@receiver(post_save, sender=Review)
+def count_saved_review(sender, instance, raw=False, created=False, **kwargs):
+    """Adjust the per-status and published review counters."""
+    if raw:
+        return
+    deltas = Counter(site_stats.review_keys(instance.status, instance.is_public))
+    if not created:
+        deltas.subtract(site_stats.review_keys(
+            instance.loaded_value('status'), instance.loaded_value('is_public')
+        ))
+    site_stats.adjust(deltas)
+
+
+@receiver(post_delete, sender=Review)
+def count_deleted_review(sender, instance, **kwargs):
+    deltas = Counter()
+    deltas.subtract(site_stats.review_keys(instance.status, instance.is_public))
+    site_stats.adjust(deltas)
+
+
+@receiver(reviews_bulk_updated, sender=Review)
+def recount_after_bulk_review_update(sender, fields, **kwargs):
+    """Bulk updates don't say which rows changed status, so recount."""
+    if {'status', 'is_public'} & fields:
+        site_stats.rebuild()
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=BackdropImage)
+def queue_image_renditions(sender, instance, raw=False, **kwargs):
+    """Queue the responsive renditions of any new or replaced image for the image workers."""
+    if raw:
+        return
+    try:
+        current = renditions.is_current_for_instance(instance)
+    except OSError:
+        # An unreadable upload should not stop the save; the original is still served
+        logger.warning('Could not check renditions for %r', instance, exc_info=True)
+        return
+    if not current:
+        ImageJob.objects.enqueue(
+            ImageJob.BUILD_RENDITIONS, instance.pk, {'model': instance._meta.label}
+        )
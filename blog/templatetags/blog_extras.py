@@ -1,5 +1,7 @@
 from django import template
 
+from blog.utils import renditions
+
 register = template.Library()
 
 @register.filter
@@ -28,4 +30,13 @@ def display_rating(rating):
         return "No rating"
     
     stars = star_rating(rating)
-    return f"{stars} ({rating:.1f})" 
\ No newline at end of file
+    return f"{stars} ({rating:.1f})"
+
+
+@register.simple_tag
+def responsive_image(image, rendition, alt='', **attrs):
+    """
+    Emit an <img> for a named rendition of an image field, with srcset,
+    sizes, width and height, e.g. {% responsive_image book.cover_image "card" alt=book.title %}.
+    """
+    return renditions.img_tag(image, rendition, alt, **attrs)
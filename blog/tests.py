@@ -1,3 +1,576 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import page_cache
+from .models import Author, Book, ImageJob, Review
+from .pagination import encode_cursor, paginate_by_cursor
+from .utils import (
+    book_export, import_sources, job_queue, rendition_cache, search_index, site_stats, typeahead,
+)
+from .utils.book_import import Checkpoint
+from .utils.rendering import render_markdown
+from .utils.typeahead import TypeaheadIndex
+
+
+class TypeaheadIndexTests(SimpleTestCase):
+    def labels(self, index, query):
+        return [label for label, _kind, _url, _score in index.complete(query)]
+
+    def test_short_prefixes_after_a_shorter_key(self):
+        # "c" of "Vitamin C" sorts before "cooking" and "crash course"
+        index = TypeaheadIndex([
+            ('Vitamin C', 'book', '/vitamin-c/', 0),
+            ('Crash Course', 'book', '/crash-course/', 0),
+            ('Cooking', 'book', '/cooking/', 0),
+        ])
+        self.assertEqual(self.labels(index, 'c'), ['Cooking', 'Crash Course', 'Vitamin C'])
+        self.assertEqual(self.labels(index, 'co'), ['Cooking', 'Crash Course'])
+        self.assertEqual(self.labels(index, 'coo'), ['Cooking'])
+        self.assertEqual(self.labels(index, 'cr'), ['Crash Course'])
+        self.assertEqual(self.labels(index, 'cra'), ['Crash Course'])
+        self.assertEqual(self.labels(index, 'cras'), ['Crash Course'])
+
+
+class TypeaheadRebuildTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for name, value in (('_index', None), ('_index_version', None), ('_rebuilding', False)):
+            patcher = mock.patch.object(typeahead, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.author = Author.objects.create(name='Ursula Le Guin')
+
+    def labels(self, index):
+        return [label for label, _kind, _url, _score in index.complete('dispossessed')]
+
+    @mock.patch.object(typeahead, 'connections')
+    @mock.patch.object(typeahead, 'Thread')
+    def test_stale_index_serves_while_rebuilding(self, thread, _connections):
+        stale = typeahead.get_index()
+        Book.objects.create(title='The Dispossessed', author=self.author)
+
+        # Both lookups get the old index; only one rebuild starts
+        self.assertIs(typeahead.get_index(), stale)
+        self.assertIs(typeahead.get_index(), stale)
+        self.assertEqual(thread.call_count, 1)
+        self.assertEqual(self.labels(stale), [])
+
+        kwargs = thread.call_args.kwargs
+        kwargs['target'](*kwargs['args'])
+        fresh = typeahead.get_index()
+        self.assertIsNot(fresh, stale)
+        self.assertEqual(self.labels(fresh), ['The Dispossessed'])
+        self.assertEqual(thread.call_count, 1)
+
+
+class RenderMarkdownTests(SimpleTestCase):
+    def test_nul_characters_in_the_input(self):
+        self.assertEqual(render_markdown('a \x000\x00 b `c`'), '<p>a 0 b <code>c</code></p>')
+
+    def test_protocol_relative_links_are_not_linked(self):
+        self.assertEqual(render_markdown('[x](//evil.example)'), '<p>[x](//evil.example)</p>')
+        self.assertEqual(render_markdown('[x](/\\evil.example)'), '<p>[x](/\\evil.example)</p>')
+        self.assertEqual(render_markdown('[x](/books/)'), '<p><a href="/books/" rel="nofollow">x</a></p>')
+
+
+class ReadJsonArrayTests(SimpleTestCase):
+    def read(self, text, skip=0):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as source:
+            source.write(text)
+        self.addCleanup(os.remove, source.name)
+        return list(import_sources.read_json_array(source.name, skip=skip))
+
+    def test_malformed_element_in_the_middle(self):
+        records = self.read('[{"title": "a"}, {"title": bad, "x": [1, "],"]}, {"title": "c"}]')
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0], {'title': 'a'})
+        self.assertIsInstance(records[1], import_sources.InvalidRecord)
+        self.assertIn('element 2', str(records[1]))
+        self.assertEqual(records[2], {'title': 'c'})
+
+    def test_resume_after_a_malformed_element(self):
+        records = self.read('[{"title": "a"}, {"title": bad}, {"title": "c"}]', skip=2)
+        self.assertEqual(records, [{'title': 'c'}])
+
+    def test_oversized_element_is_skipped(self):
+        big = json.dumps({'title': 'b' * 200})
+        with mock.patch.object(import_sources, 'MAX_RECORD_SIZE', 50), \
+                mock.patch.object(import_sources, 'READ_SIZE', 16):
+            records = self.read(f'[{{"title": "a"}}, {big}, {{"title": "c"}}]')
+        self.assertEqual(records[0], {'title': 'a'})
+        self.assertIsInstance(records[1], import_sources.InvalidRecord)
+        self.assertEqual(records[2], {'title': 'c'})
+
+    def test_truncated_file(self):
+        records = self.read('[{"title": "a"}, {"title": "b')
+        self.assertEqual(records[0], {'title': 'a'})
+        self.assertIsInstance(records[1], import_sources.InvalidRecord)
+        self.assertEqual(len(records), 2)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Ann Author')
+        dates = [None, datetime.date(2001, 1, 1), datetime.date(2001, 1, 1), None, datetime.date(1999, 5, 5)]
+        for number, date in enumerate(dates * 2):
+            Book.objects.create(title=f'Book {number}', author=author, publication_date=date)
+        cls.queryset = Book.objects.order_by('-publication_date')
+        # Descending puts the NULLs last, ties broken by id
+        cls.expected = sorted(
+            Book.objects.all(),
+            key=lambda book: (book.publication_date is None, -(book.publication_date or datetime.date.min).toordinal(), book.pk),
+        )
+
+    def pages(self, cursor=None, backwards=False):
+        pages = []
+        while True:
+            page = paginate_by_cursor(self.queryset, 3, cursor)
+            pages.append(list(page))
+            cursor = page.previous_cursor if backwards else page.next_cursor
+            if cursor is None:
+                return pages
+
+    def test_forward_paging_with_nulls(self):
+        pages = self.pages()
+        self.assertEqual([book for page in pages for book in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+
+    def test_backward_paging(self):
+        last = None
+        page = paginate_by_cursor(self.queryset, 3)
+        while page.next_cursor:
+            last = page.next_cursor
+            page = paginate_by_cursor(self.queryset, 3, last)
+        pages = self.pages(page.previous_cursor, backwards=True)
+        self.assertEqual([book for page in reversed(pages) for book in page], self.expected[:9])
+
+    def test_tampered_cursor_starts_at_the_first_page(self):
+        first = list(paginate_by_cursor(self.queryset, 3))
+        for values in (['2001-13-45', 1], [{'a': 1}, 1], ['2001-01-01', 'x'], [[1], 2]):
+            with self.subTest(values=values):
+                self.assertEqual(list(paginate_by_cursor(self.queryset, 3, encode_cursor(values, 'n'))), first)
+        self.assertEqual(list(paginate_by_cursor(self.queryset, 3, 'not a cursor')), first)
+
+
+class ContentTestCase(TestCase):
+    """Shared fixtures: two authors, their books and a reviewer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reviewer = User.objects.create(username='reader')
+        cls.other_reviewer = User.objects.create(username='critic')
+        cls.ann = Author.objects.create(name='Ann Leckie')
+        cls.bob = Author.objects.create(name='Bob Shaw')
+        cls.sword = Book.objects.create(
+            title='Ancillary Sword', author=cls.ann, genre='sci-fi',
+            description='A ship that was once a soldier.',
+        )
+        cls.justice = Book.objects.create(
+            title='Ancillary Justice', author=cls.ann, genre='sci-fi',
+            description='Revenge across the galaxy.',
+        )
+        cls.orbitsville = Book.objects.create(
+            title='Orbitsville', author=cls.bob, genre='fiction', description='A Dyson sphere.',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def review(self, book, rating=4, status='published', is_public=True, reviewer=None, **fields):
+        return Review.objects.create(
+            book=book, reviewer=reviewer or self.reviewer, rating=rating, title=f'On {book.title}',
+            content=fields.pop('content', 'Worth reading.'), status=status, is_public=is_public, **fields
+        )
+
+    def assertStatsCurrent(self):
+        """The incrementally kept statistics match a full recount."""
+        stats = site_stats.get_stats()
+        counts = site_stats.compute()
+        self.assertEqual(stats['books'], counts[site_stats.BOOKS])
+        self.assertEqual(stats['published_reviews'], counts[site_stats.PUBLISHED_REVIEWS])
+        for genre, total in stats['genres'].items():
+            self.assertEqual(total, counts[site_stats.genre_key(genre)], genre)
+        for status, total in stats['statuses'].items():
+            self.assertEqual(total, counts[site_stats.status_key(status)], status)
+
+
+class DerivedCounterTests(ContentTestCase):
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_review_saves_update_the_book_aggregates(self):
+        first = self.review(self.sword, rating=4)
+        self.review(self.sword, rating=2, status='draft', reviewer=self.other_reviewer)
+        self.refresh(self.sword)
+        self.assertEqual((self.sword.review_count, self.sword.rating_sum, self.sword.published_review_count), (2, 6, 1))
+
+        # Moving a review refreshes both books
+        first.book = self.justice
+        first.save()
+        self.refresh(self.sword, self.justice)
+        self.assertEqual((self.sword.review_count, self.sword.published_review_count), (1, 0))
+        self.assertEqual((self.justice.review_count, self.justice.rating_sum), (1, 4))
+
+        first.delete()
+        self.refresh(self.justice)
+        self.assertEqual((self.justice.review_count, self.justice.rating_sum), (0, 0))
+
+    def test_review_queryset_update_refreshes_the_book_aggregates(self):
+        self.review(self.sword, status='draft')
+        self.review(self.sword, status='draft', reviewer=self.other_reviewer)
+        Review.objects.filter(book=self.sword).update(status='published')
+        self.refresh(self.sword)
+        self.assertEqual(self.sword.published_review_count, 2)
+
+        Review.objects.filter(book=self.sword).update(book=self.justice)
+        self.refresh(self.sword, self.justice)
+        self.assertEqual((self.sword.review_count, self.justice.review_count), (0, 2))
+        self.assertStatsCurrent()
+
+    def test_book_saves_update_the_author_count(self):
+        self.refresh(self.ann, self.bob)
+        self.assertEqual((self.ann.book_count, self.bob.book_count), (2, 1))
+        self.sword.author = self.bob
+        self.sword.save()
+        self.refresh(self.ann, self.bob)
+        self.assertEqual((self.ann.book_count, self.bob.book_count), (1, 2))
+        self.orbitsville.delete()
+        self.refresh(self.bob)
+        self.assertEqual(self.bob.book_count, 1)
+
+    def test_book_queryset_update_moves_authors_and_genres(self):
+        Book.objects.filter(author=self.ann).update(author=self.bob)
+        self.refresh(self.ann, self.bob)
+        self.assertEqual((self.ann.book_count, self.bob.book_count), (0, 3))
+
+        site_stats.get_stats()
+        Book.objects.filter(genre='sci-fi').update(genre='fantasy')
+        self.assertEqual(site_stats.get_stats()['genres']['fantasy'], 2)
+        self.assertEqual(site_stats.get_stats()['genres']['sci-fi'], 0)
+        self.assertStatsCurrent()
+
+
+class SiteStatsTests(ContentTestCase):
+    def test_counters_follow_saves_and_deletes(self):
+        site_stats.rebuild()
+        draft = self.review(self.sword, status='draft')
+        self.review(self.justice, is_public=False, reviewer=self.other_reviewer)
+        self.assertStatsCurrent()
+        self.assertEqual(site_stats.get_stats()['published_reviews'], 0)
+
+        draft.status = 'published'
+        draft.save()
+        self.assertEqual(site_stats.get_stats()['published_reviews'], 1)
+        self.orbitsville.genre = 'history'
+        self.orbitsville.save()
+        Book.objects.create(title='Kindred', author=self.bob, genre='history')
+        self.assertEqual(site_stats.get_stats()['genres']['history'], 2)
+        self.sword.delete()
+        self.assertEqual(site_stats.get_stats()['books'], 3)
+        self.assertStatsCurrent()
+
+    def test_reads_come_from_the_cache(self):
+        site_stats.get_stats()
+        with self.assertNumQueries(0):
+            site_stats.get_stats()
+
+
+class SearchIndexTests(ContentTestCase):
+    def search(self, query):
+        return list(search_index.search_books(Book.objects.all(), query))
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertTrue(search_index.is_available())
+        ship = Book.objects.create(title='The Ship Who Sang', author=self.bob)
+        self.assertEqual(self.search('ship'), [ship, self.sword])
+
+    def test_prefixes_authors_and_review_text(self):
+        self.assertEqual(set(self.search('ancil')), {self.sword, self.justice})
+        self.assertEqual(self.search('shaw'), [self.orbitsville])
+        self.review(self.orbitsville, content='Big dumb object at its best.')
+        self.review(self.justice, content='A dumb plot.', status='draft', reviewer=self.other_reviewer)
+        # Only published public reviews are indexed
+        self.assertEqual(self.search('dumb'), [self.orbitsville])
+
+    def test_punctuation_is_not_query_syntax(self):
+        self.assertEqual(self.search('"ancillary (sword*'), [self.sword])
+        self.assertEqual(self.search('***'), [])
+
+    def test_search_view_falls_back_to_icontains(self):
+        with mock.patch.object(search_index, 'is_available', return_value=False):
+            response = self.client.get(reverse('blog:search'), {'q': 'dyson'})
+        self.assertEqual(list(response.context['books']), [self.orbitsville])
+
+    def test_cached_result_cards_show_each_query_snippet(self):
+        self.client.get(reverse('blog:search'), {'q': 'ship'})
+        response = self.client.get(reverse('blog:search'), {'q': 'soldier'})
+        self.assertContains(response, '<mark>soldier</mark>')
+        self.assertNotContains(response, '<mark>ship</mark>')
+
+    def test_admin_title_search_ignores_other_columns(self):
+        ids = Book.objects.filter(pk__in=search_index.matching_book_ids('galaxy', ['title']))
+        self.assertFalse(ids.exists())
+        ids = Book.objects.filter(pk__in=search_index.matching_book_ids('galaxy'))
+        self.assertEqual(list(ids), [self.justice])
+
+
+@override_settings(BLOG_PAGE_CACHE=True)
+class PageCacheTests(ContentTestCase):
+    def get(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def test_tag_invalidation(self):
+        book_url = reverse('blog:book-detail', args=[self.sword.slug])
+        self.assertEqual(self.get(book_url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.get(book_url)['X-Page-Cache'], 'HIT')
+
+        # Another book's change leaves the page cached; its own does not
+        self.orbitsville.save()
+        self.assertEqual(self.get(book_url)['X-Page-Cache'], 'HIT')
+        self.review(self.sword)
+        self.assertEqual(self.get(book_url)['X-Page-Cache'], 'MISS')
+        self.ann.save()
+        self.assertEqual(self.get(book_url)['X-Page-Cache'], 'MISS')
+
+    def test_listing_follows_bulk_genre_updates(self):
+        genre_url = reverse('blog:genre-books', args=['fantasy'])
+        self.get(genre_url)
+        self.assertEqual(self.get(genre_url)['X-Page-Cache'], 'HIT')
+        Book.objects.filter(pk=self.sword.pk).update(genre='fantasy')
+        response = self.get(genre_url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertEqual(list(response.context['books']), [self.sword])
+
+    def test_invalidated_while_rendering_is_not_stored_current(self):
+        versions = page_cache._current_versions({'books'})
+        page_cache.invalidate_tags('books')
+        response = self.get(reverse('blog:home'))
+        page_cache.store_response('blog:page:/test', response, versions)
+        self.assertIsNone(page_cache.get_cached_response('blog:page:/test'))
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.force_login(self.reviewer)
+        self.assertNotIn('X-Page-Cache', self.get(reverse('blog:home')))
+
+
+class ConditionalGetTests(ContentTestCase):
+    def test_unchanged_page_answers_304(self):
+        url = reverse('blog:book-detail', args=[self.sword.slug])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Also when the page itself is served from the page cache
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.review(self.sword)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_search_validators_cover_reviews(self):
+        url = reverse('blog:search')
+        etag = self.client.get(url, {'q': 'orbitsville'})['ETag']
+        self.review(self.orbitsville, status='draft')
+        self.assertNotEqual(self.client.get(url, {'q': 'orbitsville'})['ETag'], etag)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.source = os.path.join(self.directory, 'books.json')
+        self.checkpoint = os.path.join(self.directory, 'checkpoint.json')
+        records = [
+            {'title': 'Foo', 'author': 'Ann', 'content': 'One', 'rating': 4},
+            {'title': 'Foo', 'author': 'Bob', 'content': 'Two', 'rating': 'None'},
+            {'title': 'Bar', 'author': 'Ann', 'content': 'Three', 'review_date': 'yesterday'},
+            {'title': 'Baz', 'author': '', 'content': 'Four', 'rating': 2},
+            {'title': 'Foo', 'author': 'Cy', 'content': 'Five', 'rating': 3},
+        ]
+        with open(self.source, 'w') as source:
+            json.dump(records, source)
+
+    def run_import(self, *args):
+        call_command(
+            'import_books', '--source', self.source, '--bulk', '--chunk-size', '2',
+            *args, stdout=io.StringIO(),
+        )
+
+    def test_import_with_checkpoint(self):
+        self.run_import('--checkpoint', self.checkpoint)
+        self.assertEqual(
+            sorted(Book.objects.values_list('title', 'author__name', 'slug')),
+            [('Baz', 'Unknown', 'baz'), ('Foo', 'Ann', 'foo'), ('Foo', 'Bob', 'foo-1'), ('Foo', 'Cy', 'foo-2')],
+        )
+        self.assertEqual(Review.objects.get(book__author__name='Bob').rating, 5)
+        self.assertEqual(Author.objects.get(name='Ann').book_count, 1)
+        # The invalid record (bad review_date) counts as consumed
+        self.assertEqual(Checkpoint.read(self.checkpoint), (os.path.abspath(self.source), 5))
+
+    def test_resume_skips_committed_records(self):
+        Checkpoint(self.checkpoint, self.source).save(3)
+        self.run_import('--resume-from', self.checkpoint)
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['Baz', 'Foo'])
+        self.assertEqual(Checkpoint.read(self.checkpoint)[1], 5)
+
+    def test_reimport_updates_instead_of_duplicating(self):
+        self.run_import()
+        self.run_import('--force')
+        self.assertEqual(Book.objects.count(), 4)
+        self.assertEqual(Review.objects.count(), 4)
+
+
+class ExportTests(ContentTestCase):
+    def export(self, **options):
+        exporter = book_export.Exporter(Book.objects.all(), **options)
+        return exporter, b''.join(exporter.export())
+
+    def test_json_export_has_the_earliest_review(self):
+        self.review(self.sword, rating=5, content='First.')
+        self.review(self.sword, rating=1, content='Second.', reviewer=self.other_reviewer)
+        exporter, data = self.export()
+        records = {record['title']: record for record in json.loads(data)}
+        self.assertEqual(exporter.exported, 3)
+        self.assertEqual((records['Ancillary Sword']['content'], records['Ancillary Sword']['rating']), ('First.', 5))
+        self.assertEqual(records['Orbitsville']['author'], 'Bob Shaw')
+        self.assertEqual(records['Orbitsville']['source_file'], 'Orbitsville.json')
+
+    def test_public_only_leaves_out_drafts_and_private_reviews(self):
+        self.review(self.sword, content='Secret draft.', status='draft')
+        self.review(self.sword, content='Public.', reviewer=self.other_reviewer)
+        self.review(self.justice, content='Private.', is_public=False)
+        _exporter, data = self.export(format='ndjson', public_only=True)
+        records = [json.loads(line) for line in data.decode().splitlines()]
+        self.assertEqual([(record['title'], record['content']) for record in records], [('Ancillary Sword', 'Public.')])
+
+    def test_export_reads_back_through_the_importer(self):
+        self.review(self.orbitsville)
+        _exporter, data = self.export()
+        path = os.path.join(tempfile.mkdtemp(), 'all_books.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'wb') as target:
+            target.write(data)
+        self.assertEqual(
+            [record['title'] for record in import_sources.read(path)],
+            ['Ancillary Sword', 'Ancillary Justice', 'Orbitsville'],
+        )
+
+
+class RenditionViewTests(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            BLOG_RENDITION_CACHE_DIR=os.path.join(self.media_root, 'cache'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get(self, name, content):
+        with open(os.path.join(self.media_root, name), 'wb') as source:
+            source.write(content)
+        return self.client.get(reverse('blog:rendition', kwargs={'spec': 'card', 'path': name}))
+
+    def lock_files(self):
+        lock_dir = os.path.join(rendition_cache.cache_dir(), '.locks')
+        return os.listdir(lock_dir) if os.path.isdir(lock_dir) else []
+
+    def test_renders_and_removes_lock(self):
+        image = io.BytesIO()
+        Image.new('RGB', (40, 60), 'red').save(image, 'PNG')
+        response = self.get('cover.png', image.getvalue())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        response.close()
+        self.assertEqual(self.lock_files(), [])
+
+    def test_corrupt_source_is_not_found(self):
+        response = self.get('cover.jpg', b'not an image')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.lock_files(), [])
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.ran = []
+        handlers = {
+            'ok': lambda job, lease_seconds: self.ran.append(job.pk) or 'fine',
+            'boom': lambda job, lease_seconds: 1 / 0,
+        }
+        patcher = mock.patch.dict(job_queue.HANDLERS, handlers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_enqueue_reuses_a_waiting_job(self):
+        first = ImageJob.objects.enqueue('ok', 1, {'a': 1})
+        second = ImageJob.objects.enqueue('ok', 1, {'b': 2}, priority=5)
+        self.assertEqual(first.pk, second.pk)
+        second.refresh_from_db()
+        self.assertEqual((second.payload, second.priority), ({'a': 1, 'b': 2}, 5))
+
+    def test_claim_leases_to_one_worker_by_priority(self):
+        low = ImageJob.objects.enqueue('ok', 1)
+        high = ImageJob.objects.enqueue('ok', 2, priority=9)
+        job = ImageJob.objects.claim('w1', 60)
+        self.assertEqual((job.pk, job.status, job.locked_by, job.attempts), (high.pk, ImageJob.RUNNING, 'w1', 1))
+        self.assertEqual(ImageJob.objects.claim('w2', 60).pk, low.pk)
+        self.assertIsNone(ImageJob.objects.claim('w3', 60))
+
+    def test_expired_lease_is_claimed_again_then_failed(self):
+        job = ImageJob.objects.create(kind='ok', object_id=1, max_attempts=2)
+        ImageJob.objects.claim('w1', 60)
+        ImageJob.objects.filter(pk=job.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        again = ImageJob.objects.claim('w2', 60)
+        self.assertEqual((again.pk, again.attempts, again.locked_by), (job.pk, 2, 'w2'))
+        # The first worker lost the job and can no longer write to it
+        stale = ImageJob.objects.get(pk=job.pk)
+        stale.locked_by = 'w1'
+        self.assertEqual(stale._update(message='late'), 0)
+
+        ImageJob.objects.filter(pk=job.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(ImageJob.objects.fail_expired(), 1)
+        self.assertEqual(ImageJob.objects.get(pk=job.pk).status, ImageJob.FAILED)
+
+    def test_failures_retry_with_backoff(self):
+        job = ImageJob.objects.create(kind='boom', object_id=1, max_attempts=2)
+        with self.assertLogs('blog.utils.job_queue', 'WARNING'):
+            self.assertEqual(job_queue.work(worker='w', burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImageJob.QUEUED, 1))
+        self.assertIn('ZeroDivisionError', job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + datetime.timedelta(seconds=job_queue.RETRY_DELAY - 5))
+
+        # Not due yet, so a burst worker finds nothing
+        self.assertEqual(job_queue.work(worker='w', burst=True), 0)
+        ImageJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('blog.utils.job_queue', 'WARNING'):
+            job_queue.work(worker='w', burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, 2))
+
+    def test_work_runs_jobs_to_done(self):
+        job = ImageJob.objects.enqueue('ok', 1)
+        self.assertEqual(job_queue.work(worker='w', burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.message), (ImageJob.DONE, 100, 'fine'))
+        self.assertEqual(self.ran, [job.pk])
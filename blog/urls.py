@@ -22,6 +22,10 @@ urlpatterns = [
     
     # Search functionality
     path('search/', views.SearchView.as_view(), name='search'),
+    path('search/autocomplete/', views.AutocompleteView.as_view(), name='autocomplete'),
+    
+    # On-demand image renditions
+    path('media/r/<str:spec>/<path:path>', views.RenditionView.as_view(), name='rendition'),
     
     # About page
     path('about/', views.AboutView.as_view(), name='about'),
@@ -0,0 +1,263 @@
+"""
+Streaming export of books and their reviews, the reverse of ``import_books``.
+
+Records have the schema of ``export_book_reviews/all_books.json``: one per
+book, with its earliest review's content, rating and date. That is the
+earliest review of any status and visibility, drafts included, unless
+``public_only`` is set, when only published public reviews are read and
+only books having one are exported. Books are read with
+``.values()`` and ``.iterator(chunk_size=...)``, and the reviews of each
+chunk of books in one more query, so only one chunk is ever held in memory.
+
+``export()`` yields the output as byte strings, for a file or a
+``StreamingHttpResponse``:
+
+- ``json``: the ``all_books.json`` array, written one element at a time;
+- ``ndjson``: one record per line, as ``import_books`` reads ``.ndjson``.
+
+With ``archive='tar'`` or ``'zip'`` the output is an archive instead. It
+holds the data file and the cover and open-book images under ``images/``, and
+each record names its images by their archive path. Images are added as
+their records are reached. Member sizes have to be known before a tar
+member is written, so the data file is spooled to a temporary file and added
+last.
+"""
+import itertools
+import json
+import os
+import tarfile
+import tempfile
+import textwrap
+import time
+import zipfile
+
+from django.core.files.storage import default_storage
+
+from ..models import Review
+from .import_sources import AGGREGATE_FILE
+
+FORMATS = ('json', 'ndjson')
+ARCHIVES = ('tar', 'zip')
+DATA_FILES = {'json': AGGREGATE_FILE, 'ndjson': 'all_books.ndjson'}
+CHUNK_SIZE = 500
+COPY_SIZE = 64 * 1024
+IMAGES_DIR = 'images'
+
+
+def source_file(title):
+    """The per-book file name of the export directory, e.g. ``Mission Python.json``."""
+    return f"{title.replace('/', '-')}.json"
+
+
+def _first_reviews(book_ids, public_only=False):
+    """Each book's earliest review, as ``{book_id: values}``."""
+    reviews = {}
+    rows = Review.objects.filter(book_id__in=book_ids)
+    if public_only:
+        rows = rows.filter(status='published', is_public=True)
+    rows = rows.order_by('book_id', 'created_at', 'pk').values(
+        'book_id', 'content', 'rating', 'created_at', 'book_images',
+    )
+    for review in rows:
+        reviews.setdefault(review['book_id'], review)
+    return reviews
+
+
+def records(queryset, chunk_size=CHUNK_SIZE, public_only=False):
+    """
+    Yield ``(record, images)`` for the books of ``queryset`` in pk order;
+    ``images`` maps the record keys of its images to their storage names.
+    With ``public_only``, only published public reviews are exported.
+    """
+    if public_only:
+        queryset = queryset.filter(published_review_count__gt=0)
+    books = queryset.order_by('pk').values(
+        'pk', 'title', 'author__name', 'description', 'cover_image',
+    ).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(books, chunk_size))
+        if not chunk:
+            return
+        reviews = _first_reviews([book['pk'] for book in chunk], public_only)
+        for book in chunk:
+            review = reviews.get(book['pk'], {})
+            created_at = review.get('created_at')
+            record = {
+                'title': book['title'],
+                'author': book['author__name'],
+                'review_date': created_at.date().isoformat() if created_at else None,
+                'description': book['description'],
+                'content': review.get('content', ''),
+                'rating': review.get('rating'),
+                'source_file': source_file(book['title']),
+            }
+            images = {
+                key: name for key, name in (
+                    ('cover_image', book['cover_image']), ('book_images', review.get('book_images')),
+                ) if name
+            }
+            yield record, images
+
+
+def _encode(records_iter, format):
+    """The data file as text chunks."""
+    if format == 'ndjson':
+        for record in records_iter:
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        return
+    yield '['
+    separator = '\n'
+    for record in records_iter:
+        # Laid out like the existing all_books.json
+        yield separator + textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False), '  ')
+        separator = ',\n'
+    yield '\n]\n'
+
+
+class _Pipe:
+    """A write-only file whose contents are collected and handed on by ``drain()``."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+class _TarWriter:
+    """
+    A ustar/pax stream written block by block. ``tarfile``'s stream mode
+    copies each member in one call and keeps every member's header.
+    """
+
+    def add(self, source, member, size, mtime):
+        info = tarfile.TarInfo(member)
+        info.size = size
+        info.mtime = mtime
+        yield info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        while block := source.read(COPY_SIZE):
+            yield block
+        if size % tarfile.BLOCKSIZE:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE)
+
+    def close(self):
+        # Two empty blocks end the archive, rounded up to a whole record
+        yield tarfile.NUL * tarfile.RECORDSIZE
+
+
+class _ZipWriter:
+    """
+    A zip written to a pipe. It cannot seek, so zipfile follows each member
+    with a data descriptor; only the central directory entries are kept.
+    """
+
+    def __init__(self):
+        self.pipe = _Pipe()
+        self.zip = zipfile.ZipFile(self.pipe, 'w', compression=zipfile.ZIP_STORED)
+
+    def add(self, source, member, size, mtime):
+        info = zipfile.ZipInfo(member, time.localtime(mtime)[:6])
+        # Images are compressed already; only the data file is worth deflating
+        if not member.startswith(f'{IMAGES_DIR}/'):
+            info.compress_type = zipfile.ZIP_DEFLATED
+        with self.zip.open(info, 'w', force_zip64=True) as target:
+            while block := source.read(COPY_SIZE):
+                target.write(block)
+                yield self.pipe.drain()
+        yield self.pipe.drain()
+
+    def close(self):
+        self.zip.close()
+        yield self.pipe.drain()
+
+
+class Exporter:
+    """
+    Stream the books of a queryset. ``exported`` counts the records written,
+    and ``missing`` lists referenced images that are not in storage.
+    """
+
+    def __init__(self, queryset, format='json', archive=None, chunk_size=CHUNK_SIZE, public_only=False):
+        if format not in FORMATS:
+            raise ValueError(f'Unknown export format {format!r}')
+        if archive not in (None,) + ARCHIVES:
+            raise ValueError(f'Unknown archive type {archive!r}')
+        self.queryset = queryset
+        self.format = format
+        self.archive = archive
+        self.chunk_size = chunk_size
+        self.public_only = public_only
+        self.exported = 0
+        self.missing = []
+
+    @property
+    def filename(self):
+        if self.archive == 'tar':
+            return 'books.tar'
+        if self.archive == 'zip':
+            return 'books.zip'
+        return DATA_FILES[self.format]
+
+    @property
+    def content_type(self):
+        return {
+            'tar': 'application/x-tar',
+            'zip': 'application/zip',
+            None: 'application/json' if self.format == 'json' else 'application/x-ndjson',
+        }[self.archive]
+
+    def _counted(self, rows):
+        for record, images in rows:
+            self.exported += 1
+            yield record, images
+
+    def export(self):
+        """The export as a sequence of byte strings."""
+        rows = self._counted(records(self.queryset, self.chunk_size, self.public_only))
+        if self.archive is None:
+            for text in _encode((record for record, _images in rows), self.format):
+                yield text.encode('utf-8')
+        else:
+            yield from self._export_archive(rows)
+
+    def _export_archive(self, rows):
+        writer = _TarWriter() if self.archive == 'tar' else _ZipWriter()
+        pending = []
+        added = set()
+
+        def with_images():
+            # Queue each record's images for the archive and point the record at them
+            for record, images in rows:
+                for key, name in images.items():
+                    if name not in added:
+                        if not default_storage.exists(name):
+                            self.missing.append(name)
+                            continue
+                        added.add(name)
+                        pending.append(name)
+                    record[key] = f'{IMAGES_DIR}/{name}'
+                yield record
+
+        with tempfile.TemporaryFile() as data:
+            for text in _encode(with_images(), self.format):
+                data.write(text.encode('utf-8'))
+                for name in pending:
+                    path = default_storage.path(name)
+                    with open(path, 'rb') as image:
+                        yield from writer.add(
+                            image, f'{IMAGES_DIR}/{name}', os.path.getsize(path), os.path.getmtime(path)
+                        )
+                pending.clear()
+            size = data.tell()
+            data.seek(0)
+            yield from writer.add(data, DATA_FILES[self.format], size, time.time())
+        yield from writer.close()
@@ -0,0 +1,354 @@
+"""
+Bulk import of books and their reviews, as used by ``manage.py import_books``.
+
+Records come from a streaming reader in ``import_sources`` and pass through
+``RecordStream``, which validates and normalises each one and counts its
+position in the input for checkpoints. Invalid records are reported and
+skipped.
+
+The per-row import costs an ``Author.get_or_create``, a slug probe loop, a
+``Book.get_or_create`` and a ``Review.get_or_create`` per record, each its
+own transaction. ``BulkImporter`` instead looks up the authors, books, slugs
+and (book, reviewer) pairs of a whole chunk in a few queries, allocates
+unique slugs in memory and writes the chunk with ``bulk_create`` and
+``bulk_update`` in one short transaction. Nothing is kept between chunks
+except counters, so memory does not grow with the size of the input.
+``Checkpoint`` records how far the input has been committed, for
+``--resume-from``.
+
+``bulk_create`` sends no ``post_save``, so after each chunk the importer
+does what the signal handlers in ``blog/signals.py`` would have done for the
+chunk as a whole: render the Markdown fields, refresh the review and book
+counters, reindex the books for search, adjust the site statistics and
+invalidate the typeahead and the cached pages.
+"""
+import json
+import os
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .. import page_cache
+from ..models import Author, Book, Review
+from . import search_index, site_stats, typeahead
+from .import_sources import InvalidRecord
+
+DEFAULT_GENRE = 'non-fiction'
+DEFAULT_RATING = 5
+UNKNOWN_AUTHOR = 'Unknown'
+
+ChunkResult = namedtuple('ChunkResult', [
+    'records', 'books_created', 'books_updated', 'reviews_created', 'reviews_updated', 'skipped',
+])
+
+
+def parse_rating(value):
+    """The record's rating as 1-5; exports write a missing rating as null or "None"."""
+    try:
+        rating = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RATING
+    return rating if 1 <= rating <= 5 else DEFAULT_RATING
+
+
+def _text(record, key, max_length=None):
+    value = record.get(key)
+    value = '' if value is None else str(value).strip()
+    if max_length and len(value) > max_length:
+        raise InvalidRecord(f'{key} is longer than {max_length} characters')
+    return value
+
+
+def validate_record(record):
+    """
+    Return the record with its fields checked and normalised, or raise
+    ``InvalidRecord``. Unknown keys (``source_file``, ...) are dropped.
+    """
+    if isinstance(record, InvalidRecord):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord(f'expected an object, got {type(record).__name__}')
+    title = _text(record, 'title', Book._meta.get_field('title').max_length)
+    if not title:
+        raise InvalidRecord('missing title')
+    review_date = _text(record, 'review_date')
+    if review_date:
+        try:
+            datetime.strptime(review_date, '%Y-%m-%d')
+        except ValueError:
+            raise InvalidRecord(f'{title}: review_date {review_date!r} is not YYYY-MM-DD')
+    return {
+        'title': title,
+        'author': _text(record, 'author', Author._meta.get_field('name').max_length) or UNKNOWN_AUTHOR,
+        'description': _text(record, 'description'),
+        'content': _text(record, 'content'),
+        'rating': parse_rating(record.get('rating')),
+        'review_date': review_date or None,
+    }
+
+
+class RecordStream:
+    """
+    Iterate the valid records of a reader. ``position`` is the number of
+    input records consumed so far, counting from ``start`` (records skipped
+    when resuming) and including invalid ones.
+    """
+
+    def __init__(self, records, start=0, on_invalid=None):
+        self.records = records
+        self.position = start
+        self.invalid = 0
+        self.on_invalid = on_invalid
+
+    def __iter__(self):
+        for record in self.records:
+            position = self.position
+            self.position += 1
+            try:
+                yield validate_record(record)
+            except InvalidRecord as e:
+                self.invalid += 1
+                if self.on_invalid:
+                    self.on_invalid(position, e)
+
+
+class Checkpoint:
+    """How many records of ``source`` have been committed, kept in a small JSON file."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    @staticmethod
+    def read(path):
+        """``(source, records)`` from a checkpoint file."""
+        with open(path) as checkpoint_file:
+            data = json.load(checkpoint_file)
+        return data['source'], data['records']
+
+    def save(self, records):
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump({
+                'source': self.source,
+                'records': records,
+                'updated': timezone.now().isoformat(),
+            }, checkpoint_file)
+        os.replace(temp_path, self.path)
+
+
+def _bulk_update(model, objects, fields):
+    if objects:
+        model.objects.bulk_update(objects, fields + objects[0].rendered_text_fields + ['updated_at'])
+
+
+class BulkImporter:
+    """
+    Import validated ``{'title', 'author', 'description', 'content',
+    'rating'}`` records, as exported in ``all_books.json``, one chunk at a time.
+    """
+
+    def __init__(self, reviewer, default_author, force=False, chunk_size=1000):
+        self.reviewer = reviewer
+        self.default_author = default_author
+        self.force = force
+        self.chunk_size = chunk_size
+
+    def chunks(self, records):
+        """Split an iterable of records into lists of ``chunk_size``."""
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def run(self, stream, progress=None, checkpoint=None):
+        """
+        Import a ``RecordStream`` chunk by chunk, saving ``checkpoint`` after
+        each commit; ``progress(index, result, position)`` is called after each.
+        """
+        totals = Counter()
+        for index, chunk in enumerate(self.chunks(stream), 1):
+            result = self.import_chunk(chunk)
+            totals.update(result._asdict())
+            if checkpoint:
+                checkpoint.save(stream.position)
+            if progress:
+                progress(index, result, stream.position)
+        if checkpoint:
+            # Invalid records after the last chunk are done with too
+            checkpoint.save(stream.position)
+        typeahead.invalidate()
+        return ChunkResult(**{field: totals[field] for field in ChunkResult._fields})
+
+    def _authors(self, records):
+        """The chunk's authors by name, adding unsaved Authors for new names."""
+        names = {record['author'] for record in records} - {UNKNOWN_AUTHOR}
+        authors = {}
+        for author in Author.objects.filter(name__in=names).order_by('pk').only('pk', 'name'):
+            authors.setdefault(author.name, author)
+        new_authors = []
+        for record in records:
+            name = record['author']
+            if name != UNKNOWN_AUTHOR and name not in authors:
+                authors[name] = Author(name=name, bio=f"Author of {record['title']}")
+                new_authors.append(authors[name])
+        authors[UNKNOWN_AUTHOR] = self.default_author
+        return authors, new_authors
+
+    def _taken_slugs(self, bases):
+        """The stored slugs new books with these base slugs (a list, with repeats) could collide with."""
+        taken = set(Book.objects.filter(slug__in=set(bases)).values_list('slug', flat=True))
+        counts = Counter(bases)
+        # A base used twice, or already taken, also allocates base-1, base-2, ...
+        # which may exist even when the base itself does not
+        for base in {base for base, count in counts.items() if count > 1} | taken:
+            taken.update(
+                Book.objects.filter(slug__startswith=f'{base}-').values_list('slug', flat=True)
+            )
+        return taken
+
+    def import_chunk(self, records):
+        """
+        Write one chunk of records. Objects are built and their Markdown
+        rendered first, so the transaction (and SQLite's write lock) only
+        spans the inserts and updates.
+        """
+        now = timezone.now()
+        authors, new_authors = self._authors(records)
+        rows = [(record, authors[record['author']]) for record in records]
+        stored_books = {
+            (title, author_id): pk for pk, title, author_id in Book.objects.filter(
+                title__in={record['title'] for record in records}
+            ).values_list('pk', 'title', 'author_id')
+        }
+
+        # Books, matched like Book.get_or_create(title=..., author=...). Keyed
+        # by the author object, since new authors have no pk yet.
+        books = {}
+        new_books = []
+        updated_books = []
+        skipped = 0
+        for record, author in rows:
+            key = (record['title'], id(author))
+            if key in books:
+                # The same book twice in one chunk
+                skipped += 1
+                continue
+            book_id = stored_books.get((record['title'], author.pk)) if author.pk else None
+            if book_id is None:
+                book = Book(
+                    title=record['title'],
+                    author=author,
+                    description=record['description'],
+                    genre=DEFAULT_GENRE,
+                )
+                new_books.append(book)
+            elif self.force:
+                book = Book(pk=book_id, description=record['description'], updated_at=now)
+                book.render_text()
+                updated_books.append(book)
+            else:
+                book = Book(pk=book_id)
+                skipped += 1
+            books[key] = book
+
+        # Unique slugs for the new books, like Book.save() would probe for
+        bases = [slugify(book.title) for book in new_books]
+        taken = self._taken_slugs(bases)
+        counters = {}
+        for book, base in zip(new_books, bases):
+            slug = base
+            while slug in taken:
+                counters[base] = counters.get(base, 0) + 1
+                slug = f'{base}-{counters[base]}'
+            taken.add(slug)
+            book.slug = slug
+            book.render_text()
+
+        # One review per (book, reviewer), as Review.unique_together requires
+        stored_reviews = dict(
+            Review.objects.filter(
+                reviewer=self.reviewer, book_id__in={book.pk for book in books.values() if book.pk}
+            ).values_list('book_id', 'pk')
+        )
+        new_reviews = []
+        updated_reviews = []
+        reviewed = set()
+        for record, author in rows:
+            key = (record['title'], id(author))
+            if key in reviewed:
+                continue
+            reviewed.add(key)
+            book = books[key]
+            review_id = stored_reviews.get(book.pk) if book.pk else None
+            if review_id is None:
+                review = Review(
+                    book=book,
+                    reviewer=self.reviewer,
+                    title=f"Review of {record['title']}",
+                    content=record['content'],
+                    rating=record['rating'],
+                    is_public=True,
+                )
+                review.render_text()
+                new_reviews.append(review)
+            elif self.force:
+                review = Review(
+                    pk=review_id, book_id=book.pk, content=record['content'],
+                    rating=record['rating'], updated_at=now,
+                )
+                review.render_text()
+                updated_reviews.append(review)
+
+        with transaction.atomic():
+            # bulk_create fills in the pks, which the later inserts pick up
+            Author.objects.bulk_create(new_authors)
+            Book.objects.bulk_create(new_books)
+            _bulk_update(Book, updated_books, ['description'])
+            Review.objects.bulk_create(new_reviews)
+            # Sends reviews_bulk_updated, which refreshes the books of these reviews
+            _bulk_update(Review, updated_reviews, ['content', 'rating'])
+            self._refresh_derived(new_books, updated_books, new_reviews)
+
+        return ChunkResult(
+            records=len(records),
+            books_created=len(new_books),
+            books_updated=len(updated_books),
+            reviews_created=len(new_reviews),
+            reviews_updated=len(updated_reviews),
+            skipped=skipped,
+        )
+
+    def _refresh_derived(self, new_books, updated_books, new_reviews):
+        """What post_save would have done for the created and updated rows."""
+        book_ids = {book.pk for book in new_books} | {book.pk for book in updated_books}
+        book_ids |= {review.book_id for review in new_reviews}
+        if new_reviews:
+            Book.objects.filter(pk__in={review.book_id for review in new_reviews}).refresh_review_stats()
+        author_ids = {book.author_id for book in new_books}
+        if author_ids:
+            Author.objects.filter(pk__in=author_ids).refresh_book_count()
+        search_index.index_books(book_ids)
+
+        deltas = Counter()
+        for book in new_books:
+            deltas[site_stats.BOOKS] += 1
+            deltas[site_stats.genre_key(book.genre)] += 1
+        for review in new_reviews:
+            deltas.update(site_stats.review_keys(review.status, review.is_public))
+        site_stats.adjust(deltas)
+
+        if book_ids:
+            tags = {'books'} | {f'book:{book_id}' for book_id in book_ids}
+            tags |= {f'author:{author_id}' for author_id in author_ids}
+            tags |= {f'genre:{book.genre}' for book in new_books}
+            if new_reviews:
+                tags.add('reviews')
+            page_cache.invalidate_tags(*tags)
@@ -0,0 +1,203 @@
+"""
+Running ffmpeg for styles with an ``ffmpeg_filter`` (``vintage``).
+
+``probe()`` finds the ffmpeg binary and asks it for its version and filters
+once per process. The answer is also kept in a small JSON file
+(``BLOG_FFMPEG_PROBE_CACHE``) keyed by the binary's path, size and mtime, so
+new processes (command runs, pool workers, job workers) skip the subprocess
+until ffmpeg is upgraded.
+
+Starting ffmpeg costs more than filtering a backdrop-sized image, so
+``filter_many()`` puts up to ``BATCH_SIZE`` images through one invocation,
+each input with its own filter chain and output:
+
+    ffmpeg -y -i a.jpg -i b.jpg -filter_complex "[0:v]<filter>[o0];[1:v]<filter>[o1]"
+           -map [o0] -q:v 3 a_out.jpg -map [o1] -q:v 3 b_out.jpg
+
+and keeps up to ``pool_size`` such invocations running at once. A failed
+batch is retried one image at a time, so one unreadable file only fails
+itself. ``manage.py benchmark_ffmpeg`` compares it with one process per image.
+"""
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+BATCH_SIZE = 16
+POOL_SIZE = 2
+JPEG_QUALITY = 3
+
+_probes = {}
+
+
+def binary():
+    return getattr(settings, 'BLOG_FFMPEG_BINARY', 'ffmpeg')
+
+
+def probe_cache_path():
+    return str(getattr(
+        settings, 'BLOG_FFMPEG_PROBE_CACHE',
+        os.path.join(str(settings.BASE_DIR), '.ffmpeg-probe.json')
+    ))
+
+
+def _run_probe(path):
+    try:
+        version = subprocess.run(
+            [path, '-hide_banner', '-version'], capture_output=True, text=True, check=True
+        ).stdout
+        listing = subprocess.run(
+            [path, '-hide_banner', '-filters'], capture_output=True, text=True, check=True
+        ).stdout
+    except (subprocess.CalledProcessError, OSError):
+        return {'available': False, 'version': '', 'filters': []}
+    # Filter lines look like " TSC colorbalance  V->V  Adjust the color balance."
+    filters = sorted(
+        line.split()[1] for line in listing.splitlines()
+        if len(line.split()) > 2 and '->' in line.split()[2]
+    )
+    return {
+        'available': True,
+        'version': version.splitlines()[0] if version else '',
+        'filters': filters,
+    }
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_path, entries):
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'w') as cache_file:
+            json.dump(entries, cache_file, indent=1)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # Only a cache; the next process probes again
+        pass
+
+
+def probe():
+    """
+    ``{'available', 'version', 'filters'}`` for the configured ffmpeg,
+    running it only when neither this process nor the disk cache has seen
+    the current binary.
+    """
+    path = shutil.which(binary())
+    if path is None:
+        return {'available': False, 'version': '', 'filters': []}
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+
+    cached = _probes.get(path)
+    if cached and cached['stamp'] == stamp:
+        return cached['probe']
+
+    cache_path = probe_cache_path()
+    entries = _read_cache(cache_path)
+    entry = entries.get(path)
+    if entry and entry.get('stamp') == stamp:
+        result = entry['probe']
+    else:
+        result = _run_probe(path)
+        entries[path] = {'stamp': stamp, 'probe': result}
+        _write_cache(cache_path, entries)
+    _probes[path] = {'stamp': stamp, 'probe': result}
+    return result
+
+
+def available():
+    return probe()['available']
+
+
+def supports(filter_chain):
+    """Whether the installed ffmpeg has every filter used in ``filter_chain``."""
+    result = probe()
+    if not result['available']:
+        return False
+    names = {part.split('=', 1)[0].strip() for part in filter_chain.split(',')}
+    return names <= set(result['filters'])
+
+
+def filter_one(input_path, output_path, filter_chain, quality=JPEG_QUALITY):
+    """Filter one image in its own ffmpeg process."""
+    subprocess.run([
+        binary(), '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', input_path,
+        '-vf', filter_chain,
+        '-q:v', str(quality),
+        output_path,
+    ], check=True, capture_output=True)
+
+
+def batch_command(pairs, filter_chain, quality=JPEG_QUALITY):
+    """The ffmpeg command filtering every ``(input_path, output_path)`` in ``pairs``."""
+    command = [binary(), '-hide_banner', '-loglevel', 'error', '-y']
+    for input_path, _output_path in pairs:
+        command += ['-i', input_path]
+    graph = ';'.join(f'[{index}:v]{filter_chain}[o{index}]' for index in range(len(pairs)))
+    command += ['-filter_complex', graph]
+    for index, (_input_path, output_path) in enumerate(pairs):
+        command += [
+            '-map', f'[o{index}]', '-frames:v', '1', '-update', '1',
+            '-q:v', str(quality), output_path,
+        ]
+    return command
+
+
+def _error(exception):
+    if isinstance(exception, subprocess.CalledProcessError) and exception.stderr:
+        stderr = exception.stderr
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode(errors='replace')
+        return stderr.strip().splitlines()[-1]
+    return str(exception)
+
+
+def _filter_batch(pairs, filter_chain, quality):
+    try:
+        subprocess.run(batch_command(pairs, filter_chain, quality), check=True, capture_output=True)
+        return [None] * len(pairs)
+    except (subprocess.CalledProcessError, OSError) as e:
+        if len(pairs) == 1:
+            return [_error(e)]
+    # Find out which image(s) broke the batch
+    errors = []
+    for input_path, output_path in pairs:
+        try:
+            filter_one(input_path, output_path, filter_chain, quality)
+            errors.append(None)
+        except (subprocess.CalledProcessError, OSError) as e:
+            errors.append(_error(e))
+    return errors
+
+
+def filter_many(pairs, filter_chain, quality=JPEG_QUALITY, batch_size=BATCH_SIZE,
+                pool_size=POOL_SIZE):
+    """
+    Filter every ``(input_path, output_path)`` in ``pairs`` in batches of
+    ``batch_size`` images per ffmpeg process, ``pool_size`` processes at a
+    time. Yields ``(input_path, output_path, error)`` in input order, with
+    ``error`` None on success.
+    """
+    pairs = list(pairs)
+    batch_size = max(1, batch_size)
+    batches = [pairs[start:start + batch_size] for start in range(0, len(pairs), batch_size)]
+
+    def run_batch(batch):
+        return _filter_batch(batch, filter_chain, quality)
+
+    # The threads only wait on ffmpeg, which does the work
+    with ThreadPoolExecutor(max_workers=max(1, pool_size)) as executor:
+        for batch, errors in zip(batches, executor.map(run_batch, batches)):
+            for (input_path, output_path), error in zip(batch, errors):
+                yield input_path, output_path, error
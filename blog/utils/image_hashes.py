@@ -0,0 +1,294 @@
+"""
+Perceptual hashes of the stored images, for finding duplicates.
+
+Two hashes are available, both 64-bit integers that stay (nearly) the same
+when an image is re-encoded, resized or slightly recoloured:
+
+- ``dhash``: the signs of the brightness gradients of a 9x8 thumbnail;
+- ``phash``: the low frequencies of a 32x32 thumbnail's DCT, against
+  their median. It is slower but more robust to contrast changes and crops.
+
+JPEGs are decoded with Pillow's draft mode, which has libjpeg scale the
+image down during decoding, so hashing a large photo costs little more than
+reading it. Hashes are cached per file (size and mtime) in
+``BLOG_IMAGE_HASH_CACHE``, so a re-run only hashes new or changed files.
+
+Similar images have hashes a small Hamming distance apart. ``HashIndex``
+finds the hashes near a given one without comparing it with all of them,
+and ``cluster()`` groups the files whose hashes are within a distance of
+each other, transitively.
+"""
+import itertools
+import json
+import math
+import os
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from PIL import Image, ImageOps
+
+ALGORITHMS = ('dhash', 'phash')
+HASH_BITS = 64
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+# Loose files that are not referenced by any model but should be checked
+EXTRA_DIRS = ('site_images',)
+# Generated from other files; duplicates of their sources by design
+SKIP_DIRS = ('renditions',)
+
+_PHASH_SIZE = 32
+_PHASH_BITS = 8
+# DCT-II basis for the lowest frequencies only: the others are never used
+_DCT = [
+    [math.cos(math.pi * (2 * n + 1) * k / (2 * _PHASH_SIZE)) for n in range(_PHASH_SIZE)]
+    for k in range(_PHASH_BITS)
+]
+
+
+def hash_cache_path():
+    return str(getattr(
+        settings, 'BLOG_IMAGE_HASH_CACHE',
+        os.path.join(str(settings.BASE_DIR), '.image-hashes.json')
+    ))
+
+
+def _thumbnail(path, size):
+    with Image.open(path) as img:
+        # JPEG only: decode at 1/2-1/8 scale, no smaller than four times the thumbnail
+        img.draft('L', (size[0] * 4, size[1] * 4))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Transparent areas count as white, as on the site
+            img = img.convert('RGBA')
+            background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(background, img)
+        return img.convert('L').resize(size, Image.Resampling.BOX)
+
+
+def _bits(flags):
+    value = 0
+    for flag in flags:
+        value = value << 1 | flag
+    return value
+
+
+def dhash(path):
+    pixels = _thumbnail(path, (9, 8)).tobytes()
+    return _bits(
+        pixels[row * 9 + column] < pixels[row * 9 + column + 1]
+        for row in range(8) for column in range(8)
+    )
+
+
+def phash(path):
+    pixels = _thumbnail(path, (_PHASH_SIZE, _PHASH_SIZE)).tobytes()
+    rows = [pixels[start:start + _PHASH_SIZE] for start in range(0, len(pixels), _PHASH_SIZE)]
+    # Separable DCT: the low frequencies of each row, then of each column of those
+    row_coefficients = [[sum(map(float.__mul__, basis, map(float, row))) for basis in _DCT] for row in rows]
+    columns = list(zip(*row_coefficients))
+    coefficients = [
+        sum(map(float.__mul__, basis, column))
+        for basis in _DCT for column in columns
+    ]
+    # The DC term is the overall brightness and would dominate the median
+    median = sorted(coefficients[1:])[len(coefficients) // 2 - 1]
+    return _bits(coefficient > median for coefficient in coefficients)
+
+
+def hash_file(item):
+    """Worker: ``(path, algorithm)`` -> the image's hash."""
+    path, algorithm = item
+    return dhash(path) if algorithm == 'dhash' else phash(path)
+
+
+def distance(a, b):
+    """Hamming distance between two hashes."""
+    return (a ^ b).bit_count()
+
+
+class HashCache:
+    """Hashes by file path, valid while the file's size and mtime are unchanged."""
+
+    def __init__(self, path=None):
+        self.path = path or hash_cache_path()
+        try:
+            with open(self.path) as cache_file:
+                self.entries = json.load(cache_file)
+        except (OSError, ValueError):
+            self.entries = {}
+        self.changed = False
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def get(self, path, algorithm):
+        entry = self.entries.get(path)
+        if entry and entry['stamp'] == self._stamp(path) and algorithm in entry:
+            return int(entry[algorithm], 16)
+        return None
+
+    def set(self, path, algorithm, value):
+        stamp = self._stamp(path)
+        entry = self.entries.get(path)
+        if not entry or entry['stamp'] != stamp:
+            entry = self.entries[path] = {'stamp': stamp}
+        entry[algorithm] = f'{value:016x}'
+        self.changed = True
+
+    def save(self, keep=None):
+        """Write the cache, dropping files not in ``keep`` (an iterable of paths)."""
+        if keep is not None:
+            keep = set(keep)
+            stale = [path for path in self.entries if path not in keep]
+            for path in stale:
+                del self.entries[path]
+            self.changed = self.changed or bool(stale)
+        if not self.changed:
+            return
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'w') as cache_file:
+                json.dump(self.entries, cache_file)
+            os.replace(temp_path, self.path)
+        except OSError:
+            # Only a cache; the next run hashes again
+            pass
+
+
+def stored_images(media_root=None):
+    """
+    ``{storage name: [references]}`` for every file of an ImageField in the
+    blog's models that exists, plus the images under ``EXTRA_DIRS``.
+    References read like ``blog.Book 12 cover_image``.
+    """
+    media_root = str(media_root or settings.MEDIA_ROOT)
+    images = defaultdict(list)
+    for model in apps.get_app_config('blog').get_models():
+        for field in model._meta.get_fields():
+            if not isinstance(field, models.ImageField):
+                continue
+            rows = model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            for pk, name in rows.values_list('pk', field.name).iterator():
+                images[name].append(f'{model._meta.label} {pk} {field.name}')
+
+    for directory in EXTRA_DIRS:
+        for root, dirs, files in os.walk(os.path.join(media_root, directory)):
+            dirs[:] = sorted(name for name in dirs if name not in SKIP_DIRS)
+            for filename in sorted(files):
+                if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if filename.endswith('.webp') and filename[:-5] in files:
+                    # A WebP variant written next to its source
+                    continue
+                name = os.path.relpath(os.path.join(root, filename), media_root).replace(os.sep, '/')
+                images.setdefault(name, [])
+
+    return {
+        name: references for name, references in images.items()
+        if os.path.isfile(os.path.join(media_root, name))
+    }
+
+
+def _flip_masks(width, radius):
+    """Every value of ``width`` bits with at most ``radius`` bits set."""
+    return [
+        sum(1 << bit for bit in bits)
+        for count in range(radius + 1)
+        for bits in itertools.combinations(range(width), count)
+    ]
+
+
+class HashIndex:
+    """
+    Hashes indexed for Hamming-distance queries up to ``max_distance``.
+
+    The hash is split into segments. When two hashes differ in at most
+    ``max_distance`` bits, at least one of ``count`` segments differs in at
+    most ``max_distance // count`` bits (the pigeonhole principle). So a
+    query looks up each of its segments with up to that many bits flipped,
+    and only compares the hashes found there (multi-index hashing). The
+    number of segments is chosen for ``expected_size`` hashes: more segments
+    are narrower and need fewer flips, but match more hashes by chance.
+
+    A BK-tree prunes almost nothing at this dimension. With 64-bit hashes at
+    distance 4, a search still visits most of the tree.
+    """
+
+    def __init__(self, max_distance, expected_size=10000):
+        self.max_distance = max_distance
+        count = min(
+            range(1, min(max_distance + 1, HASH_BITS) + 1),
+            key=lambda count: self._cost(count, expected_size),
+        )
+        width = -(-HASH_BITS // count)
+        self.segments = [
+            (start, (1 << min(width, HASH_BITS - start)) - 1) for start in range(0, HASH_BITS, width)
+        ]
+        self.flips = _flip_masks(width, max_distance // count)
+        self.tables = [defaultdict(list) for _segment in self.segments]
+
+    def _cost(self, count, size):
+        """Rough work per query with ``count`` segments: lookups plus chance matches."""
+        width = -(-HASH_BITS // count)
+        probes = sum(math.comb(width, flipped) for flipped in range(self.max_distance // count + 1))
+        return count * probes * (1 + size / 2 ** width)
+
+    def add(self, value):
+        for table, (start, mask) in zip(self.tables, self.segments):
+            table[value >> start & mask].append(value)
+
+    def search(self, value):
+        """``[(distance, hash)]`` for the indexed hashes within ``max_distance`` of ``value``."""
+        candidates = set()
+        for table, (start, mask) in zip(self.tables, self.segments):
+            segment = value >> start & mask
+            for flip in self.flips:
+                found = table.get(segment ^ flip)
+                if found:
+                    candidates.update(found)
+        found = []
+        for other in candidates:
+            other_distance = distance(value, other)
+            if other_distance <= self.max_distance:
+                found.append((other_distance, other))
+        return found
+
+
+def cluster(hashes, max_distance):
+    """
+    Group ``{name: hash}`` into lists of names whose hashes are within
+    ``max_distance`` of another in the group, largest groups first.
+    Names alone in their group are left out.
+    """
+    names_by_hash = defaultdict(list)
+    for name, value in hashes.items():
+        names_by_hash[value].append(name)
+
+    # Union-find over the distinct hashes
+    parent = {value: value for value in names_by_hash}
+
+    def find(value):
+        while parent[value] != value:
+            parent[value] = parent[parent[value]]
+            value = parent[value]
+        return value
+
+    if max_distance > 0:
+        index = HashIndex(max_distance, len(names_by_hash))
+        # Each hash is compared with those added before it, so every pair once
+        for value in names_by_hash:
+            for _distance, other in index.search(value):
+                root, other_root = find(value), find(other)
+                if root != other_root:
+                    parent[other_root] = root
+            index.add(value)
+
+    groups = defaultdict(list)
+    for value, names in names_by_hash.items():
+        groups[find(value)].extend(names)
+    clusters = [sorted(names) for names in groups.values() if len(names) > 1]
+    clusters.sort(key=lambda names: (-len(names), names[0]))
+    return clusters
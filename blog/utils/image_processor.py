@@ -1,29 +1,201 @@
 """
 Advanced image processing utilities using Pillow and ffmpeg.
+
+Large sources (full-size DSLR photos) are opened with ``load_scaled()``,
+which has the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding, so a
+24MP photo bound for a 1920px backdrop is never held at full resolution.
+Sources that are still larger than ``BLOG_IMAGE_PIXEL_BUDGET`` pixels after
+that are converted and resampled a horizontal strip at a time. That keeps
+the conversion and resampling buffers small, but the decoded source itself
+is still held whole: only JPEGs, through ``draft()``, are bounded in memory.
+
+Every JPEG/PNG written here also gets a WebP variant next to it, named by
+appending ``.webp`` (``cover.jpg`` -> ``cover.jpg.webp``), so a web server
+can swap it in for browsers that send ``Accept: image/webp``.
 """
+import math
 import subprocess
 import os
+import sys
 from pathlib import Path
-from PIL import Image, ImageEnhance, ImageFilter, ImageDraw
+from PIL import Image, ImageFilter, ImageDraw
 from django.conf import settings
 
+from . import encoding, ffmpeg, image_styles, parallel
+from .processing_manifest import ProcessingManifest
+
+WEBP_QUALITY = 80
+# Decoded images with more pixels than this are resampled in strips
+PIXEL_BUDGET = 24_000_000
+# LANCZOS looks this many (scaled) source pixels either side of each output pixel
+LANCZOS_SUPPORT = 3
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def webp_path(path):
+    """Path of the WebP variant stored next to ``path``."""
+    return f'{path}.webp'
+
+
+def save_webp_variant(img, path, quality=WEBP_QUALITY):
+    """
+    Write a WebP copy of ``img`` next to ``path``.
+
+    Images with an alpha channel (the circular author avatars) are encoded
+    losslessly to keep their edges; photos are encoded lossy.
+    """
+    output_path = webp_path(path)
+    if img.mode in ('RGBA', 'LA'):
+        img.save(output_path, 'WEBP', lossless=True, method=6)
+    else:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(output_path, 'WEBP', quality=quality, method=6)
+    return output_path
+
+
+def pixel_budget():
+    return getattr(settings, 'BLOG_IMAGE_PIXEL_BUDGET', PIXEL_BUDGET)
+
+
+def scaled_size(size, max_width=None, max_height=None):
+    """``size`` shrunk to fit ``max_width`` x ``max_height`` (either may be None)."""
+    width, height = size
+    ratio = min(
+        1,
+        max_width / width if max_width else 1,
+        max_height / height if max_height else 1,
+    )
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def load_scaled(path, max_width=None, max_height=None, mode='RGB'):
+    """
+    Decode the image at ``path`` to ``mode`` and at most ``max_width`` x
+    ``max_height``, keeping the aspect ratio.
+
+    JPEGs are decoded with DCT scaling to the smallest size that is still
+    at least the target, then resampled to the exact size with LANCZOS.
+    """
+    img = Image.open(path)
+    try:
+        size = scaled_size(img.size, max_width, max_height)
+        if img.format == 'JPEG' and size != img.size:
+            img.draft('RGB', size)
+        if img.width * img.height > pixel_budget() and size != img.size:
+            return _resize_in_strips(img, size, mode)
+        img.load()
+        if img.mode != mode:
+            img = img.convert(mode)
+        if img.size != size:
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        return img
+    except BaseException:
+        img.close()
+        raise
+
+
+def _resize_in_strips(img, size, mode):
+    """
+    Convert and resample ``img`` to ``size`` one horizontal strip at a time.
+
+    Each strip is cropped with enough rows of margin for the LANCZOS
+    kernel, so the result matches a single full-image resize, while the
+    mode conversion and resampling buffers only ever hold one strip. The
+    source is decoded whole first (Pillow cannot crop an undecoded PNG or
+    TIFF), so this saves the copies, not the decoded image.
+    """
+    with img:
+        img.load()
+        output = Image.new(mode, size)
+        scale = img.height / size[1]
+        margin = math.ceil(LANCZOS_SUPPORT * max(scale, 1)) + 1
+        # Aim for strips of about 1/16 of the budget
+        source_rows = max(1, pixel_budget() // 16 // img.width)
+        output_rows = max(1, int(source_rows / scale))
+
+        for top in range(0, size[1], output_rows):
+            bottom = min(size[1], top + output_rows)
+            source_top, source_bottom = top * scale, bottom * scale
+            crop_top = max(0, int(source_top) - margin)
+            crop_bottom = min(img.height, math.ceil(source_bottom) + margin)
+            strip = img.crop((0, crop_top, img.width, crop_bottom))
+            if strip.mode != mode:
+                strip = strip.convert(mode)
+            strip = strip.resize(
+                (size[0], bottom - top), Image.Resampling.LANCZOS,
+                box=(0, source_top - crop_top, img.width, source_bottom - crop_top)
+            )
+            output.paste(strip, (0, top))
+        return output
+
+
+class PeakMemory:
+    """
+    Measure the peak resident set size of this process during a block::
+
+        with PeakMemory() as memory:
+            ...
+        memory.peak  # bytes, or None if unknown
+
+    On Linux the high-water mark is reset on entry, so the figure is for the
+    block alone; elsewhere it is the process's peak so far.
+    """
+
+    def __enter__(self):
+        self.peak = None
+        try:
+            # Writing 5 resets VmHWM (Linux 4.0+)
+            with open('/proc/self/clear_refs', 'w') as clear_refs:
+                clear_refs.write('5')
+        except OSError:
+            pass
+        return self
+
+    def __exit__(self, *exc_info):
+        self.peak = self._read_peak()
+
+    def _read_peak(self):
+        try:
+            with open('/proc/self/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def format_peak(peak):
+    return f'{peak / 1024 / 1024:.0f}MB' if peak else 'n/a'
+
 
 class AdvancedImageProcessor:
     """
     Advanced image processing with both Pillow and ffmpeg support.
     """
     
-    def __init__(self):
-        self.ffmpeg_available = self._check_ffmpeg()
+    def __init__(self, ffmpeg_available=None):
+        # Pass the result of an earlier probe to skip checking again
+        if ffmpeg_available is None:
+            ffmpeg_available = self._check_ffmpeg()
+        self.ffmpeg_available = ffmpeg_available
     
     def _check_ffmpeg(self):
-        """Check if ffmpeg is available on the system."""
-        try:
-            subprocess.run(['ffmpeg', '-version'], 
-                         capture_output=True, check=True)
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return False
+        """Check if ffmpeg is available on the system (probed once, see ``ffmpeg.probe``)."""
+        return ffmpeg.available()
+    
+    def _uses_ffmpeg(self, style):
+        ffmpeg_filter = image_styles.get_style(style).ffmpeg_filter
+        return bool(ffmpeg_filter) and self.ffmpeg_available and ffmpeg.supports(ffmpeg_filter)
     
     def process_backdrop(self, input_path, output_path, style='desaturated'):
         """
@@ -32,151 +204,206 @@ class AdvancedImageProcessor:
         Args:
             input_path: Path to input image
             output_path: Path for output image
-            style: Processing style ('desaturated', 'sepia', 'greyscale', 'vintage')
+            style: Processing style, a name from ``image_styles.STYLES``
         """
-        if style == 'vintage' and self.ffmpeg_available:
-            return self._process_vintage_ffmpeg(input_path, output_path)
+        if self._uses_ffmpeg(style):
+            return self._process_ffmpeg(input_path, output_path, style)
         else:
             return self._process_backdrop_pillow(input_path, output_path, style)
     
     def _process_backdrop_pillow(self, input_path, output_path, style):
         """Process backdrop using Pillow."""
-        with Image.open(input_path) as img:
-            # Convert to RGB
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Apply style-specific processing
-            if style == 'desaturated':
-                img = self._desaturate_advanced(img, factor=0.3)
-            elif style == 'sepia':
-                img = self._apply_sepia_advanced(img)
-            elif style == 'greyscale':
-                img = img.convert('L').convert('RGB')
-            elif style == 'vintage':
-                img = self._apply_vintage_effect(img)
-            
-            # Add subtle blur for backdrop effect
-            img = img.filter(ImageFilter.GaussianBlur(radius=0.5))
-            
-            # Optimize and save
-            img.save(output_path, 'JPEG', quality=85, optimize=True)
-            return output_path
-    
-    def _desaturate_advanced(self, img, factor=0.3):
-        """Advanced desaturation with color preservation."""
-        # Convert to HSV
-        hsv = img.convert('HSV')
-        h, s, v = hsv.split()
-        
-        # Reduce saturation more aggressively
-        s = s.point(lambda x: int(x * factor))
-        
-        # Slightly reduce brightness for backdrop effect
-        v = v.point(lambda x: int(x * 0.95))
-        
-        hsv = Image.merge('HSV', (h, s, v))
-        return hsv.convert('RGB')
-    
-    def _apply_sepia_advanced(self, img):
-        """Advanced sepia with better color balance."""
-        # Custom sepia matrix for more natural look
-        sepia_matrix = [
-            0.393, 0.769, 0.189,
-            0.349, 0.686, 0.168,
-            0.272, 0.534, 0.131
-        ]
+        img = load_scaled(input_path)
         
-        img = img.convert('RGB', matrix=sepia_matrix)
+        # Apply the style's fused passes, then a subtle blur for backdrop effect
+        img = image_styles.apply(img, style)
+        img = img.filter(ImageFilter.GaussianBlur(radius=0.5))
         
-        # Add slight contrast enhancement
-        enhancer = ImageEnhance.Contrast(img)
-        return enhancer.enhance(1.1)
-    
-    def _apply_vintage_effect(self, img):
-        """Apply vintage film effect."""
-        # Convert to sepia first
-        img = self._apply_sepia_advanced(img)
-        
-        # Add slight noise/grain effect
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.2)
-        
-        # Slightly reduce brightness
-        enhancer = ImageEnhance.Brightness(img)
-        return enhancer.enhance(0.9)
+        # Optimize and save
+        encoding.save_jpeg(img, output_path, 'backdrop')
+        save_webp_variant(img, output_path)
+        return output_path
     
-    def _process_vintage_ffmpeg(self, input_path, output_path):
-        """Process vintage effect using ffmpeg for better quality."""
+    def _process_ffmpeg(self, input_path, output_path, style):
+        """Process a style with an ffmpeg filter (vintage) using ffmpeg for better quality."""
         if not self.ffmpeg_available:
-            return self._process_backdrop_pillow(input_path, output_path, 'vintage')
-        
-        # ffmpeg command for vintage effect
-        cmd = [
-            'ffmpeg', '-i', input_path,
-            '-vf', 'colorbalance=rs=-0.1:gs=-0.1:bs=0.1,eq=saturation=0.3:contrast=1.1',
-            '-q:v', '3',  # High quality
-            '-y',  # Overwrite output
-            output_path
-        ]
+            return self._process_backdrop_pillow(input_path, output_path, style)
         
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
-            return output_path
-        except subprocess.CalledProcessError:
+            ffmpeg.filter_one(input_path, output_path, image_styles.get_style(style).ffmpeg_filter)
+        except (subprocess.CalledProcessError, OSError):
             # Fallback to Pillow if ffmpeg fails
-            return self._process_backdrop_pillow(input_path, output_path, 'vintage')
+            return self._process_backdrop_pillow(input_path, output_path, style)
+        return self._finish_ffmpeg(output_path)
+    
+    def _finish_ffmpeg(self, output_path):
+        with Image.open(output_path) as img:
+            save_webp_variant(img, output_path)
+        return output_path
+    
+    def _process_ffmpeg_batch(self, items, style, jobs=1):
+        """
+        Filter ``items`` (``(input_path, output_path, style)``) through
+        batched ffmpeg invocations, ``jobs`` of them at a time. Yields
+        ``(item, result, error)`` like ``parallel.run``; images ffmpeg
+        fails on are redone with Pillow.
+        """
+        pairs = [(input_path, output_path) for input_path, output_path, _style in items]
+        results = ffmpeg.filter_many(
+            pairs, image_styles.get_style(style).ffmpeg_filter, pool_size=parallel.job_count(jobs)
+        )
+        for item, (_input_path, output_path, error) in zip(items, results):
+            try:
+                if error:
+                    result = self._process_backdrop_pillow(*item)
+                else:
+                    result = self._finish_ffmpeg(output_path)
+            except Exception as e:
+                yield item, None, e
+            else:
+                yield item, result, None
     
     def create_thumbnail(self, input_path, output_path, size=(300, 300)):
         """Create optimized thumbnail."""
-        with Image.open(input_path) as img:
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Create thumbnail maintaining aspect ratio
-            img.thumbnail(size, Image.Resampling.LANCZOS)
-            
-            # Save optimized
-            img.save(output_path, 'JPEG', quality=90, optimize=True)
-            return output_path
+        # Decode straight to the thumbnail size, maintaining aspect ratio
+        img = load_scaled(input_path, *size)
+        
+        # Save optimized
+        encoding.save_jpeg(img, output_path, 'thumbnail')
+        save_webp_variant(img, output_path)
+        return output_path
     
-    def batch_process(self, source_dir, target_dir, style='desaturated'):
-        """Batch process all images in a directory."""
-        processor = AdvancedImageProcessor()
+    def batch_process(self, source_dir, target_dir, style='desaturated', jobs=1, force=False):
+        """
+        Batch process all images in a directory, in ``jobs`` worker processes.
+
+        Images whose output is current in the processing manifest are skipped
+        unless ``force`` is set; they are still listed in the result. Styles
+        rendered by ffmpeg go through it in batches, ``jobs`` ffmpeg processes
+        at a time.
+        """
+        manifest = ProcessingManifest()
+        # ffmpeg and Pillow give different output for styles with an ffmpeg filter
+        use_ffmpeg = self._uses_ffmpeg(style)
+        variant = f'{style}:ffmpeg' if use_ffmpeg else style
         processed_files = []
+        items = []
+        keys = {}
         
-        for filename in os.listdir(source_dir):
+        for filename in sorted(os.listdir(source_dir)):
             if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff')):
                 input_path = os.path.join(source_dir, filename)
                 output_filename = f"{Path(filename).stem}_processed.jpg"
                 output_path = os.path.join(target_dir, output_filename)
-                
                 try:
-                    processor.process_backdrop(input_path, output_path, style)
-                    processed_files.append(output_filename)
-                except Exception as e:
+                    key = manifest.key(
+                        input_path, style=variant,
+                        quality=None if use_ffmpeg else encoding.get_profile('backdrop'),
+                    )
+                except OSError as e:
                     print(f"Error processing {filename}: {e}")
+                    continue
+                if not force and manifest.is_current(output_path, key):
+                    processed_files.append(output_filename)
+                    continue
+                keys[output_path] = key
+                items.append((input_path, output_path, style))
         
-        return processed_files
+        if use_ffmpeg:
+            # Many images per ffmpeg process rather than one process per image
+            results = self._process_ffmpeg_batch(items, style, jobs)
+        elif parallel.job_count(jobs) > 1:
+            # Workers build their own processor from this one's probe result
+            results = parallel.run(
+                _process_batch_item, items, jobs,
+                initializer=_init_batch_worker, initargs=(self.ffmpeg_available,)
+            )
+        else:
+            parallel.worker_state['processor'] = self
+            results = parallel.run(_process_batch_item, items)
+        
+        for (input_path, output_path, _style), _result, error in results:
+            if error:
+                print(f"Error processing {os.path.basename(input_path)}: {error}")
+            else:
+                manifest.record(output_path, keys[output_path])
+                processed_files.append(os.path.basename(output_path))
+        
+        manifest.save()
+        return sorted(processed_files)
+
+
+def _init_batch_worker(ffmpeg_available):
+    parallel.worker_state['processor'] = AdvancedImageProcessor(ffmpeg_available)
+
+
+def _process_batch_item(item):
+    input_path, output_path, style = item
+    return parallel.worker_state['processor'].process_backdrop(input_path, output_path, style)
+
+
+def fit_within(img, size):
+    """Shrink ``img`` to fit inside ``size``, keeping the aspect ratio."""
+    img = img.copy()
+    img.thumbnail(size, Image.Resampling.LANCZOS)
+    return img
+
+
+def scale_to_width(img, max_width):
+    """Shrink ``img`` to at most ``max_width`` pixels wide."""
+    if img.width <= max_width:
+        return img
+    ratio = max_width / img.width
+    new_height = int(img.height * ratio)
+    return img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+
+
+def scale_to_cover(img, size):
+    """Shrink ``img`` until it just covers ``size`` (for ``object-fit: cover``)."""
+    ratio = max(size[0] / img.width, size[1] / img.height)
+    if ratio >= 1:
+        return img
+    new_size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+    return img.resize(new_size, Image.Resampling.LANCZOS)
+
+
+def crop_to_fill(img, size):
+    """Scale ``img`` to cover ``size`` and centre-crop it to exactly that size."""
+    img = scale_to_cover(img, size)
+    width, height = min(size[0], img.width), min(size[1], img.height)
+    left = (img.width - width) // 2
+    top = (img.height - height) // 2
+    return img.crop((left, top, left + width, top + height))
+
+
+def circular_crop(img, size):
+    """Centre-crop ``img`` to a square, resize it to ``size`` and mask it to a circle."""
+    width, height = img.size
+    size_square = min(width, height)
+    left = (width - size_square) // 2
+    top = (height - size_square) // 2
+    img = img.crop((left, top, left + size_square, top + size_square))
+    img = img.resize(size, Image.Resampling.LANCZOS)
+
+    mask = Image.new('L', size, 0)
+    mask_draw = ImageDraw.Draw(mask)
+    mask_draw.ellipse((0, 0, size[0], size[1]), fill=255)
+
+    output = Image.new('RGBA', size, (0, 0, 0, 0))
+    output.paste(img, (0, 0))
+    output.putalpha(mask)
+    return output
 
 
 def optimize_book_cover(input_path, output_path, max_width=800):
     """Optimize book cover images for web display."""
-    with Image.open(input_path) as img:
-        # Convert to RGB if necessary
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize if needed
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Save with high quality for book covers
-        img.save(output_path, 'JPEG', quality=95, optimize=True)
-        return output_path
+    # Decode straight to at most max_width, as RGB
+    img = load_scaled(input_path, max_width=max_width)
+    
+    # Save with the (high quality) cover encoding profile
+    encoding.save_jpeg(img, output_path, 'cover')
+    save_webp_variant(img, output_path, quality=90)
+    return output_path
 
 
 def create_author_thumbnail(input_path, output_path, size=(200, 200)):
@@ -186,29 +413,10 @@ def create_author_thumbnail(input_path, output_path, size=(200, 200)):
         if img.mode != 'RGB':
             img = img.convert('RGB')
         
-        # Create square crop
-        width, height = img.size
-        size_square = min(width, height)
-        left = (width - size_square) // 2
-        top = (height - size_square) // 2
-        right = left + size_square
-        bottom = top + size_square
-        
-        img = img.crop((left, top, right, bottom))
-        
-        # Resize to target size
-        img = img.resize(size, Image.Resampling.LANCZOS)
-        
-        # Create circular mask
-        mask = Image.new('L', size, 0)
-        mask_draw = ImageDraw.Draw(mask)
-        mask_draw.ellipse((0, 0, size[0], size[1]), fill=255)
-        
-        # Apply mask
-        output = Image.new('RGBA', size, (0, 0, 0, 0))
-        output.paste(img, (0, 0))
-        output.putalpha(mask)
+        # Square crop, resize and circular mask
+        output = circular_crop(img, size)
         
         # Save as PNG for transparency
         output.save(output_path, 'PNG', optimize=True)
+        save_webp_variant(output, output_path)
         return output_path 
\ No newline at end of file
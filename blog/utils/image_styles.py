@@ -0,0 +1,231 @@
+"""
+The image styles used for backdrops, declared once as chains of steps.
+
+Each style in ``STYLES`` is a sequence of steps such as
+``brightness(1.3)`` or ``saturation(0.4)``. ``apply()`` compiles the chain
+into as few passes over the pixels as possible:
+
+- consecutive tone steps (brightness, contrast) become one 256-entry lookup
+  table applied with ``Image.point``, clipping between steps as
+  ``ImageEnhance`` does;
+- consecutive colour steps (saturation, sepia, greyscale) are multiplied
+  into one 3x4 matrix applied with ``Image.convert``;
+- HSV saturation, which is not linear in RGB, is one blend of the image
+  with its brightest channel instead of a round trip through HSV;
+- spatial steps (blur) run as their own pass.
+
+So ``whitened`` (three ``ImageEnhance`` passes, six full-size images) is a
+table pass and a matrix pass. Contrast is relative to the mean grey level
+of the image at that point in the chain, which is measured on a reduced
+copy run through the preceding passes. Shrinking resizes run before any
+step, since every step costs the same per pixel.
+
+``BackdropImage`` and ``AdvancedImageProcessor`` both render through here;
+``manage.py benchmark_image_styles`` compares this with per-step processing.
+"""
+import math
+from collections import namedtuple
+
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+Step = namedtuple('Step', ['op', 'value'])
+Style = namedtuple('Style', ['label', 'steps', 'ffmpeg_filter'])
+
+# ITU-R 601-2 luma, as used by Image.convert('L') and ImageEnhance.Color
+LUMA = (0.299, 0.587, 0.114)
+IDENTITY = ((1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 0))
+SEPIA = (
+    (0.393, 0.769, 0.189, 0),
+    (0.349, 0.686, 0.168, 0),
+    (0.272, 0.534, 0.131, 0),
+)
+# The mean grey level for contrast is measured on a copy of about this many pixels
+PREVIEW_PIXELS = 64 * 1024
+
+TONE_OPS = {'brightness', 'contrast'}
+COLOUR_OPS = {'saturation', 'sepia', 'greyscale'}
+SPATIAL_OPS = {'blur'}
+
+
+def brightness(factor):
+    """Scale towards black (< 1) or brighter (> 1), like ImageEnhance.Brightness."""
+    return Step('brightness', factor)
+
+
+def contrast(factor):
+    """Scale away from (> 1) or towards (< 1) the mean grey, like ImageEnhance.Contrast."""
+    return Step('contrast', factor)
+
+
+def saturation(factor):
+    """Blend with the greyscale image, like ImageEnhance.Color."""
+    return Step('saturation', factor)
+
+
+def hsv_saturation(factor):
+    """Scale HSV saturation, keeping each pixel's value (its brightest channel)."""
+    return Step('hsv_saturation', factor)
+
+
+def sepia():
+    return Step('sepia', None)
+
+
+def greyscale():
+    return Step('greyscale', None)
+
+
+def blur(radius):
+    return Step('blur', radius)
+
+
+STYLES = {
+    'original': Style('Original Color', (), None),
+    'desaturated': Style('Low Saturation', (hsv_saturation(0.4),), None),
+    'sepia': Style('Sepia Tone', (sepia(),), None),
+    'greyscale': Style('Greyscale', (greyscale(),), None),
+    'whitened': Style(
+        'Whitened Backdrop',
+        (brightness(1.3), contrast(0.8), saturation(0.6)),
+        None,
+    ),
+    'vintage': Style(
+        'Vintage',
+        (sepia(), contrast(1.1), contrast(1.2), brightness(0.9)),
+        'colorbalance=rs=-0.1:gs=-0.1:bs=0.1,eq=saturation=0.3:contrast=1.1',
+    ),
+}
+
+# The styles a BackdropImage can be given
+BACKDROP_STYLES = ('original', 'desaturated', 'sepia', 'greyscale', 'whitened')
+
+
+def choices(names=BACKDROP_STYLES):
+    """Django field choices for the named styles."""
+    return [(name, STYLES[name].label) for name in names]
+
+
+def get_style(name):
+    try:
+        return STYLES[name]
+    except KeyError:
+        raise ValueError(f'Unknown image style {name!r}')
+
+
+def _colour_matrix(step):
+    if step.op == 'sepia':
+        return SEPIA
+    if step.op == 'greyscale':
+        return tuple(LUMA + (0,) for _ in range(3))
+    # saturation: factor * colour + (1 - factor) * luma
+    factor = step.value
+    return tuple(
+        tuple((1 - factor) * LUMA[column] + (factor if row == column else 0) for column in range(3)) + (0,)
+        for row in range(3)
+    )
+
+
+def _compose(first, then):
+    """The 3x4 affine matrix applying ``first`` and then ``then``."""
+    return tuple(
+        tuple(sum(then[row][k] * first[k][column] for k in range(3)) for column in range(3))
+        + (sum(then[row][k] * first[k][3] for k in range(3)) + then[row][3],)
+        for row in range(3)
+    )
+
+
+def _tone_function(step, mean):
+    factor = step.value
+    if step.op == 'brightness':
+        return lambda value: value * factor
+    return lambda value: mean + factor * (value - mean)
+
+
+def _table(functions):
+    table = []
+    for value in range(256):
+        for function in functions:
+            # ImageEnhance truncates and clips after every step
+            value = min(255, max(0, int(function(value))))
+        table.append(value)
+    return table * 3
+
+
+def _scale_hsv_saturation(img, factor):
+    # With V = max(r, g, b) fixed, scaling S moves each channel towards V:
+    # c' = V - factor * (V - c)
+    red, green, blue = img.split()
+    peak = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    return Image.blend(Image.merge('RGB', (peak, peak, peak)), img, factor)
+
+
+def _run(img, passes):
+    for kind, value in passes:
+        if kind == 'table':
+            img = img.point(_table(value))
+        elif kind == 'matrix':
+            img = img.convert('RGB', sum(value, ()))
+        elif kind == 'hsv_saturation':
+            img = _scale_hsv_saturation(img, value)
+        else:
+            img = img.filter(value)
+    return img
+
+
+def _preview(img):
+    factor = max(1, math.ceil(math.sqrt(img.width * img.height / PREVIEW_PIXELS)))
+    return img.reduce(factor) if factor > 1 else img
+
+
+def compile_steps(steps, img):
+    """
+    Turn ``steps`` into a list of ``(kind, value)`` passes for ``img``:
+    ``('table', [functions])``, ``('matrix', rows)``, ``('hsv_saturation',
+    factor)`` or ``('filter', filter)``.
+    """
+    passes = []
+    preview = None
+    for step in steps:
+        last = passes[-1][0] if passes else None
+        if step.op in TONE_OPS:
+            mean = None
+            if step.op == 'contrast':
+                if preview is None:
+                    preview = _preview(img)
+                grey = _run(preview, passes).convert('L')
+                mean = int(ImageStat.Stat(grey).mean[0] + 0.5)
+            function = _tone_function(step, mean)
+            if last == 'table':
+                passes[-1][1].append(function)
+            else:
+                passes.append(('table', [function]))
+        elif step.op in COLOUR_OPS:
+            matrix = _colour_matrix(step)
+            if last == 'matrix':
+                passes[-1] = ('matrix', _compose(passes[-1][1], matrix))
+            else:
+                passes.append(('matrix', _compose(IDENTITY, matrix)))
+        elif step.op == 'hsv_saturation':
+            passes.append(('hsv_saturation', step.value))
+        elif step.op in SPATIAL_OPS:
+            passes.append(('filter', ImageFilter.GaussianBlur(radius=step.value)))
+        else:
+            raise ValueError(f'Unknown image step {step.op!r}')
+    return passes
+
+
+def apply(img, name, size=None):
+    """
+    Return the RGB image ``img`` in the named style, resized to ``size``
+    if given. Shrinking happens first, enlarging last.
+    """
+    style = get_style(name)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    shrink = size and size[0] * size[1] < img.width * img.height
+    if shrink:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    img = _run(img, compile_steps(style.steps, img))
+    if size and not shrink and tuple(size) != img.size:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    return img
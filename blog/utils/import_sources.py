@@ -0,0 +1,232 @@
+"""
+Streaming readers for book import files.
+
+Each reader yields one record (a dict) at a time, so memory stays bounded by
+the largest single record (at most ``MAX_RECORD_SIZE`` for a JSON array),
+whatever the size of the input:
+
+- ``json``: the ``all_books.json`` array, decoded one element at a time;
+- ``ndjson``: one JSON object per line (``.ndjson``/``.jsonl``);
+- ``dir``: a directory of per-book JSON files (``export_book_reviews/``),
+  parsed by a thread pool a bounded number of files ahead of the consumer;
+- ``csv``: a header row naming the record keys (title, author, ...).
+
+A record that cannot be parsed is yielded as an ``InvalidRecord`` in its
+place, so one bad line or file is reported by the validation stage instead
+of ending the import. Every reader takes ``skip``, the number of records to
+pass over without decoding where the format allows it, for resuming.
+"""
+import csv
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+FORMATS = ('json', 'ndjson', 'dir', 'csv')
+# The combined export sits next to the per-book files; reading both would import everything twice
+AGGREGATE_FILE = 'all_books.json'
+READ_SIZE = 64 * 1024
+# Largest array element held in memory; a larger one is skipped as invalid
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+DIRECTORY_WORKERS = 4
+# What matters when scanning past a malformed array element
+_STRUCTURE_RE = re.compile(r'["\[\]{},]')
+_STRING_END_RE = re.compile(r'["\\]')
+
+
+class InvalidRecord(ValueError):
+    """A record that could not be read or failed validation."""
+
+
+def detect_format(path):
+    if os.path.isdir(path):
+        return 'dir'
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    if extension == '.csv':
+        return 'csv'
+    return 'json'
+
+
+def read(path, format=None, skip=0):
+    """Records of ``path`` in the given (or detected) format."""
+    readers = {
+        'json': read_json_array,
+        'ndjson': read_ndjson,
+        'dir': read_directory,
+        'csv': read_csv,
+    }
+    return readers[format or detect_format(path)](path, skip=skip)
+
+
+class _ElementScanner:
+    """
+    Find where a JSON array element ends without decoding it: at the next
+    ``,`` or ``]`` outside strings and brackets. The state carries over
+    between calls, so an element can be scanned one chunk at a time.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def scan(self, text, position=0):
+        """Index of the separator ending the element in ``text``, or None if ``text`` ends first."""
+        while True:
+            if self.in_string:
+                if self.escaped:
+                    if position >= len(text):
+                        return None
+                    position += 1
+                    self.escaped = False
+                match = _STRING_END_RE.search(text, position)
+                if match is None:
+                    return None
+                position = match.end()
+                if match.group() == '\\':
+                    self.escaped = True
+                else:
+                    self.in_string = False
+                continue
+            match = _STRUCTURE_RE.search(text, position)
+            if match is None:
+                return None
+            position = match.end()
+            char = match.group()
+            if char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+            elif self.depth:
+                if char in ']}':
+                    self.depth -= 1
+            elif char in ',]':
+                return match.start()
+
+
+def read_json_array(path, skip=0):
+    """
+    Decode the elements of a top-level JSON array one by one.
+
+    A malformed element is yielded as an ``InvalidRecord`` and reading goes
+    on after it. At most ``MAX_RECORD_SIZE`` characters of one element are
+    held in memory; a larger one is read past and reported as invalid.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as source:
+        buffer = ''
+        position = 0
+        started = False
+        index = 0
+        read_size = READ_SIZE
+        while True:
+            # Drop what has been decoded, skip whitespace and separators
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(buffer):
+                chunk = source.read(read_size)
+                if not chunk:
+                    if started and index >= skip:
+                        yield InvalidRecord(f'{path}: unexpected end of file inside the array')
+                    return
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            if not started:
+                if buffer[position] != '[':
+                    raise InvalidRecord(f'{path}: expected a JSON array of books')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                scanner = _ElementScanner()
+                end = scanner.scan(buffer, position)
+                if end is None and len(buffer) - position > MAX_RECORD_SIZE:
+                    # Read past the rest of the element without keeping it
+                    while end is None:
+                        buffer = source.read(READ_SIZE)
+                        if not buffer:
+                            break
+                        end = scanner.scan(buffer)
+                    error = f'{path}: element {index + 1} is larger than {MAX_RECORD_SIZE // (1024 * 1024)}MB'
+                elif end is None:
+                    # An element cut off at the end of the buffer
+                    chunk = source.read(read_size)
+                    if chunk:
+                        buffer = buffer[position:] + chunk
+                        position = 0
+                        # A very large element needs ever larger reads, not one re-parse per 64KB
+                        read_size = max(read_size, len(buffer))
+                        continue
+                    error = f'{path}: unexpected end of file in element {index + 1}'
+                else:
+                    error = f'{path}: invalid JSON in element {index + 1}'
+                if index >= skip:
+                    yield InvalidRecord(error)
+                if end is None:
+                    # An unterminated string or bracket runs to the end of the file
+                    return
+                position = end
+                read_size = READ_SIZE
+                index += 1
+                continue
+            position = end
+            read_size = READ_SIZE
+            if index >= skip:
+                yield record
+            index += 1
+
+
+def read_ndjson(path, skip=0):
+    index = 0
+    with open(path, encoding='utf-8') as source:
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            index += 1
+            if index <= skip:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield InvalidRecord(f'line {number}: {e}')
+
+
+def _load_file(path):
+    try:
+        with open(path, encoding='utf-8') as source:
+            return json.load(source)
+    except (OSError, ValueError) as e:
+        return InvalidRecord(f'{os.path.basename(path)}: {e}')
+
+
+def read_directory(path, skip=0, workers=DIRECTORY_WORKERS):
+    """Per-book JSON files in name order, parsed ``workers`` at a time."""
+    names = sorted(
+        name for name in os.listdir(path)
+        if name.lower().endswith('.json') and name != AGGREGATE_FILE
+    )[skip:]
+    # Only a few files ahead of the consumer are held in memory
+    window = workers * 4
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for name in names:
+            pending.append(executor.submit(_load_file, os.path.join(path, name)))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_csv(path, skip=0):
+    with open(path, newline='', encoding='utf-8') as source:
+        for number, row in enumerate(csv.DictReader(source), 1):
+            if number > skip:
+                yield row
@@ -0,0 +1,117 @@
+"""
+Background image work, off the request path.
+
+Saving a backdrop (or anything with image renditions) only queues an
+``ImageJob`` row; ``manage.py run_image_worker`` processes claim the jobs
+and run the handlers registered here. Several workers, on one machine or
+several sharing the database, can run at once: a job is leased to one
+worker at a time (``ImageJobQuerySet.claim``), the lease is extended as the
+job reports progress, and a job whose worker died is claimed again once its
+lease runs out. Failed jobs are retried with exponential backoff up to
+their ``max_attempts``.
+"""
+import logging
+import os
+import socket
+import time
+
+from django.apps import apps
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .. import page_cache
+from ..models import BackdropImage, ImageJob
+from . import renditions
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 600
+RETRY_DELAY = 30
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register the function that runs jobs of ``kind``."""
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def retry_delay(job):
+    """30s, 60s, 120s, ... after each failed attempt."""
+    return RETRY_DELAY * 2 ** max(0, job.attempts - 1)
+
+
+def run_job(job, lease_seconds=LEASE_SECONDS):
+    """Run a claimed job and record its outcome; returns True if it succeeded."""
+    try:
+        message = HANDLERS[job.kind](job, lease_seconds) or ''
+    except Exception as e:
+        logger.warning('Image job %s failed', job.pk, exc_info=True)
+        job.mark_failed(f'{type(e).__name__}: {e}', retry_delay(job))
+        return False
+    job.mark_done(message)
+    return True
+
+
+def work(worker=None, lease_seconds=LEASE_SECONDS, poll_interval=2.0, burst=False,
+         max_jobs=None, kinds=None, log=None):
+    """
+    Claim and run jobs until stopped. With ``burst``, return once the queue
+    is empty; ``max_jobs`` stops after that many. Returns the number run.
+    """
+    worker = worker or worker_name()
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        close_old_connections()
+        ImageJob.objects.fail_expired()
+        job = ImageJob.objects.claim(worker, lease_seconds, kinds=kinds)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        started = time.perf_counter()
+        succeeded = run_job(job, lease_seconds)
+        processed += 1
+        if log:
+            log(job, succeeded, time.perf_counter() - started)
+    return processed
+
+
+@handler(ImageJob.PROCESS_BACKDROP)
+def process_backdrop(job, lease_seconds):
+    backdrop = BackdropImage.objects.filter(pk=job.object_id).first()
+    if backdrop is None:
+        return 'Backdrop was deleted'
+    if not job.payload.get('force') and not backdrop.needs_processing():
+        return 'Already up to date'
+    job.set_progress(10, f'Processing {backdrop.processing_style}', lease_seconds)
+    # Writes the file and saves, which queues the renditions of the new image
+    backdrop.process_image()
+    return f'Processed {backdrop.processed_image.name}'
+
+
+@handler(ImageJob.BUILD_RENDITIONS)
+def build_renditions(job, lease_seconds):
+    model = apps.get_model(job.payload['model'])
+    instance = model.objects.filter(pk=job.object_id).first()
+    if instance is None:
+        return f'{model._meta.verbose_name} was deleted'
+    job.set_progress(10, 'Building renditions', lease_seconds)
+    generated = renditions.ensure_for_instance(instance, force=job.payload.get('force', False))
+    if generated:
+        # The srcsets change, so the cached fragments (keyed on updated_at) and
+        # pages rendered while the job was queued are stale. The base manager
+        # skips the custom update() side effects and the save signals.
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+            model._base_manager.filter(pk=instance.pk).update(updated_at=timezone.now())
+        page_cache.invalidate_tags(*page_cache.object_tags(model, [instance.pk]))
+    return f'Built renditions for {generated} image fields'
@@ -0,0 +1,91 @@
+"""
+Process-pool execution for the image management commands.
+
+``process_images``, ``process_backdrops``, ``create_backdrops`` and
+``AdvancedImageProcessor.batch_process`` take ``--jobs N`` (``jobs=N``) and
+hand each file to ``run()``, which decodes and encodes the images in N
+worker processes while results are yielded in input order, so progress
+output reads the same as a serial run. A failure is reported for its own
+item and does not stop the others.
+
+Workers only touch files. Anything that has to be written to the database
+is returned to the parent, which applies it in one batch at the end: the
+workers never share the parent's database connection.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.apps import apps
+from django.db import connections
+
+# Set in each worker by the pool initializer, e.g. an AdvancedImageProcessor
+# built once per process instead of once per file
+worker_state = {}
+
+
+def add_jobs_argument(parser):
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='Number of worker processes (0 = one per CPU core)'
+    )
+
+
+def job_count(jobs):
+    if not jobs or jobs < 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def _init_worker(initializer, initargs):
+    # Under the spawn start method the worker starts with a fresh interpreter
+    if not apps.ready:
+        django.setup()
+    if initializer:
+        initializer(*initargs)
+
+
+def _call(func, item):
+    try:
+        return func(item), None
+    except Exception as e:
+        return None, e
+
+
+def run(func, items, jobs=1, initializer=None, initargs=()):
+    """
+    Call ``func(item)`` for every item and yield ``(item, result, error)`` in
+    input order; ``error`` is the exception raised for that item, or None.
+
+    ``func`` and ``initializer`` must be module-level functions so they can
+    be sent to the workers. With ``jobs=1`` everything runs in this process.
+    """
+    items = list(items)
+    jobs = min(job_count(jobs), len(items))
+
+    if jobs <= 1:
+        if initializer:
+            initializer(*initargs)
+        for item in items:
+            result, error = _call(func, item)
+            yield item, result, error
+        return
+
+    # Forked workers must not inherit open database connections
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(initializer, initargs)
+    ) as executor:
+        # Submit everything up front so every worker stays busy while the
+        # results are collected in order
+        futures = [executor.submit(_call, func, item) for item in items]
+        for item, future in zip(items, futures):
+            try:
+                result, error = future.result()
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed for memory); report it against its items
+                result, error = None, e
+            yield item, result, error
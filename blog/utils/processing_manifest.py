@@ -0,0 +1,144 @@
+"""
+Persistent record of which processed images are up to date.
+
+Every processed output (a backdrop, a ``process_images`` result, ...) is
+recorded against a key derived from everything that determines its bytes:
+the SHA-256 of the source file's content, the style, the size and quality
+parameters and ``ENCODER_VERSION``. Before redoing an output the image
+commands and the backdrop processing job compare its recorded key with the
+current one, so work is skipped while nothing changed and redone as soon
+as the source or any parameter does.
+
+The manifest is a JSON file (``BLOG_PROCESSING_MANIFEST``, by default
+``BASE_DIR/.processing-manifest.json``). It lists absolute server paths, so
+it is kept out of the publicly served MEDIA_ROOT:
+
+    {"version": 1,
+     "sources": {"/abs/source.jpg": [bytes, mtime_ns, sha256]},
+     "outputs": {"site_images/backdrops/processed/x.jpg": key}}
+
+Source hashes are reused while a file's size and mtime are unchanged, so
+checking a large library reads each file only once. Changes are merged into
+the file under a lock, so a command and the web process can both record
+outputs without losing each other's entries.
+"""
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: last writer wins
+    fcntl = None
+
+# Bump when the processing code changes its output for the same parameters
+ENCODER_VERSION = 4
+MANIFEST_VERSION = 1
+
+
+def manifest_path():
+    return str(getattr(
+        settings, 'BLOG_PROCESSING_MANIFEST',
+        os.path.join(str(settings.BASE_DIR), '.processing-manifest.json')
+    ))
+
+
+def _output_key(path):
+    """Outputs under MEDIA_ROOT are recorded relative to it, so the media tree can move."""
+    path = os.path.abspath(path)
+    media_root = os.path.abspath(str(settings.MEDIA_ROOT))
+    if path.startswith(media_root + os.sep):
+        return os.path.relpath(path, media_root)
+    return path
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _locked(path):
+    if fcntl is None:
+        yield
+        return
+    with open(f'{path}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class ProcessingManifest:
+    """
+    Load the manifest once, answer ``is_current()`` for many outputs and
+    write everything ``record()``-ed with one ``save()``.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or manifest_path()
+        data = self._read()
+        self.sources = data['sources']
+        self.outputs = data['outputs']
+        self._changed_sources = {}
+        self._changed_outputs = {}
+
+    def _read(self):
+        try:
+            with open(self.path) as manifest_file:
+                data = json.load(manifest_file)
+        except (OSError, ValueError):
+            data = None
+        if not data or data.get('version') != MANIFEST_VERSION:
+            return {'sources': {}, 'outputs': {}}
+        return data
+
+    def source_hash(self, source_path):
+        """SHA-256 of a source file, rehashed only when its size or mtime changed."""
+        source_path = os.path.abspath(source_path)
+        stat = os.stat(source_path)
+        cached = self.sources.get(source_path)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        entry = [stat.st_size, stat.st_mtime_ns, file_hash(source_path)]
+        self.sources[source_path] = self._changed_sources[source_path] = entry
+        return entry[2]
+
+    def key(self, source_path, style=None, size=None, quality=None):
+        """The key an output of ``source_path`` processed with these parameters is recorded under."""
+        parts = [self.source_hash(source_path), style, size, quality, ENCODER_VERSION]
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def is_current(self, output_path, key):
+        """True if ``output_path`` exists and was written for ``key``."""
+        return self.outputs.get(_output_key(output_path)) == key and os.path.exists(output_path)
+
+    def record(self, output_path, key):
+        output = _output_key(output_path)
+        self.outputs[output] = self._changed_outputs[output] = key
+
+    def save(self):
+        """Merge the recorded changes into the manifest file."""
+        if not (self._changed_sources or self._changed_outputs):
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with _locked(self.path):
+            # Re-read so entries written by other processes since we loaded are kept
+            data = self._read()
+            data['version'] = MANIFEST_VERSION
+            data['sources'].update(self._changed_sources)
+            data['outputs'].update(self._changed_outputs)
+            temp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as manifest_file:
+                json.dump(data, manifest_file)
+            os.replace(temp_path, self.path)
+        self.sources, self.outputs = data['sources'], data['outputs']
+        self._changed_sources = {}
+        self._changed_outputs = {}
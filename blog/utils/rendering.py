@@ -0,0 +1,169 @@
+"""
+Render review and book text to HTML once, at save time.
+
+Reviews are written in a small Markdown subset (the imported reviews use
+``## headings``, paragraphs and ``[links](...)``). The renderer escapes the
+whole text before adding any markup, so the output contains only the tags
+it creates itself and can be emitted with ``|safe``. Supported syntax:
+
+* ``#`` to ``######`` headings, paragraphs, ``---`` rules
+* ``-``/``*``/``+`` and ``1.`` lists, ``>`` block quotes, fenced code
+* ``**bold**``, ``*italic*``, ```code``` and ``[text](url)`` links
+  (http, https, mailto and site-relative URLs only)
+
+Single newlines inside a paragraph become ``<br>``, as the ``linebreaks``
+filter used to do.
+"""
+import math
+import re
+from html import unescape
+
+from django.utils.html import escape, strip_tags
+from django.utils.text import Truncator
+
+EXCERPT_WORDS = 25
+WORDS_PER_MINUTE = 200
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+RULE_RE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+BULLET_RE = re.compile(r'^\s*[-*+]\s+(.*)$')
+NUMBERED_RE = re.compile(r'^\s*\d+[.)]\s+(.*)$')
+QUOTE_RE = re.compile(r'^\s*&gt;\s?(.*)$')
+FENCE_RE = re.compile(r'^\s*```')
+
+CODE_SPAN_RE = re.compile(r'`([^`]+)`')
+LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)\s]+)\)')
+BOLD_RE = re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*|__(?=\S)(.+?)(?<=\S)__')
+ITALIC_RE = re.compile(r'\*(?=\S)(.+?)(?<=\S)\*|(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)')
+# Site-relative paths only: browsers read //host and /\host as another site
+SAFE_URL_RE = re.compile(r'^(https?://|mailto:|/(?![/\\])|#)', re.IGNORECASE)
+BLOCK_TAG_RE = re.compile(r'</?(?:p|br|h[1-6]|ul|ol|li|blockquote|pre|hr)>')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _render_inline(text):
+    """Apply inline markup to already escaped text."""
+    protected = []
+
+    def protect(html):
+        protected.append(html)
+        return f'\x00{len(protected) - 1}\x00'
+
+    text = CODE_SPAN_RE.sub(lambda m: protect(f'<code>{m.group(1)}</code>'), text)
+
+    def link(match):
+        label, url = match.groups()
+        if not SAFE_URL_RE.match(unescape(url)):
+            return match.group(0)
+        return protect(f'<a href="{url}" rel="nofollow">{_render_inline(label)}</a>')
+
+    text = LINK_RE.sub(link, text)
+    text = BOLD_RE.sub(lambda m: f'<strong>{m.group(1) or m.group(2)}</strong>', text)
+    text = ITALIC_RE.sub(lambda m: f'<em>{m.group(1) or m.group(2)}</em>', text)
+    return re.sub(r'\x00(\d+)\x00', lambda m: protected[int(m.group(1))], text)
+
+
+def _render_blocks(lines):
+    html = []
+    paragraph = []
+    index = 0
+
+    def flush_paragraph():
+        if paragraph:
+            html.append('<p>' + '<br>'.join(_render_inline(line.strip()) for line in paragraph) + '</p>')
+            paragraph.clear()
+
+    while index < len(lines):
+        line = lines[index]
+
+        if not line.strip():
+            flush_paragraph()
+            index += 1
+            continue
+
+        if FENCE_RE.match(line):
+            flush_paragraph()
+            index += 1
+            code = []
+            while index < len(lines) and not FENCE_RE.match(lines[index]):
+                code.append(lines[index])
+                index += 1
+            html.append('<pre><code>' + '\n'.join(code) + '</code></pre>')
+            index += 1
+            continue
+
+        heading = HEADING_RE.match(line)
+        if heading:
+            flush_paragraph()
+            level = len(heading.group(1))
+            html.append(f'<h{level}>{_render_inline(heading.group(2))}</h{level}>')
+            index += 1
+            continue
+
+        if RULE_RE.match(line):
+            flush_paragraph()
+            html.append('<hr>')
+            index += 1
+            continue
+
+        if QUOTE_RE.match(line):
+            flush_paragraph()
+            quoted = []
+            while index < len(lines) and QUOTE_RE.match(lines[index]):
+                quoted.append(QUOTE_RE.match(lines[index]).group(1))
+                index += 1
+            html.append('<blockquote>' + _render_blocks(quoted) + '</blockquote>')
+            continue
+
+        for item_re, tag in ((BULLET_RE, 'ul'), (NUMBERED_RE, 'ol')):
+            if item_re.match(line):
+                flush_paragraph()
+                items = []
+                while (
+                    index < len(lines)
+                    and lines[index].strip()
+                    and not HEADING_RE.match(lines[index])
+                    and not RULE_RE.match(lines[index])
+                ):
+                    item = item_re.match(lines[index])
+                    if item:
+                        items.append(item.group(1))
+                    elif items:
+                        # Continuation of the previous item
+                        items[-1] += ' ' + lines[index].strip()
+                    index += 1
+                rendered = ''.join(f'<li>{_render_inline(item)}</li>' for item in items)
+                html.append(f'<{tag}>{rendered}</{tag}>')
+                break
+        else:
+            paragraph.append(line)
+            index += 1
+
+    flush_paragraph()
+    return '\n'.join(html)
+
+
+def render_markdown(text):
+    """Render ``text`` to sanitized HTML."""
+    if not text:
+        return ''
+    # NUL marks the protected spans in _render_inline and is not valid HTML anyway
+    text = text.replace('\x00', '').replace('\r\n', '\n').replace('\r', '\n')
+    lines = escape(text).split('\n')
+    return _render_blocks(lines)
+
+
+def plain_text(html):
+    """Collapse rendered HTML to a single line of plain text."""
+    text = unescape(strip_tags(BLOCK_TAG_RE.sub(' ', html)))
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
+def summarize(text):
+    """Return ``(html, excerpt, word_count, reading_time)`` for ``text``."""
+    html = render_markdown(text)
+    plain = plain_text(html)
+    word_count = len(plain.split())
+    reading_time = math.ceil(word_count / WORDS_PER_MINUTE)
+    excerpt = Truncator(plain).words(EXCERPT_WORDS)
+    return html, excerpt, word_count, reading_time
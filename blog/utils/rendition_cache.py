@@ -0,0 +1,336 @@
+"""
+On-demand image renditions served from a size-capped disk cache.
+
+``/media/r/<spec>/<path>`` returns ``<path>`` (relative to MEDIA_ROOT)
+resized according to ``<spec>``, which is either a named rendition from
+``blog.utils.renditions`` (``card``, ``detail@2x``, ...) or dash-separated
+tokens:
+
+    w300            at most 300px wide
+    h200            at most 200px high
+    crop            with w and h: fill the box exactly, cropping the overflow
+    q80             JPEG/WebP quality (30-95, default 85)
+    jpg / png / webp
+                    output format; without one, WebP is sent to browsers that
+                    accept it, otherwise PNG for PNG sources and JPEG for the rest
+
+e.g. ``/media/r/w300-h200-crop-q80/book_covers/dune.jpg?s=<signature>``.
+
+Named renditions are served to anyone, since ``responsive_image`` links to
+them. A token spec needs the ``s`` signature that ``rendition_url()`` adds,
+so clients cannot make the server decode and encode images at sizes of
+their choosing, nor fill the cache with them.
+
+The first request decodes and encodes the image with the Pillow helpers
+in ``blog.utils.image_processor``; later requests are served from
+``BLOG_RENDITION_CACHE_DIR``. Concurrent requests for the same rendition
+wait on a file lock, so only one of them encodes it, even across worker
+processes. When the cache grows past ``BLOG_RENDITION_CACHE_MAX_BYTES`` the
+least recently used files are evicted. Eviction walks the whole cache, so
+it runs at most once every ``EVICT_INTERVAL`` seconds across processes.
+
+With Apache serving ``/media/`` directly, exclude ``/media/r/`` from that
+alias so these requests reach Django.
+"""
+import hashlib
+import os
+import re
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils.crypto import constant_time_compare
+from django.utils._os import safe_join
+from PIL import Image
+
+from . import renditions
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process coalescing
+    fcntl = None
+
+MAX_DIMENSION = 2400
+DEFAULT_QUALITY = 85
+FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp')
+
+# Hits only refresh a file's LRU timestamp this often, to avoid a write per request
+TOUCH_INTERVAL = 3600
+# Eviction trims the cache to this fraction of the cap so it does not run on every write
+EVICT_TO = 0.9
+# Least time between two evictions after writes
+EVICT_INTERVAL = 60
+
+TOKEN_RE = re.compile(r'^(?P<key>[whq])(?P<value>\d{1,4})$')
+
+
+def cache_dir():
+    return str(getattr(settings, 'BLOG_RENDITION_CACHE_DIR', settings.BASE_DIR / 'rendition_cache'))
+
+
+def max_bytes():
+    return getattr(settings, 'BLOG_RENDITION_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+
+
+def parse_spec(spec):
+    """
+    Return ``(rendition, density, format)`` for a spec string.
+
+    ``format`` is the explicitly requested format or None, in which case it
+    is negotiated. Raises ValueError for anything malformed or out of range.
+    """
+    name, _, density = spec.partition('@')
+    if name in renditions.RENDITIONS:
+        if density not in ('', '2x'):
+            raise ValueError(f'Unsupported density {density!r}')
+        return renditions.RENDITIONS[name], 2 if density else 1, None
+
+    width = height = None
+    quality = DEFAULT_QUALITY
+    kind = 'fit'
+    output_format = None
+    for token in spec.split('-'):
+        match = TOKEN_RE.match(token)
+        if match:
+            value = int(match.group('value'))
+            key = match.group('key')
+            if key == 'w':
+                width = value
+            elif key == 'h':
+                height = value
+            else:
+                quality = value
+        elif token == 'crop':
+            kind = 'crop'
+        elif token in FORMATS:
+            output_format = FORMATS[token]
+        else:
+            raise ValueError(f'Unknown token {token!r}')
+
+    if not width and not height:
+        raise ValueError('A width or height is required')
+    if max(width or 0, height or 0) > MAX_DIMENSION:
+        raise ValueError(f'Dimensions are limited to {MAX_DIMENSION}px')
+    if kind == 'crop' and not (width and height):
+        raise ValueError('crop needs both a width and a height')
+    if not 30 <= quality <= 95:
+        raise ValueError('Quality must be between 30 and 95')
+
+    rendition = renditions.Rendition(kind, (width, height), None, quality)
+    return rendition, 1, output_format
+
+
+def _is_named(spec):
+    return spec.partition('@')[0] in renditions.RENDITIONS
+
+
+def _signature(spec, path):
+    return signing.Signer(salt='blog.rendition_cache').signature(f'{spec}/{path}')
+
+
+def check_signature(spec, path, signature):
+    """Raise ValueError unless ``spec`` is a named rendition or ``signature`` signs it for ``path``."""
+    if _is_named(spec):
+        return
+    if not signature or not constant_time_compare(signature, _signature(spec, path)):
+        raise ValueError('Token specs need a valid signature')
+
+
+def rendition_url(field_file, spec):
+    """URL of the on-demand rendition of an image field file, signed for token specs."""
+    url = reverse('blog:rendition', kwargs={'spec': spec, 'path': field_file.name})
+    if _is_named(spec):
+        return url
+    return f'{url}?s={_signature(spec, field_file.name)}'
+
+
+def source_path(path):
+    """Absolute path of a media file, or raise FileNotFoundError."""
+    if not path.lower().endswith(SOURCE_EXTENSIONS):
+        raise FileNotFoundError(path)
+    try:
+        full_path = safe_join(str(settings.MEDIA_ROOT), path)
+    except SuspiciousFileOperation:
+        raise FileNotFoundError(path)
+    if not os.path.isfile(full_path):
+        raise FileNotFoundError(path)
+    return full_path
+
+
+def _cache_path(spec, full_path, output_format):
+    stat = os.stat(full_path)
+    key = hashlib.sha1(
+        f'{spec}\0{full_path}\0{stat.st_size}\0{stat.st_mtime_ns}'.encode()
+    ).hexdigest()
+    return os.path.join(cache_dir(), key[:2], f'{key}.{EXTENSIONS[output_format]}'), key
+
+
+@contextmanager
+def _locked(key):
+    """Hold an exclusive lock named ``key`` for the duration of the block."""
+    if fcntl is None:
+        yield
+        return
+    lock_dir = os.path.join(cache_dir(), '.locks')
+    os.makedirs(lock_dir, exist_ok=True)
+    lock_path = os.path.join(lock_dir, f'{key}.lock')
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            # Remove the lock file before releasing it, so failed encodes and
+            # replaced sources leave none behind. Waiters re-check the target
+            # and encodes are written atomically, so this stays safe.
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _encode(full_path, rendition, density, output_format, target_path):
+    with Image.open(full_path) as source:
+        has_alpha = 'A' in source.getbands() or 'transparency' in source.info
+        img = source.convert('RGBA' if has_alpha else 'RGB')
+
+    output = renditions.render(img, rendition, density) or img
+    options = {'optimize': True}
+    if output_format == 'WEBP':
+        # Lossless keeps alpha edges (avatars) clean; photos are lossy
+        options = {'method': 6}
+        if output.mode == 'RGBA':
+            options['lossless'] = True
+        else:
+            options['quality'] = rendition.quality or DEFAULT_QUALITY
+    elif output_format == 'JPEG':
+        output = output.convert('RGB') if output.mode != 'RGB' else output
+        options['quality'] = rendition.quality or DEFAULT_QUALITY
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = f'{target_path}.{os.getpid()}.tmp'
+    output.save(temp_path, output_format, **options)
+    os.replace(temp_path, target_path)
+
+
+def accepts_webp(request):
+    return 'image/webp' in request.headers.get('Accept', '')
+
+
+def _output_format(rendition, output_format, full_path, webp):
+    """The format the rendition will be written in, known before decoding."""
+    if output_format:
+        return output_format
+    if webp:
+        return 'WEBP'
+    if rendition.format:
+        return rendition.format
+    return 'PNG' if full_path.lower().endswith('.png') else 'JPEG'
+
+
+def get_or_create(spec, path, webp=False, signature=None):
+    """
+    Return ``(cache_file_path, content_type)`` for a rendition, encoding it
+    on first use. ``webp`` says the client accepts WebP, used when the spec
+    names no format. Raises ValueError for a bad or unsigned spec and
+    FileNotFoundError for a missing source.
+    """
+    check_signature(spec, path, signature)
+    rendition, density, output_format = parse_spec(spec)
+    full_path = source_path(path)
+    output_format = _output_format(rendition, output_format, full_path, webp)
+    target_path, key = _cache_path(spec, full_path, output_format)
+
+    if os.path.exists(target_path):
+        _touch(target_path)
+        return target_path, CONTENT_TYPES[output_format]
+
+    with _locked(key):
+        # Another request may have finished the encode while we waited
+        if not os.path.exists(target_path):
+            _encode(full_path, rendition, density, output_format, target_path)
+    maybe_evict()
+    return target_path, CONTENT_TYPES[output_format]
+
+
+def _touch(path):
+    try:
+        if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def _cached_files():
+    root = cache_dir()
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories[:] = [name for name in subdirectories if name != '.locks']
+        for filename in filenames:
+            if filename.endswith('.tmp') or filename == '.last-evict':
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+
+def usage():
+    """Return ``(file_count, total_bytes)`` of the disk cache."""
+    files = list(_cached_files())
+    return len(files), sum(size for _path, size, _mtime in files)
+
+
+def clear():
+    """Delete every cached rendition."""
+    return evict(limit=0)
+
+
+def maybe_evict():
+    """Run ``evict()`` unless any process has in the last ``EVICT_INTERVAL`` seconds."""
+    stamp_path = os.path.join(cache_dir(), '.last-evict')
+    try:
+        if time.time() - os.stat(stamp_path).st_mtime < EVICT_INTERVAL:
+            return 0
+    except OSError:
+        pass
+    try:
+        with open(stamp_path, 'a'):
+            pass
+        os.utime(stamp_path)
+    except OSError:
+        return 0
+    return evict()
+
+
+def evict(limit=None):
+    """Delete least recently used files until the cache is under its cap; returns bytes freed."""
+    limit = max_bytes() if limit is None else limit
+    files = list(_cached_files())
+    total = sum(size for _path, size, _mtime in files)
+    if total <= limit:
+        return 0
+
+    target = limit * EVICT_TO
+    freed = 0
+    for path, size, _mtime in sorted(files, key=lambda item: item[2]):
+        if total - freed <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        freed += size
+        key = os.path.splitext(os.path.basename(path))[0]
+        try:
+            os.remove(os.path.join(cache_dir(), '.locks', f'{key}.lock'))
+        except OSError:
+            pass
+    return freed
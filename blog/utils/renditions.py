@@ -0,0 +1,275 @@
+"""
+Pre-sized renditions of uploaded images for responsive ``<img>`` tags.
+
+Each source image is decoded once and every rendition configured for its
+field is derived from that decode with the helpers in
+``blog.utils.image_processor``, at 1x and 2x device pixel ratio. Files are
+written next to the original, in a ``renditions/`` subdirectory:
+
+    book_covers/dune.jpg
+    book_covers/renditions/dune.jpg.card.jpg
+    book_covers/renditions/dune.jpg.card@2x.jpg
+    book_covers/renditions/dune.jpg.card.jpg.webp
+    book_covers/renditions/dune.jpg.json      <- sizes, for srcset/width/height
+
+The JSON sidecar records the source's size and mtime, so ``ensure()`` is
+cheap when nothing changed. Every rendition also gets a WebP variant, offered
+to browsers through ``<picture><source type="image/webp">``. Lookups for templates are cached in the Django
+cache, so rendering a page does not touch the disk.
+"""
+import json
+import os
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.utils.html import format_html, format_html_join
+from PIL import Image
+
+from .image_processor import (
+    circular_crop, crop_to_fill, fit_within, save_webp_variant, scale_to_cover,
+    scale_to_width, webp_path,
+)
+
+CACHE_PREFIX = 'blog:renditions:'
+DIRECTORY = 'renditions'
+DENSITIES = (1, 2)
+# Bumped when the files generated per rendition change, e.g. WebP variants
+MANIFEST_VERSION = 2
+
+# kind: 'cover' scales until the box is covered (for object-fit: cover),
+# 'crop' also crops to the box, 'fit' fits inside the box, 'width' caps the
+# width and 'avatar' crops a circle.
+Rendition = namedtuple('Rendition', ['kind', 'size', 'format', 'quality'])
+
+RENDITIONS = {
+    'card': Rendition('cover', (100, 140), 'JPEG', 85),
+    'detail': Rendition('cover', (250, 350), 'JPEG', 85),
+    'admin-thumb': Rendition('fit', (150, 150), 'JPEG', 80),
+    'review': Rendition('width', (300, None), 'JPEG', 85),
+    'avatar': Rendition('avatar', (200, 200), 'PNG', None),
+    'avatar-small': Rendition('avatar', (60, 60), 'PNG', None),
+}
+
+# Which renditions each image field gets, by model label and field name
+FIELD_RENDITIONS = {
+    'blog.Book': {'cover_image': ('card', 'detail', 'admin-thumb')},
+    'blog.Author': {'profile_image': ('avatar', 'avatar-small')},
+    'blog.Review': {'book_images': ('review',)},
+    'blog.BackdropImage': {
+        'original_image': ('admin-thumb',),
+        'processed_image': ('admin-thumb',),
+    },
+}
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png'}
+
+
+def _scaled_size(size, density):
+    return tuple(None if value is None else value * density for value in size)
+
+
+def render(img, rendition, density=1):
+    """Derive one rendition from a decoded RGB image, or None to skip it."""
+    size = _scaled_size(rendition.size, density)
+    if rendition.kind == 'avatar':
+        if density > 1 and min(img.size) < size[0]:
+            return None
+        return circular_crop(img, size)
+
+    if rendition.kind == 'cover':
+        output = scale_to_cover(img, size)
+    elif rendition.kind == 'crop':
+        output = crop_to_fill(img, size)
+    elif rendition.kind == 'fit':
+        output = fit_within(img, (size[0] or img.width, size[1] or img.height))
+    else:
+        output = scale_to_width(img, size[0])
+    if density > 1 and output.size == img.size:
+        # The source is too small for a sharper variant than 1x
+        return None
+    return output
+
+
+def rendition_name(source_name, name, density):
+    rendition = RENDITIONS[name]
+    suffix = '' if density == 1 else f'@{density}x'
+    directory, filename = os.path.split(source_name)
+    return f'{directory}/{DIRECTORY}/{filename}.{name}{suffix}.{EXTENSIONS[rendition.format]}'.lstrip('/')
+
+
+def _manifest_name(source_name):
+    directory, filename = os.path.split(source_name)
+    return f'{directory}/{DIRECTORY}/{filename}.json'.lstrip('/')
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_manifest(storage, source_name):
+    try:
+        with open(storage.path(_manifest_name(source_name))) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def generate(field_file, names):
+    """
+    Write the named renditions of ``field_file`` from a single decode.
+
+    Returns the manifest: ``{'version': ..., 'source': [bytes, mtime_ns],
+    'renditions': {name: [[name, width, height, density, webp_name], ...]}}``.
+    """
+    storage = field_file.storage
+    source_path = field_file.path
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'source': _source_stamp(source_path),
+        'renditions': {},
+    }
+
+    with Image.open(source_path) as source:
+        has_alpha = 'A' in source.getbands()
+        img = source.convert('RGBA' if has_alpha else 'RGB')
+
+    for name in names:
+        rendition = RENDITIONS[name]
+        variants = []
+        for density in DENSITIES:
+            output = render(img, rendition, density)
+            if output is None:
+                continue
+            if rendition.format == 'JPEG' and output.mode != 'RGB':
+                output = output.convert('RGB')
+            output_name = rendition_name(field_file.name, name, density)
+            output_path = storage.path(output_name)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            options = {'optimize': True}
+            if rendition.quality:
+                options['quality'] = rendition.quality
+            output.save(output_path, rendition.format, **options)
+            save_webp_variant(output, output_path)
+            variants.append(
+                [output_name, output.width, output.height, density, webp_path(output_name)]
+            )
+        manifest['renditions'][name] = variants
+
+    manifest_path = storage.path(_manifest_name(field_file.name))
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    cache.set(CACHE_PREFIX + field_file.name, manifest['renditions'], None)
+    return manifest
+
+
+def is_current(field_file, names):
+    """True if there is no file, or its renditions are up to date (no decoding needed)."""
+    if not field_file or not os.path.exists(field_file.path):
+        return True
+    manifest = _read_manifest(field_file.storage, field_file.name)
+    return (
+        manifest is not None
+        and manifest.get('version') == MANIFEST_VERSION
+        and manifest['source'] == _source_stamp(field_file.path)
+        and all(name in manifest['renditions'] for name in names)
+    )
+
+
+def ensure(field_file, names, force=False):
+    """Generate renditions unless they are already up to date; returns True if generated."""
+    if not field_file or not os.path.exists(field_file.path):
+        return False
+    if not force and is_current(field_file, names):
+        return False
+    generate(field_file, names)
+    return True
+
+
+def ensure_for_instance(instance, force=False):
+    """Bring the renditions of every configured image field of ``instance`` up to date."""
+    generated = 0
+    for field_name, names in FIELD_RENDITIONS.get(instance._meta.label, {}).items():
+        if ensure(getattr(instance, field_name), names, force=force):
+            generated += 1
+    return generated
+
+
+def is_current_for_instance(instance):
+    """True if no configured image field of ``instance`` needs its renditions (re)built."""
+    return all(
+        is_current(getattr(instance, field_name), names)
+        for field_name, names in FIELD_RENDITIONS.get(instance._meta.label, {}).items()
+    )
+
+
+def delete(storage, source_name):
+    """Remove the renditions (and WebP variants) of a source that is gone or renamed."""
+    manifest = _read_manifest(storage, source_name)
+    if manifest:
+        for variants in manifest['renditions'].values():
+            for variant in variants:
+                for name in [variant[0]] + variant[4:5]:
+                    if storage.exists(name):
+                        storage.delete(name)
+    manifest_name = _manifest_name(source_name)
+    if storage.exists(manifest_name):
+        storage.delete(manifest_name)
+    cache.delete(CACHE_PREFIX + source_name)
+
+
+def get_variants(field_file, name):
+    """Return ``[(url, width, height, density, webp_url), ...]`` for a rendition, or []."""
+    if not field_file:
+        return []
+    renditions = cache.get(CACHE_PREFIX + field_file.name)
+    if renditions is None:
+        manifest = _read_manifest(field_file.storage, field_file.name)
+        renditions = manifest['renditions'] if manifest else {}
+        cache.set(CACHE_PREFIX + field_file.name, renditions, None)
+    storage = field_file.storage
+    variants = []
+    for variant in renditions.get(name, []):
+        variant_name, width, height, density = variant[:4]
+        # Manifests written before WebP variants existed have no fifth entry
+        webp_name = variant[4] if len(variant) > 4 else None
+        variants.append((
+            storage.url(variant_name), width, height, density,
+            storage.url(webp_name) if webp_name else None,
+        ))
+    return variants
+
+
+def img_tag(field_file, name, alt='', **attrs):
+    """
+    Build an ``<img>`` with ``srcset``, ``sizes``, ``width`` and ``height`` for
+    a rendition, falling back to the original file if it has none yet.
+
+    When WebP variants exist the ``<img>`` is wrapped in a ``<picture>`` so
+    the browser picks the format from what it accepts; the markup stays the
+    same for every visitor and can be cached as a whole page.
+    """
+    variants = get_variants(field_file, name)
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    extra = format_html_join(
+        '', ' {}="{}"',
+        ((key.rstrip('_').replace('_', '-'), value) for key, value in attrs.items() if value)
+    )
+    if not variants:
+        return format_html('<img src="{}" alt="{}"{}>', field_file.url, alt, extra)
+
+    url, width, height = variants[0][:3]
+    srcset = ', '.join(f'{variant[0]} {variant[1]}w' for variant in variants)
+    img = format_html(
+        '<img src="{}" srcset="{}" sizes="{}px" width="{}" height="{}" alt="{}"{}>',
+        url, srcset, width, width, height, alt, extra
+    )
+    if not all(variant[4] for variant in variants):
+        return img
+    webp_srcset = ', '.join(f'{variant[4]} {variant[1]}w' for variant in variants)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}px">{}</picture>',
+        webp_srcset, width, img
+    )
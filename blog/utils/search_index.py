@@ -0,0 +1,200 @@
+"""
+Full-text search over the book catalogue using an SQLite FTS5 virtual table.
+
+The table holds one row per book (rowid = Book.id) with the title, author
+name, description, ISBN and the text of its published public reviews.
+Rows are refreshed from the signal handlers in ``blog.signals`` and can be
+rebuilt wholesale with ``manage.py rebuild_search_index``.
+
+On databases without FTS5 support ``is_available()`` returns False and
+callers fall back to plain ``icontains`` lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+TABLE_NAME = 'blog_book_search'
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE_NAME} USING fts5("
+    "title, author, description, isbn, reviews, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+# BM25 column weights: title, author, description, isbn, reviews
+BM25_WEIGHTS = (10.0, 5.0, 2.0, 5.0, 1.0)
+
+# Private-use markers placed around matches so the snippet can be
+# HTML-escaped before the real <mark> tags are inserted.
+_MATCH_START = '\ue000'
+_MATCH_END = '\ue001'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = None
+
+
+def is_available():
+    """Return True if the FTS5 search table exists on the default database."""
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and TABLE_NAME in connection.introspection.table_names()
+        )
+    return _available
+
+
+def build_match_query(query, columns=None):
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so punctuation in the user's
+    input can never be interpreted as FTS5 query syntax. All terms must match,
+    within ``columns`` if given.
+    """
+    tokens = _TOKEN_RE.findall(query.lower())
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    if match and columns:
+        match = '{%s} : (%s)' % (' '.join(columns), match)
+    return match
+
+
+def _bm25():
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    return f'bm25({TABLE_NAME}, {weights})'
+
+
+def search_books(queryset, query):
+    """
+    Filter a Book queryset to the books matching ``query``, best match first.
+
+    Returns ``queryset.none()`` for queries without any searchable words.
+    """
+    match = build_match_query(query)
+    if not match:
+        return queryset.none()
+
+    rank = RawSQL(
+        f'SELECT {_bm25()} FROM {TABLE_NAME} '
+        f'WHERE {TABLE_NAME} MATCH %s AND rowid = blog_book.id',
+        (match,),
+        output_field=FloatField(),
+    )
+    return (
+        queryset.filter(pk__in=matching_book_ids(query))
+        .annotate(search_rank=rank)
+        .order_by('search_rank', 'title', 'id')
+    )
+
+
+def matching_book_ids(query, columns=None):
+    """Return the ids of all books matching ``query`` (in ``columns``), as a lazy subquery."""
+    match = build_match_query(query, columns)
+    if not match:
+        return []
+    return RawSQL(
+        f'SELECT rowid FROM {TABLE_NAME} WHERE {TABLE_NAME} MATCH %s', (match,)
+    )
+
+
+def snippets(query, book_ids, tokens=16):
+    """
+    Return ``{book_id: html}`` highlighted excerpts for the given books.
+
+    The HTML is escaped apart from the ``<mark>`` tags around each match.
+    """
+    match = build_match_query(query)
+    book_ids = list(book_ids)
+    if not match or not book_ids:
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    sql = (
+        f"SELECT rowid, snippet({TABLE_NAME}, -1, %s, %s, '…', %s) "
+        f'FROM {TABLE_NAME} WHERE {TABLE_NAME} MATCH %s AND rowid IN ({placeholders})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_MATCH_START, _MATCH_END, tokens, match, *book_ids])
+        rows = cursor.fetchall()
+
+    return {
+        book_id: escape(text)
+        .replace(_MATCH_START, '<mark>')
+        .replace(_MATCH_END, '</mark>')
+        for book_id, text in rows
+    }
+
+
+def _index_rows(book_ids):
+    """Build the FTS rows for the given books with two queries."""
+    from blog.models import Book, Review
+
+    reviews = {}
+    for book_id, title, content in (
+        Review.objects.filter(book_id__in=book_ids, is_public=True, status='published')
+        .order_by('created_at')
+        .values_list('book_id', 'title', 'content')
+    ):
+        reviews.setdefault(book_id, []).append(f'{title}\n{content}')
+
+    books = Book.objects.filter(pk__in=book_ids).values_list(
+        'id', 'title', 'author__name', 'description', 'isbn'
+    )
+    return [
+        (book_id, title, author, description, isbn, '\n\n'.join(reviews.get(book_id, [])))
+        for book_id, title, author, description, isbn in books
+    ]
+
+
+def index_books(book_ids):
+    """Replace the index rows of the given books with their current content."""
+    book_ids = list(book_ids)
+    if not book_ids or not is_available():
+        return
+    rows = _index_rows(book_ids)
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE_NAME} WHERE rowid IN ({placeholders})', book_ids)
+        cursor.executemany(
+            f'INSERT INTO {TABLE_NAME} (rowid, title, author, description, isbn, reviews) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def remove_books(book_ids):
+    """Drop the index rows of deleted books."""
+    book_ids = list(book_ids)
+    if not book_ids or not is_available():
+        return
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE_NAME} WHERE rowid IN ({placeholders})', book_ids)
+
+
+def rebuild_index(chunk_size=500):
+    """Recreate the whole index from the database. Returns the number of books indexed."""
+    from blog.models import Book
+
+    global _available
+    if connection.vendor != 'sqlite':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(f'DELETE FROM {TABLE_NAME}')
+    _available = True
+
+    total = 0
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(book_ids), chunk_size):
+        chunk = book_ids[start:start + chunk_size]
+        index_books(chunk)
+        total += len(chunk)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE_NAME} ({TABLE_NAME}) VALUES ('optimize')")
+    return total
@@ -0,0 +1,119 @@
+"""
+Site-wide statistics for the home page header: total books, published
+reviews, books per genre and reviews per status.
+
+The counters are stored as SiteStatistic rows and adjusted by +/-1 from the
+model signal handlers, so reading them never needs an aggregate query. The
+current snapshot is also kept in the Django cache, which makes a normal
+home page render free of statistics queries altogether. ``rebuild()``
+recounts everything from scratch (used by ``manage.py rebuild_aggregates``
+and after bulk updates whose individual changes are unknown).
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+CACHE_KEY = 'blog:site-stats'
+
+BOOKS = 'books'
+PUBLISHED_REVIEWS = 'reviews:published'
+
+
+def genre_key(genre):
+    return f'genre:{genre}'
+
+
+def status_key(status):
+    return f'status:{status}'
+
+
+def review_keys(status, is_public):
+    """The counters a review with this status and visibility contributes to."""
+    keys = [status_key(status)]
+    if is_public and status == 'published':
+        keys.append(PUBLISHED_REVIEWS)
+    return keys
+
+
+def compute():
+    """Count everything from the database. Returns ``{name: value}``."""
+    from blog.models import Book, Review
+
+    counts = {BOOKS: Book.objects.count()}
+    counts.update({genre_key(genre): 0 for genre, _label in Book.GENRE_CHOICES})
+    counts.update({status_key(status): 0 for status, _label in Review.STATUS_CHOICES})
+    for genre, total in Book.objects.order_by().values_list('genre').annotate(Count('pk')):
+        counts[genre_key(genre)] = total
+    for status, total in Review.objects.order_by().values_list('status').annotate(Count('pk')):
+        counts[status_key(status)] = total
+    counts[PUBLISHED_REVIEWS] = Review.objects.filter(is_public=True, status='published').count()
+    return counts
+
+
+def _clear_cache():
+    cache.delete(CACHE_KEY)
+    # Concurrent readers may have re-cached the old values before commit
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def rebuild():
+    """Replace every stored counter with a fresh count."""
+    from blog.models import SiteStatistic
+
+    counts = compute()
+    with transaction.atomic():
+        SiteStatistic.objects.all().delete()
+        SiteStatistic.objects.bulk_create(
+            SiteStatistic(name=name, value=value) for name, value in counts.items()
+        )
+    _clear_cache()
+    return counts
+
+
+def adjust(deltas):
+    """Apply ``{name: delta}`` changes to the stored counters."""
+    from blog.models import SiteStatistic
+
+    deltas = {name: delta for name, delta in Counter(deltas).items() if delta}
+    if not deltas:
+        return
+    for name, delta in deltas.items():
+        if not SiteStatistic.objects.filter(name=name).update(value=F('value') + delta):
+            # A counter that was never built cannot be adjusted; recount instead
+            rebuild()
+            return
+    _clear_cache()
+
+
+def get_stats():
+    """
+    Return the current statistics::
+
+        {'books': 12, 'published_reviews': 9,
+         'genres': {'fiction': 3, ...}, 'statuses': {'draft': 1, ...}}
+    """
+    stats = cache.get(CACHE_KEY)
+    if stats is not None:
+        return stats
+
+    from blog.models import SiteStatistic
+
+    counts = dict(SiteStatistic.objects.values_list('name', 'value'))
+    if not counts:
+        counts = rebuild()
+    stats = {
+        'books': counts.get(BOOKS, 0),
+        'published_reviews': counts.get(PUBLISHED_REVIEWS, 0),
+        'genres': {
+            name.split(':', 1)[1]: value
+            for name, value in counts.items() if name.startswith('genre:')
+        },
+        'statuses': {
+            name.split(':', 1)[1]: value
+            for name, value in counts.items() if name.startswith('status:')
+        },
+    }
+    cache.set(CACHE_KEY, stats, None)
+    return stats
@@ -0,0 +1,240 @@
+"""
+Render the public site to flat files that a plain web server can serve.
+
+Every page is written as ``<url path>/index.html`` plus a pre-compressed
+``index.html.gz`` (for Apache ``MultiViews``/``mod_rewrite`` or nginx
+``gzip_static``). Offset pagination links (``?page=N``) are rewritten to
+``page/N/`` directories so they resolve without a query string.
+
+Incremental rebuilds reuse the page-cache tags each view already declares
+(``book:12``, ``author:3``, ``genre:fiction``, ...). The manifest written
+next to the export records each page's tags and a digest of the state of
+those tags; on the next run only pages whose digest changed are rendered
+again, and pages that no longer exist are removed.
+"""
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+from pathlib import Path
+
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count, Max
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+
+from blog.models import Author, BackdropImage, Book, Review
+from blog.views import BookListView, GenreBookListView
+
+MANIFEST_NAME = '.export-manifest.json'
+MANIFEST_VERSION = 1
+
+PAGE_LINK_RE = re.compile(r'href="\?page=(\d+)"')
+
+
+def page_url(base, number):
+    """URL of page ``number`` of a paginated listing rooted at ``base``."""
+    return base if number == 1 else f'{base}page/{number}/'
+
+
+def _page_count(total, per_page):
+    return max(1, math.ceil(total / per_page))
+
+
+def site_pages():
+    """
+    Return ``{url: (view_path, query_string)}`` for every public page.
+
+    ``view_path`` is what the Django view is requested as; ``url`` is where
+    the exported file lives.
+    """
+    pages = {}
+
+    def add_listing(base, total, per_page):
+        for number in range(1, _page_count(total, per_page) + 1):
+            pages[page_url(base, number)] = (base, '' if number == 1 else f'page={number}')
+
+    add_listing(reverse('blog:home'), Book.objects.count(), BookListView.paginate_by)
+
+    genre_counts = Book.objects.values('genre').annotate(total=Count('id')).order_by()
+    for row in genre_counts:
+        base = reverse('blog:genre-books', kwargs={'genre': row['genre']})
+        add_listing(base, row['total'], GenreBookListView.paginate_by)
+
+    for slug in Book.objects.values_list('slug', flat=True):
+        url = reverse('blog:book-detail', kwargs={'slug': slug})
+        pages[url] = (url, '')
+
+    for pk in Author.objects.values_list('pk', flat=True):
+        url = reverse('blog:author-detail', kwargs={'pk': pk})
+        pages[url] = (url, '')
+
+    about = reverse('blog:about')
+    pages[about] = (about, '')
+    return pages
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+def tag_fingerprints():
+    """
+    Return a function mapping a page-cache tag to a short digest of its state.
+
+    All object state is loaded up front in a handful of queries, so checking
+    thousands of pages costs no more than checking one.
+    """
+    fingerprints = {}
+    for row in Book.objects.values_list(
+        'pk', 'updated_at', 'review_count', 'rating_sum', 'published_review_count'
+    ):
+        fingerprints[f'book:{row[0]}'] = _digest(*row)
+    for row in Author.objects.values_list('pk', 'updated_at', 'book_count'):
+        fingerprints[f'author:{row[0]}'] = _digest(*row)
+    for row in Review.objects.values_list('pk', 'updated_at', 'status', 'is_public'):
+        fingerprints[f'review:{row[0]}'] = _digest(*row)
+
+    genres = {}
+    # Listing order matters: a book moving between pages changes both pages
+    for pk, genre in Book.objects.values_list('pk', 'genre'):
+        genres.setdefault(genre, []).append(pk)
+    for genre, pks in genres.items():
+        fingerprints[f'genre:{genre}'] = _digest(pks)
+
+    fingerprints['books'] = _digest(list(Book.objects.values_list('pk', flat=True)))
+    fingerprints['reviews'] = _digest(
+        Review.objects.filter(is_public=True, status='published').count()
+    )
+    backdrops = BackdropImage.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    fingerprints['backdrops'] = _digest(backdrops['count'], backdrops['latest'])
+
+    return lambda tag: fingerprints.get(tag, 'missing')
+
+
+def templates_digest():
+    """Digest of the app templates, so a template change forces a full rebuild."""
+    template_dir = Path(__file__).resolve().parent.parent / 'templates'
+    stamps = sorted(
+        (str(path.relative_to(template_dir)), path.stat().st_mtime_ns)
+        for path in template_dir.rglob('*.html')
+    )
+    return _digest(stamps)
+
+
+def pages_digest(tags, fingerprint):
+    return _digest(sorted((tag, fingerprint(tag)) for tag in tags))
+
+
+def render_page(factory, view_path, query_string):
+    """Render one page as an anonymous visitor; returns (html, tags)."""
+    path = f'{view_path}?{query_string}' if query_string else view_path
+    request = factory.get(path)
+    request.user = AnonymousUser()
+    match = resolve(view_path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise ValueError(f'{path} returned status {response.status_code}')
+
+    html = response.content.decode(response.charset)
+    html = PAGE_LINK_RE.sub(
+        lambda match: f'href="{page_url(view_path, int(match.group(1)))}"', html
+    )
+    return html, sorted(getattr(response, 'page_cache_tags', ()))
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def write_page(output_dir, url, html):
+    """Write ``index.html`` and a gzipped copy for ``url``."""
+    page_dir = output_dir.joinpath(*[part for part in url.split('/') if part])
+    data = html.encode('utf-8')
+    _write_atomic(page_dir / 'index.html', data)
+    # mtime=0 keeps the gzip bytes stable between identical builds
+    _write_atomic(page_dir / 'index.html.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    return page_dir
+
+
+def remove_page(output_dir, url):
+    page_dir = output_dir.joinpath(*[part for part in url.split('/') if part])
+    for name in ('index.html', 'index.html.gz'):
+        (page_dir / name).unlink(missing_ok=True)
+    # Prune directories left empty, stopping at the output root
+    while page_dir != output_dir:
+        try:
+            page_dir.rmdir()
+        except OSError:
+            break
+        page_dir = page_dir.parent
+
+
+def load_manifest(output_dir):
+    try:
+        manifest = json.loads((output_dir / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def export_site(output_dir, force=False, progress=None):
+    """
+    Export the site into ``output_dir``.
+
+    Returns a dict with the number of pages ``rendered``, ``skipped`` and
+    ``removed``. ``progress`` is called with each rendered URL.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    templates = templates_digest()
+    manifest = None if force else load_manifest(output_dir)
+    if manifest is not None and manifest.get('templates') != templates:
+        manifest = None
+    previous = manifest['pages'] if manifest else {}
+
+    fingerprint = tag_fingerprints()
+    factory = RequestFactory()
+    pages = site_pages()
+    entries = {}
+    counts = {'rendered': 0, 'skipped': 0, 'removed': 0}
+
+    with override_settings(BLOG_PAGE_CACHE=False, BLOG_CURSOR_PAGINATION=False):
+        for url, (view_path, query_string) in pages.items():
+            entry = previous.get(url)
+            if (
+                entry is not None
+                and entry['digest'] == pages_digest(entry['tags'], fingerprint)
+                and (output_dir / url.lstrip('/') / 'index.html').exists()
+            ):
+                entries[url] = entry
+                counts['skipped'] += 1
+                continue
+
+            html, tags = render_page(factory, view_path, query_string)
+            write_page(output_dir, url, html)
+            entries[url] = {'tags': tags, 'digest': pages_digest(tags, fingerprint)}
+            counts['rendered'] += 1
+            if progress:
+                progress(url)
+
+    for url in set(previous) - set(pages):
+        remove_page(output_dir, url)
+        counts['removed'] += 1
+
+    _write_atomic(output_dir / MANIFEST_NAME, json.dumps({
+        'version': MANIFEST_VERSION,
+        'templates': templates,
+        'pages': entries,
+    }, indent=1, sort_keys=True).encode())
+    return counts
@@ -0,0 +1,186 @@
+"""
+Matching cover image filenames to book titles.
+
+``TitleIndex`` is an inverted index over the words of a set of titles (or
+filenames), built once. Each word also goes into a character trigram index,
+so a query word finds indexed words it only loosely matches: shortened
+("prag" for "pragmatic") or misspelt ("emporer" for "emperor"). A query
+only touches the postings of its own words and their near-misses, so
+matching thousands of files against thousands of books is close to linear
+rather than every file against every book.
+
+Words are weighted by inverse document frequency, so a match on "python"
+in a catalogue full of Python books counts for less than one on "freebsd".
+A candidate's score, from 0 to 1, is the mean of two things. The first is
+how much of the shorter side's weight is matched (so "machine.jpg" can
+match "The 100 Page Machine Learning Handbook"). The second is how much of
+both sides is (so the most complete title wins).
+
+``assign()`` pairs queries with entries one to one, best score first, and
+leaves anything scoring under the threshold unmatched.
+"""
+import math
+import os
+from collections import defaultdict
+
+from .typeahead import normalize
+
+DEFAULT_THRESHOLD = 0.5
+# Scored entries kept per query for the assignment
+CANDIDATES = 5
+# Words in more entries than this only rescore entries a rarer word found
+COMMON_WORD_POSTINGS = 500
+MIN_SIMILARITY = 0.5
+# Shortest word that counts as an abbreviation of a longer one
+MIN_PREFIX = 4
+
+STOP_WORDS = frozenset(['a', 'an', 'and', 'by', 'for', 'in', 'of', 'on', 'the', 'to', 'with'])
+# Abbreviations seen in cover filenames that neither prefix nor trigrams catch
+ALIASES = {'stats': 'statistics'}
+
+
+def words(text):
+    """The matchable words of a title or filename, extension removed."""
+    stem, extension = os.path.splitext(text)
+    if extension.lower() in ('.jpg', '.jpeg', '.png', '.webp', '.gif'):
+        text = stem
+    return [
+        ALIASES.get(word, word) for word in normalize(text).split()
+        if word not in STOP_WORDS
+    ]
+
+
+def _trigrams(word):
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(word, other, word_trigrams=None, other_trigrams=None):
+    """How alike two words are, from 0 to 1."""
+    if word == other:
+        return 1.0
+    short, long = sorted((word, other), key=len)
+    if len(short) >= MIN_PREFIX and long.startswith(short):
+        return 0.8
+    word_trigrams = word_trigrams or _trigrams(word)
+    other_trigrams = other_trigrams or _trigrams(other)
+    # Dice coefficient of the trigram sets
+    return 2 * len(word_trigrams & other_trigrams) / (len(word_trigrams) + len(other_trigrams))
+
+
+class TitleIndex:
+    """An inverted word and trigram index over ``(key, text)`` entries."""
+
+    def __init__(self, entries):
+        self.texts = {}
+        self.weights = {}
+        postings = defaultdict(set)
+        entry_words = {}
+        for key, text in entries:
+            self.texts[key] = text
+            entry_words[key] = set(words(text))
+            for word in entry_words[key]:
+                postings[word].add(key)
+        self.postings = dict(postings)
+
+        count = len(entry_words)
+        self.idf = {
+            word: math.log(1 + count / len(keys)) for word, keys in self.postings.items()
+        }
+        for key, entry in entry_words.items():
+            self.weights[key] = sum(self.idf[word] for word in entry)
+
+        self.word_trigrams = {word: _trigrams(word) for word in self.postings}
+        self.trigram_words = defaultdict(set)
+        for word, trigrams in self.word_trigrams.items():
+            for trigram in trigrams:
+                self.trigram_words[trigram].add(word)
+        # Indexed words by their first MIN_PREFIX letters, for abbreviations
+        self.prefix_words = defaultdict(set)
+        for word in self.postings:
+            if len(word) >= MIN_PREFIX:
+                self.prefix_words[word[:MIN_PREFIX]].add(word)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def similar_words(self, word):
+        """``{indexed word: similarity}`` for the words ``word`` could stand for."""
+        if word in self.postings and len(self.postings[word]) > COMMON_WORD_POSTINGS:
+            return {word: 1.0}
+        trigrams = _trigrams(word)
+        shared = set(self.prefix_words.get(word[:MIN_PREFIX], ())) if len(word) >= MIN_PREFIX else set()
+        for trigram in trigrams:
+            shared |= self.trigram_words.get(trigram, set())
+        found = {}
+        for other in shared:
+            score = similarity(word, other, trigrams, self.word_trigrams[other])
+            if score >= MIN_SIMILARITY:
+                found[other] = score
+        return found
+
+    def candidates(self, text, limit=CANDIDATES):
+        """The best ``[(score, key)]`` entries for ``text``, highest first."""
+        query = set(words(text))
+        if not query:
+            return []
+        # A query word that is not indexed still counts towards the query's
+        # weight, as if it occurred in a single entry
+        rare = math.log(1 + len(self))
+
+        matched = defaultdict(float)
+        query_weight = 0.0
+        expansions = []
+        for word in query:
+            similar = self.similar_words(word)
+            query_weight += max((self.idf[other] for other in similar), default=rare)
+            expansions.append(similar)
+
+        # Rare words first, so common ones can be limited to entries already found
+        expansions.sort(key=lambda similar: sum(len(self.postings[other]) for other in similar))
+        for similar in expansions:
+            best = {}
+            for other, score in similar.items():
+                keys = self.postings[other]
+                if len(keys) > COMMON_WORD_POSTINGS and matched:
+                    keys = keys & matched.keys()
+                gain = score * self.idf[other]
+                for key in keys:
+                    # A query word counts once per entry, by its best match
+                    if gain > best.get(key, 0):
+                        best[key] = gain
+            for key, gain in best.items():
+                matched[key] += gain
+
+        scored = []
+        for key, weight in matched.items():
+            entry_weight = self.weights[key]
+            containment = weight / min(query_weight, entry_weight)
+            overlap = 2 * weight / (query_weight + entry_weight)
+            scored.append((min(1.0, (containment + overlap) / 2), key))
+        scored.sort(key=lambda item: (-item[0], str(item[1])))
+        return scored[:limit]
+
+
+def assign(index, queries, threshold=DEFAULT_THRESHOLD):
+    """
+    Pair ``(query key, text)`` queries with index entries one to one, best
+    score first. Returns ``({query key: (entry key, score)}, [unmatched query keys])``.
+    """
+    pairs = []
+    query_keys = []
+    for query_key, text in queries:
+        query_keys.append(query_key)
+        for score, key in index.candidates(text):
+            if score >= threshold:
+                pairs.append((score, query_key, key))
+    pairs.sort(key=lambda pair: (-pair[0], str(pair[1]), str(pair[2])))
+
+    matches = {}
+    taken = set()
+    for score, query_key, key in pairs:
+        if query_key in matches or key in taken:
+            continue
+        matches[query_key] = (key, score)
+        taken.add(key)
+    return matches, [query_key for query_key in query_keys if query_key not in matches]
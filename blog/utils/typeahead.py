@@ -0,0 +1,198 @@
+"""
+In-memory prefix index for search-box autocompletion over book titles and
+author names.
+
+The index is a sorted array of normalized keys, one for every word
+position in each title or name, so "crash" completes "Python Crash Course"
+as well as "pyth" does. A prefix lookup is a pair of binary searches over
+that array; the widest ranges (prefixes of up to three characters) have
+their top completions precomputed at build time so no lookup has to scan
+a large slice of the catalogue.
+
+Each worker process builds the index lazily on first use. Content changes
+bump a version number in the Django cache (see ``blog.signals``). The next
+lookup in each worker then starts a rebuild in a background thread and
+keeps answering from the previous index until the new one is ready, so no
+request waits for a rebuild after the first.
+"""
+import heapq
+import logging
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from threading import Lock, Thread
+
+from django.core.cache import cache
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = 'blog:typeahead:version'
+
+# Prefixes up to this length get their top completions precomputed
+SHORT_PREFIX_LENGTH = 3
+
+DEFAULT_LIMIT = 8
+
+_NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to single spaces."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+class TypeaheadIndex:
+    """
+    Immutable prefix index over ``(label, kind, url, score)`` entries.
+
+    Completions are ranked by score (highest first), then label.
+    """
+
+    def __init__(self, entries, limit=DEFAULT_LIMIT):
+        self.entries = list(entries)
+        self.limit = limit
+
+        keyed = []
+        for entry_id, (label, _kind, _url, _score) in enumerate(self.entries):
+            words = normalize(label).split(' ')
+            for start in range(len(words)):
+                keyed.append((' '.join(words[start:]), entry_id))
+        keyed.sort()
+
+        self._keys = [key for key, _entry_id in keyed]
+        self._entry_ids = array('L', (entry_id for _key, entry_id in keyed))
+
+        # Rank every entry once so lookups compare small integers
+        order = sorted(
+            range(len(self.entries)),
+            key=lambda entry_id: (-self.entries[entry_id][3], self.entries[entry_id][0].lower()),
+        )
+        self._rank = array('L', [0]) * len(order)
+        for rank, entry_id in enumerate(order):
+            self._rank[entry_id] = rank
+        self._order = array('L', order)
+
+        self._short = self._precompute_short_prefixes()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _top(self, entry_ids, limit):
+        ranks = heapq.nsmallest(limit, {self._rank[entry_id] for entry_id in entry_ids})
+        return [self._order[rank] for rank in ranks]
+
+    def _precompute_short_prefixes(self):
+        """Top completions for every prefix of up to SHORT_PREFIX_LENGTH characters."""
+        short = {}
+        for length in range(1, SHORT_PREFIX_LENGTH + 1):
+            # Keys are sorted, so each prefix covers one contiguous run
+            start = 0
+            while start < len(self._keys):
+                prefix = self._keys[start][:length]
+                if len(prefix) < length:
+                    # A key shorter than the prefix ("c" of "Vitamin C"); the
+                    # keys after it may still have full-length prefixes
+                    start += 1
+                    continue
+                end = bisect_left(self._keys, prefix + '\U0010ffff', start)
+                short[prefix] = self._top(self._entry_ids[start:end], self.limit)
+                start = end
+        return short
+
+    def complete(self, query, limit=None):
+        """Return up to ``limit`` entries whose label has a word starting with ``query``."""
+        limit = min(limit or self.limit, self.limit)
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            entry_ids = self._short.get(prefix, [])[:limit]
+        else:
+            lo = bisect_left(self._keys, prefix)
+            hi = bisect_left(self._keys, prefix + '\U0010ffff', lo)
+            entry_ids = self._top(self._entry_ids[lo:hi], limit)
+        return [self.entries[entry_id] for entry_id in entry_ids]
+
+    @classmethod
+    def from_database(cls, limit=DEFAULT_LIMIT):
+        """Build the index from all books and authors (two queries)."""
+        from django.db.models import Sum
+        from django.urls import reverse
+        from blog.models import Author, Book
+
+        entries = [
+            (title, 'book', reverse('blog:book-detail', args=[slug]), score)
+            for title, slug, score in Book.objects.order_by().values_list(
+                'title', 'slug', 'published_review_count'
+            )
+        ]
+        entries.extend(
+            (name, 'author', reverse('blog:author-detail', args=[pk]), score or 0)
+            for pk, name, score in Author.objects.order_by()
+            .annotate(score=Sum('books__published_review_count'))
+            .values_list('pk', 'name', 'score')
+        )
+        return cls(entries, limit=limit)
+
+
+_index = None
+_index_version = None
+_rebuilding = False
+_lock = Lock()
+
+
+def _rebuild(version):
+    """Build the index for ``version`` and swap it in; runs in a background thread."""
+    global _index, _index_version, _rebuilding
+    try:
+        index = TypeaheadIndex.from_database()
+        with _lock:
+            _index, _index_version = index, version
+    except Exception:
+        # The stale index keeps serving; the next lookup tries again
+        logger.exception('Could not rebuild the typeahead index')
+    finally:
+        with _lock:
+            _rebuilding = False
+        # This thread's own database connections
+        connections.close_all()
+
+
+def get_index():
+    """
+    Return this worker's index. The first call builds it; after a content
+    change the previous index is returned while a new one is built.
+    """
+    global _index, _index_version, _rebuilding
+    version = cache.get(VERSION_CACHE_KEY, 0)
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = TypeaheadIndex.from_database()
+                _index_version = version
+        return _index
+    if _index_version != version and not _rebuilding:
+        with _lock:
+            if _index_version != version and not _rebuilding:
+                _rebuilding = True
+                Thread(target=_rebuild, args=(version,), daemon=True).start()
+    return _index
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
+
+
+def invalidate():
+    """Mark every worker's index as stale."""
+    _bump_version()
+    # A rebuild started before the change commits would not see it
+    transaction.on_commit(_bump_version)
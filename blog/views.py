@@ -1,12 +1,29 @@
 from django.shortcuts import render, get_object_or_404
+from django.http import FileResponse, Http404, JsonResponse
+from django.views import View
 from django.views.generic import ListView, DetailView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q, Avg, Count
+from django.db.models import Q, Avg, Count, Max, Sum
 from django.core.paginator import Paginator
+from PIL import Image
 from .models import Book, Author, Review, BackdropImage
+from .conditional import ConditionalGetMixin
+from .page_cache import CachedPageMixin, book_list_tags
+from .pagination import CursorPaginationMixin
+from .utils import rendition_cache, search_index, site_stats, typeahead
 
 
-class BookListView(ListView):
+def book_list_validator_values(books):
+    """Validator values for a listing of book cards, in one aggregate query."""
+    return books.aggregate(
+        books_updated=Max('updated_at'),
+        authors_updated=Max('author__updated_at'),
+        book_total=Count('id'),
+        review_total=Sum('published_review_count'),
+    )
+
+
+class BookListView(CachedPageMixin, ConditionalGetMixin, CursorPaginationMixin, ListView):
     """Home page view displaying all books with pagination."""
     model = Book
     template_name = 'blog/book_list.html'
@@ -15,18 +32,28 @@ class BookListView(ListView):
     
     def get_queryset(self):
         """Optimize queryset with select_related to avoid N+1 queries."""
-        return Book.objects.select_related('author').prefetch_related('reviews').all()
+        return Book.objects.select_related('author').all()
     
     def get_context_data(self, **kwargs):
         """Add additional context for the template."""
         context = super().get_context_data(**kwargs)
+        stats = site_stats.get_stats()
         context['genres'] = Book.GENRE_CHOICES
-        context['total_books'] = Book.objects.count()
-        context['total_reviews'] = Review.objects.filter(is_public=True, status='published').count()
+        context['genre_counts'] = stats['genres']
+        context['total_books'] = stats['books']
+        context['total_reviews'] = stats['published_reviews']
         return context
+    
+    def get_validator_values(self):
+        """Any change to a book, its author or the review totals."""
+        return book_list_validator_values(Book.objects.all())
+    
+    def get_page_cache_tags(self, context):
+        """The cards shown, plus the catalogue and review totals in the header."""
+        return book_list_tags(context['object_list']) | {'books', 'reviews'}
 
 
-class BookDetailView(DetailView):
+class BookDetailView(CachedPageMixin, ConditionalGetMixin, DetailView):
     """Detailed view for a single book with reviews."""
     model = Book
     template_name = 'blog/book_detail.html'
@@ -51,9 +78,27 @@ class BookDetailView(DetailView):
         context['average_rating'] = reviews.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0
         
         return context
+    
+    def get_validator_values(self):
+        """The book, its author and its reviews (counters catch deletions)."""
+        return Book.objects.filter(slug=self.kwargs['slug']).aggregate(
+            book_updated=Max('updated_at'),
+            author_updated=Max('author__updated_at'),
+            reviews_updated=Max('reviews__updated_at'),
+            review_total=Max('review_count'),
+            rating_total=Max('rating_sum'),
+            published_review_total=Max('published_review_count'),
+        )
+    
+    def get_page_cache_tags(self, context):
+        """The book, its author and the reviews shown."""
+        book = context['book']
+        tags = {f'book:{book.pk}', f'author:{book.author_id}'}
+        tags.update(f'review:{review.pk}' for review in context['reviews'])
+        return tags
 
 
-class AuthorListView(ListView):
+class AuthorListView(ConditionalGetMixin, CursorPaginationMixin, ListView):
     """List view for all authors."""
     model = Author
     template_name = 'blog/author_list.html'
@@ -61,11 +106,17 @@ class AuthorListView(ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        """Optimize queryset with book count."""
-        return Author.objects.annotate(book_count=Count('books')).all()
+        """Book counts are stored on the author, so no annotation is needed."""
+        return Author.objects.all()
+    
+    def get_validator_values(self):
+        """Any change to an author or to the number of authors."""
+        return Author.objects.aggregate(
+            authors_updated=Max('updated_at'), author_total=Count('id'), book_total=Sum('book_count')
+        )
 
 
-class AuthorDetailView(DetailView):
+class AuthorDetailView(CachedPageMixin, ConditionalGetMixin, DetailView):
     """Detailed view for a single author with their books."""
     model = Author
     template_name = 'blog/author_detail.html'
@@ -77,9 +128,23 @@ class AuthorDetailView(DetailView):
         author = context['author']
         context['books'] = author.books.all()
         return context
+    
+    def get_validator_values(self):
+        """The author and their books, including the review counts on the cards."""
+        return Author.objects.filter(pk=self.kwargs['pk']).aggregate(
+            author_updated=Max('updated_at'),
+            book_total=Max('book_count'),
+            books_updated=Max('books__updated_at'),
+            review_total=Sum('books__published_review_count'),
+            rating_total=Sum('books__rating_sum'),
+        )
+    
+    def get_page_cache_tags(self, context):
+        """The author and each of their books."""
+        return book_list_tags(context['books']) | {f'author:{context["author"].pk}'}
 
 
-class ReviewDetailView(DetailView):
+class ReviewDetailView(CachedPageMixin, ConditionalGetMixin, DetailView):
     """Detailed view for a single review."""
     model = Review
     template_name = 'blog/review_detail.html'
@@ -88,9 +153,20 @@ class ReviewDetailView(DetailView):
     def get_queryset(self):
         """Only show published public reviews."""
         return Review.objects.filter(is_public=True, status='published').select_related('book', 'reviewer')
+    
+    def get_validator_values(self):
+        """The review and the book it belongs to."""
+        return self.get_queryset().filter(pk=self.kwargs['pk']).aggregate(
+            review_updated=Max('updated_at'), book_updated=Max('book__updated_at')
+        )
+    
+    def get_page_cache_tags(self, context):
+        """The review and the book it belongs to."""
+        review = context['review']
+        return {f'review:{review.pk}', f'book:{review.book_id}'}
 
 
-class GenreBookListView(ListView):
+class GenreBookListView(CachedPageMixin, ConditionalGetMixin, CursorPaginationMixin, ListView):
     """List books filtered by genre."""
     model = Book
     template_name = 'blog/genre_books.html'
@@ -100,17 +176,26 @@ class GenreBookListView(ListView):
     def get_queryset(self):
         """Filter books by genre."""
         genre = self.kwargs.get('genre')
-        return Book.objects.filter(genre=genre).select_related('author').prefetch_related('reviews')
+        return Book.objects.filter(genre=genre).select_related('author')
     
     def get_context_data(self, **kwargs):
         """Add genre information to context."""
         context = super().get_context_data(**kwargs)
         context['genre'] = self.kwargs.get('genre')
         context['genre_display'] = dict(Book.GENRE_CHOICES).get(context['genre'], context['genre'])
+        context['genre_book_count'] = site_stats.get_stats()['genres'].get(context['genre'], 0)
         return context
+    
+    def get_validator_values(self):
+        """Any change to a book in the genre or to its membership."""
+        return book_list_validator_values(Book.objects.filter(genre=self.kwargs['genre']))
+    
+    def get_page_cache_tags(self, context):
+        """The cards shown, plus membership of the genre."""
+        return book_list_tags(context['object_list']) | {f'genre:{context["genre"]}'}
 
 
-class SearchView(ListView):
+class SearchView(ConditionalGetMixin, CursorPaginationMixin, ListView):
     """Search functionality for books and authors."""
     model = Book
     template_name = 'blog/search_results.html'
@@ -118,25 +203,95 @@ class SearchView(ListView):
     paginate_by = 12
     
     def get_queryset(self):
-        """Search in books and authors."""
+        """Search in books and authors, ranked by the full-text index when available."""
         query = self.request.GET.get('q', '')
         if not query:
             return Book.objects.none()
         
-        return Book.objects.filter(
+        books = Book.objects.select_related('author')
+        if search_index.is_available():
+            return search_index.search_books(books, query)
+        
+        return books.filter(
             Q(title__icontains=query) |
             Q(author__name__icontains=query) |
             Q(description__icontains=query) |
             Q(isbn__icontains=query)
-        ).select_related('author').prefetch_related('reviews').distinct()
+        ).distinct()
+    
+    def get_validator_values(self):
+        """Results depend on books, authors and the indexed review text; the query is in the namespace."""
+        values = book_list_validator_values(Book.objects.all())
+        values.update(Review.objects.aggregate(
+            reviews_updated=Max('updated_at'),
+            review_count=Count('id'),
+        ))
+        return values
     
     def get_context_data(self, **kwargs):
-        """Add search query to context."""
+        """Add search query and highlighted snippets to context."""
         context = super().get_context_data(**kwargs)
-        context['query'] = self.request.GET.get('q', '')
+        query = self.request.GET.get('q', '')
+        context['query'] = query
+        
+        if query and search_index.is_available():
+            books = context['object_list']
+            book_snippets = search_index.snippets(query, [book.pk for book in books])
+            for book in books:
+                book.search_snippet = book_snippets.get(book.pk, '')
         return context
 
 
+class AutocompleteView(View):
+    """JSON typeahead suggestions for the search box."""
+    max_limit = typeahead.DEFAULT_LIMIT
+    
+    def get(self, request, *args, **kwargs):
+        """Return book and author completions for the ``q`` prefix."""
+        query = request.GET.get('q', '')
+        try:
+            limit = max(1, min(int(request.GET.get('limit', self.max_limit)), self.max_limit))
+        except ValueError:
+            limit = self.max_limit
+        
+        results = [
+            {'label': label, 'type': kind, 'url': url}
+            for label, kind, url, _score in typeahead.get_index().complete(query, limit)
+        ]
+        return JsonResponse({'query': query, 'results': results})
+
+
+class RenditionView(View):
+    """Serve a resized image from the on-demand rendition cache."""
+    
+    def get(self, request, spec, path):
+        """Return the rendition of ``path`` described by ``spec``, encoding it on first use."""
+        # A second try covers the file being evicted between lookup and open
+        for _attempt in range(2):
+            try:
+                cache_path, content_type = rendition_cache.get_or_create(
+                    spec, path, webp=rendition_cache.accepts_webp(request),
+                    signature=request.GET.get('s'),
+                )
+                rendition_file = open(cache_path, 'rb')
+                break
+            except ValueError:
+                raise Http404('No such rendition')
+            except FileNotFoundError:
+                continue
+            except (OSError, Image.DecompressionBombError):
+                # A corrupt, truncated or non-image source cannot be rendered
+                raise Http404('No such rendition')
+        else:
+            raise Http404('No such rendition')
+        
+        response = FileResponse(rendition_file, content_type=content_type)
+        # The cache key includes the source's mtime, so a replaced file gets new bytes
+        response['Cache-Control'] = 'public, max-age=86400'
+        response['Vary'] = 'Accept'
+        return response
+
+
 class AboutView(TemplateView):
     """Static about page with architecture information."""
     template_name = 'blog/about.html'
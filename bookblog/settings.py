@@ -126,3 +126,35 @@ MEDIA_ROOT = BASE_DIR / "media"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Blog listings: use keyset (cursor) pagination instead of page numbers.
+# Deep pages then cost the same as the first, but no total page count is shown.
+BLOG_CURSOR_PAGINATION = False
+
+# Full-page cache for anonymous visitors (blog/page_cache.py), invalidated
+# by model signals. Several worker processes need a shared CACHES backend.
+BLOG_PAGE_CACHE = True
+BLOG_PAGE_CACHE_TIMEOUT = 600
+
+# On-demand image renditions (/media/r/<spec>/<path>) are cached on disk here,
+# evicting the least recently used files beyond the size cap.
+BLOG_RENDITION_CACHE_DIR = BASE_DIR / "rendition_cache"
+BLOG_RENDITION_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Which processed images are up to date, keyed by source content hash and
+# processing parameters (blog/utils/processing_manifest.py). Kept out of
+# MEDIA_ROOT, which is served publicly.
+BLOG_PROCESSING_MANIFEST = BASE_DIR / ".processing-manifest.json"
+
+# Decoded images with more pixels than this are converted and resampled in
+# strips, so those steps never copy the whole image (blog/utils/image_processor.py).
+BLOG_IMAGE_PIXEL_BUDGET = 24_000_000
+
+# What the installed ffmpeg supports, cached per binary (path, size, mtime) so
+# only the first process after an upgrade runs it (blog/utils/ffmpeg.py).
+BLOG_FFMPEG_PROBE_CACHE = BASE_DIR / ".ffmpeg-probe.json"
+
+# Perceptual hashes of the stored images, cached per file (size, mtime) for
+# find_duplicate_images (blog/utils/image_hashes.py). Kept out of MEDIA_ROOT,
+# which is served publicly.
+BLOG_IMAGE_HASH_CACHE = BASE_DIR / ".image-hashes.json"